@@ -0,0 +1,63 @@
+using APM.Collector.Formatters;
+using APM.Collector.Models.Otlp;
+using Microsoft.AspNetCore.Http;
+using Microsoft.AspNetCore.Mvc.Formatters;
+using Microsoft.AspNetCore.Mvc.ModelBinding;
+using Xunit;
+
+namespace APM.Collector.Tests.Formatters;
+
+public class OtlpProtobufInputFormatterTests
+{
+    private static InputFormatterContext CreateContext(Type modelType, byte[] body)
+    {
+        var httpContext = new DefaultHttpContext();
+        httpContext.Request.ContentType = OtlpProtobufInputFormatter.ProtobufContentType;
+        httpContext.Request.ContentLength = body.Length;
+        httpContext.Request.Body = new MemoryStream(body);
+        return new InputFormatterContext(
+            httpContext,
+            string.Empty,
+            new ModelStateDictionary(),
+            new EmptyModelMetadataProvider().GetMetadataForType(modelType),
+            (stream, encoding) => new StreamReader(stream, encoding));
+    }
+
+    [Theory]
+    [InlineData(typeof(OtlpLogRequest), true)]
+    [InlineData(typeof(OtlpMetricRequest), true)]
+    [InlineData(typeof(OtlpTraceRequest), true)]
+    [InlineData(typeof(string), false)]
+    public void CanRead_OnlyOtlpRequests(Type modelType, bool expected)
+    {
+        var formatter = new OtlpProtobufInputFormatter();
+
+        Assert.Equal(expected, formatter.CanRead(CreateContext(modelType, Array.Empty<byte>())));
+    }
+
+    [Fact]
+    public async Task ReadAsync_ParsesBodyForModelType()
+    {
+        var span = new ProtobufWriter().Hex(1, "0af7651916cd43dd8448eb211c80319c").String(5, "GET /Straße");
+        var body = new ProtobufWriter()
+            .Message(1, new ProtobufWriter().Message(2, new ProtobufWriter().Message(2, span)))
+            .ToArray();
+
+        var result = await new OtlpProtobufInputFormatter().ReadAsync(CreateContext(typeof(OtlpTraceRequest), body));
+
+        Assert.False(result.HasError);
+        var request = Assert.IsType<OtlpTraceRequest>(result.Model);
+        Assert.Equal("GET /Straße", request.ResourceSpans[0].ScopeSpans[0].Spans[0].Name);
+    }
+
+    [Fact]
+    public async Task ReadAsync_MalformedBodyIsAModelError()
+    {
+        var context = CreateContext(typeof(OtlpLogRequest), new byte[] { 0x0A, 0x05, 0x01 });
+
+        var result = await new OtlpProtobufInputFormatter().ReadAsync(context);
+
+        Assert.True(result.HasError);
+        Assert.False(context.ModelState.IsValid);
+    }
+}
@@ -0,0 +1,288 @@
+using APM.Collector.Formatters;
+using APM.Collector.Models.Otlp;
+using Xunit;
+
+namespace APM.Collector.Tests.Formatters;
+
+public class OtlpProtobufParserTests
+{
+    private const string TraceId = "0af7651916cd43dd8448eb211c80319c";
+    private const string SpanId = "b7ad6b7169203331";
+
+    private static ProtobufWriter StringValue(string value) => new ProtobufWriter().String(1, value);
+
+    private static ProtobufWriter Attribute(string key, ProtobufWriter value) =>
+        new ProtobufWriter().String(1, key).Message(2, value);
+
+    private static ProtobufWriter Resource() =>
+        new ProtobufWriter().Message(1, Attribute("service.name", StringValue("checkout")));
+
+    private static ProtobufWriter Scope() => new ProtobufWriter().String(1, "racelogic-apm");
+
+    [Fact]
+    public void ParseLogs_DecodesRecordFields()
+    {
+        var record = new ProtobufWriter()
+            .Fixed64(1, 1_700_000_000_123_456_789)
+            .Varint(2, 17)
+            .String(3, "ERROR")
+            .Message(5, StringValue("Zahlung fehlgeschlagen: 支払い ✗ 🚀"))
+            .Message(6, Attribute("user", StringValue("Jürgen")))
+            .Message(6, Attribute("retries", new ProtobufWriter().Int64(3, -3)))
+            .Message(6, Attribute("ratio", new ProtobufWriter().Double(4, -0.25)))
+            .Message(6, Attribute("ok", new ProtobufWriter().Varint(2, 0)))
+            .Hex(9, TraceId)
+            .Hex(10, SpanId)
+            .Fixed64(11, 1_700_000_000_123_456_790);
+        var data = new ProtobufWriter()
+            .Message(1, new ProtobufWriter()
+                .Message(1, Resource())
+                .Message(2, new ProtobufWriter().Message(1, Scope()).Message(2, record)))
+            .ToArray();
+
+        var request = OtlpProtobufParser.ParseLogs(data);
+
+        var resourceLogs = Assert.Single(request.ResourceLogs);
+        var resourceAttribute = Assert.Single(resourceLogs.Resource!.Attributes!);
+        Assert.Equal("service.name", resourceAttribute.Key);
+        Assert.Equal("checkout", resourceAttribute.Value!.StringValue);
+        var scopeLogs = Assert.Single(resourceLogs.ScopeLogs);
+        Assert.Equal("racelogic-apm", scopeLogs.Scope!.Name);
+        var log = Assert.Single(scopeLogs.LogRecords);
+        Assert.Equal(1_700_000_000_123_456_789UL, log.TimeUnixNano);
+        Assert.Equal(1_700_000_000_123_456_790UL, log.ObservedTimeUnixNano);
+        Assert.Equal(17, log.SeverityNumber);
+        Assert.Equal("ERROR", log.SeverityText);
+        Assert.Equal("Zahlung fehlgeschlagen: 支払い ✗ 🚀", log.Body!.StringValue);
+        Assert.Equal(TraceId, log.TraceId);
+        Assert.Equal(SpanId, log.SpanId);
+
+        var attributes = log.Attributes!.ToDictionary(a => a.Key, a => a.Value!);
+        Assert.Equal("Jürgen", attributes["user"].StringValue);
+        Assert.Equal(-3, attributes["retries"].IntValue);
+        Assert.Equal(-0.25, attributes["ratio"].DoubleValue);
+        Assert.False(attributes["ok"].BoolValue);
+    }
+
+    [Fact]
+    public void ParseLogs_DecodesNestedAndEmptyValues()
+    {
+        var record = new ProtobufWriter()
+            .Message(5, new ProtobufWriter())
+            .Message(6, Attribute("tags", new ProtobufWriter().Message(5, new ProtobufWriter()
+                .Message(1, StringValue("a"))
+                .Message(1, StringValue("é")))))
+            .Message(6, Attribute("ctx", new ProtobufWriter().Message(6, new ProtobufWriter()
+                .Message(1, Attribute("depth", new ProtobufWriter().Int64(3, long.MinValue))))))
+            .Message(6, Attribute("empty", new ProtobufWriter().Message(5, new ProtobufWriter())));
+        var data = new ProtobufWriter()
+            .Message(1, new ProtobufWriter()
+                .Message(1, new ProtobufWriter())
+                .Message(2, new ProtobufWriter().Message(2, record)))
+            .ToArray();
+
+        var resourceLogs = Assert.Single(OtlpProtobufParser.ParseLogs(data).ResourceLogs);
+
+        Assert.Empty(resourceLogs.Resource!.Attributes!);
+        var log = Assert.Single(Assert.Single(resourceLogs.ScopeLogs).LogRecords);
+        Assert.Null(log.Body!.GetValue());
+        var attributes = log.Attributes!.ToDictionary(a => a.Key, a => a.Value!);
+        Assert.Equal(new[] { "a", "é" }, attributes["tags"].ArrayValue!.Values!.Select(v => v.StringValue));
+        var depth = Assert.Single(attributes["ctx"].KvlistValue!.Values!);
+        Assert.Equal(long.MinValue, depth.Value!.IntValue);
+        Assert.Empty(attributes["empty"].ArrayValue!.Values!);
+    }
+
+    [Fact]
+    public void ParseLogs_ReplacesInvalidUtf8()
+    {
+        // A lone surrogate that reached the wire as CESU-8 bytes.
+        var record = new ProtobufWriter()
+            .Message(5, new ProtobufWriter().Bytes(1, new byte[] { (byte)'a', 0xED, 0xB2, 0x80, (byte)'b' }));
+        var data = new ProtobufWriter()
+            .Message(1, new ProtobufWriter().Message(2, new ProtobufWriter().Message(2, record)))
+            .ToArray();
+
+        var log = OtlpProtobufParser.ParseLogs(data).ResourceLogs[0].ScopeLogs[0].LogRecords[0];
+
+        Assert.StartsWith("a�", log.Body!.StringValue);
+        Assert.EndsWith("�b", log.Body.StringValue);
+    }
+
+    [Fact]
+    public void ParseLogs_EmptyRequest()
+    {
+        Assert.Empty(OtlpProtobufParser.ParseLogs(ReadOnlySpan<byte>.Empty).ResourceLogs);
+    }
+
+    [Fact]
+    public void ParseMetrics_DecodesEveryMetricType()
+    {
+        var sum = new ProtobufWriter()
+            .String(1, "orders")
+            .Message(7, new ProtobufWriter()
+                .Message(1, new ProtobufWriter()
+                    .Fixed64(2, 1)
+                    .Fixed64(3, 2)
+                    .Double(4, -4.5)
+                    .Message(7, Attribute("región", StringValue("sur"))))
+                .Varint(2, 1)
+                .Varint(3, 1));
+        var gauge = new ProtobufWriter()
+            .String(1, "queue_depth")
+            .Message(5, new ProtobufWriter().Message(1, new ProtobufWriter().Fixed64(3, 3).Fixed64(6, unchecked((ulong)-7L))));
+        var histogram = new ProtobufWriter()
+            .String(1, "latency_ms")
+            .Message(9, new ProtobufWriter()
+                .Message(1, new ProtobufWriter()
+                    .Fixed64(4, 3)
+                    .Double(5, 12.5)
+                    .PackedFixed64(6, 1, 1, 1)
+                    .PackedDouble(7, 1.0, 5.0)
+                    .Double(11, 0.5)
+                    .Double(12, 10.0))
+                .Message(1, new ProtobufWriter()
+                    .Fixed64(6, 4)
+                    .Fixed64(6, 5)
+                    .Double(7, 2.0))
+                .Message(1, new ProtobufWriter())
+                .Varint(2, 1));
+        var exponential = new ProtobufWriter()
+            .String(1, "payload_bytes")
+            .Message(10, new ProtobufWriter()
+                .Message(1, new ProtobufWriter()
+                    .Fixed64(4, 4)
+                    .Double(5, -1.5)
+                    .SInt32(6, -2)
+                    .Fixed64(7, 1)
+                    .Message(8, new ProtobufWriter().SInt32(1, -3).PackedVarint(2, 1, 0, 300))
+                    .Message(9, new ProtobufWriter())
+                    .Double(12, -3.0)
+                    .Double(13, 2.0))
+                .Varint(2, 1));
+        var data = new ProtobufWriter()
+            .Message(1, new ProtobufWriter()
+                .Message(1, Resource())
+                .Message(2, new ProtobufWriter()
+                    .Message(1, Scope())
+                    .Message(2, sum)
+                    .Message(2, gauge)
+                    .Message(2, histogram)
+                    .Message(2, exponential)))
+            .ToArray();
+
+        var request = OtlpProtobufParser.ParseMetrics(data);
+
+        var metrics = Assert.Single(Assert.Single(request.ResourceMetrics).ScopeMetrics).Metrics
+            .ToDictionary(m => m.Name);
+
+        var sumPoint = Assert.Single(metrics["orders"].Sum!.DataPoints);
+        Assert.True(metrics["orders"].Sum!.IsMonotonic);
+        Assert.Equal(1, metrics["orders"].Sum!.AggregationTemporality);
+        Assert.Equal(1UL, sumPoint.StartTimeUnixNano);
+        Assert.Equal(2UL, sumPoint.TimeUnixNano);
+        Assert.Equal(-4.5, sumPoint.AsDouble);
+        Assert.Equal("sur", Assert.Single(sumPoint.Attributes!).Value!.StringValue);
+
+        Assert.Equal(-7, Assert.Single(metrics["queue_depth"].Gauge!.DataPoints).AsInt);
+
+        var points = metrics["latency_ms"].Histogram!.DataPoints;
+        Assert.Equal(3, points.Count);
+        Assert.Equal(3UL, points[0].Count);
+        Assert.Equal(12.5, points[0].Sum);
+        Assert.Equal(0.5, points[0].Min);
+        Assert.Equal(10.0, points[0].Max);
+        Assert.Equal(new ulong[] { 1, 1, 1 }, points[0].BucketCounts);
+        Assert.Equal(new[] { 1.0, 5.0 }, points[0].ExplicitBounds);
+        // Unpacked repeated fields are accepted too.
+        Assert.Equal(new ulong[] { 4, 5 }, points[1].BucketCounts);
+        Assert.Equal(new[] { 2.0 }, points[1].ExplicitBounds);
+        Assert.Null(points[2].BucketCounts);
+        Assert.Null(points[2].ExplicitBounds);
+
+        var exponentialPoint = Assert.Single(metrics["payload_bytes"].ExponentialHistogram!.DataPoints);
+        Assert.Equal(-2, exponentialPoint.Scale);
+        Assert.Equal(1UL, exponentialPoint.ZeroCount);
+        Assert.Equal(-1.5, exponentialPoint.Sum);
+        Assert.Equal(-3, exponentialPoint.Positive!.Offset);
+        Assert.Equal(new ulong[] { 1, 0, 300 }, exponentialPoint.Positive.BucketCounts);
+        Assert.Equal(0, exponentialPoint.Negative!.Offset);
+        Assert.Empty(exponentialPoint.Negative.BucketCounts!);
+        Assert.Equal(-3.0, exponentialPoint.Min);
+        Assert.Equal(2.0, exponentialPoint.Max);
+    }
+
+    [Fact]
+    public void ParseTraces_DecodesSpans()
+    {
+        var span = new ProtobufWriter()
+            .Hex(1, TraceId)
+            .Hex(2, SpanId)
+            .Hex(4, "00f067aa0ba902b7")
+            .String(5, "GET /Straße/{id}")
+            .Varint(6, 2)
+            .Fixed64(7, 10)
+            .Fixed64(8, 20)
+            .Message(9, Attribute("http.status_code", new ProtobufWriter().Int64(3, 503)))
+            .Message(11, new ProtobufWriter()
+                .Fixed64(1, 15)
+                .String(2, "exception")
+                .Message(3, Attribute("n", new ProtobufWriter().Int64(3, -2))))
+            .Message(15, new ProtobufWriter().String(2, "upstream ✗").Varint(3, 2));
+        var root = new ProtobufWriter().Hex(1, TraceId).Hex(2, "1111111111111111").String(5, "root");
+        var data = new ProtobufWriter()
+            .Message(1, new ProtobufWriter()
+                .Message(1, Resource())
+                .Message(2, new ProtobufWriter().Message(1, Scope()).Message(2, span).Message(2, root)))
+            .ToArray();
+
+        var spans = Assert.Single(Assert.Single(OtlpProtobufParser.ParseTraces(data).ResourceSpans).ScopeSpans).Spans;
+
+        Assert.Equal(2, spans.Count);
+        var decoded = spans[0];
+        Assert.Equal(TraceId, decoded.TraceId);
+        Assert.Equal(SpanId, decoded.SpanId);
+        Assert.Equal("00f067aa0ba902b7", decoded.ParentSpanId);
+        Assert.Equal("GET /Straße/{id}", decoded.Name);
+        Assert.Equal(2, decoded.Kind);
+        Assert.Equal(10UL, decoded.StartTimeUnixNano);
+        Assert.Equal(20UL, decoded.EndTimeUnixNano);
+        Assert.Equal(503, Assert.Single(decoded.Attributes!).Value!.IntValue);
+        var spanEvent = Assert.Single(decoded.Events!);
+        Assert.Equal(15UL, spanEvent.TimeUnixNano);
+        Assert.Equal("exception", spanEvent.Name);
+        Assert.Equal(-2, Assert.Single(spanEvent.Attributes!).Value!.IntValue);
+        Assert.Equal(2, decoded.Status!.Code);
+        Assert.Equal("upstream ✗", decoded.Status.Message);
+
+        Assert.Null(spans[1].ParentSpanId);
+        Assert.Null(spans[1].Attributes);
+        Assert.Null(spans[1].Events);
+    }
+
+    [Fact]
+    public void Parse_SkipsUnknownFields()
+    {
+        var data = new ProtobufWriter()
+            .Varint(7, 1)
+            .Fixed64(8, 2)
+            .String(9, "ignored")
+            .Message(1, new ProtobufWriter().Message(2, new ProtobufWriter()
+                .String(15, "ignored")
+                .Message(2, new ProtobufWriter().Varint(20, 1).String(3, "INFO"))))
+            .ToArray();
+
+        var log = Assert.Single(Assert.Single(Assert.Single(OtlpProtobufParser.ParseLogs(data).ResourceLogs).ScopeLogs).LogRecords);
+
+        Assert.Equal("INFO", log.SeverityText);
+    }
+
+    [Theory]
+    [InlineData(new byte[] { 0x0A, 0x05, 0x01 })]
+    [InlineData(new byte[] { 0x08, 0x80 })]
+    [InlineData(new byte[] { 0x13 })]
+    public void Parse_RejectsMalformedInput(byte[] data)
+    {
+        Assert.Throws<FormatException>(() => OtlpProtobufParser.ParseLogs(data));
+    }
+}
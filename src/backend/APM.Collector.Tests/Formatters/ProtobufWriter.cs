@@ -0,0 +1,80 @@
+using System.Buffers.Binary;
+using System.Text;
+
+namespace APM.Collector.Tests.Formatters;
+
+/// <summary>
+/// Minimal protobuf wire writer for building parser test inputs.
+/// </summary>
+public class ProtobufWriter
+{
+    private readonly MemoryStream _buffer = new();
+
+    public ProtobufWriter Varint(int field, ulong value)
+    {
+        Tag(field, 0);
+        WriteVarint(value);
+        return this;
+    }
+
+    public ProtobufWriter Int64(int field, long value) => Varint(field, (ulong)value);
+
+    public ProtobufWriter SInt32(int field, int value) => Varint(field, (uint)((value << 1) ^ (value >> 31)));
+
+    public ProtobufWriter Fixed64(int field, ulong value)
+    {
+        Tag(field, 1);
+        Span<byte> bytes = stackalloc byte[8];
+        BinaryPrimitives.WriteUInt64LittleEndian(bytes, value);
+        _buffer.Write(bytes);
+        return this;
+    }
+
+    public ProtobufWriter Double(int field, double value) => Fixed64(field, (ulong)BitConverter.DoubleToInt64Bits(value));
+
+    public ProtobufWriter Bytes(int field, byte[] value)
+    {
+        Tag(field, 2);
+        WriteVarint((ulong)value.Length);
+        _buffer.Write(value);
+        return this;
+    }
+
+    public ProtobufWriter String(int field, string value) => Bytes(field, Encoding.UTF8.GetBytes(value));
+
+    public ProtobufWriter Hex(int field, string value) => Bytes(field, Convert.FromHexString(value));
+
+    public ProtobufWriter Message(int field, ProtobufWriter message) => Bytes(field, message.ToArray());
+
+    public ProtobufWriter PackedFixed64(int field, params ulong[] values)
+    {
+        var packed = new byte[values.Length * 8];
+        for (var i = 0; i < values.Length; i++)
+            BinaryPrimitives.WriteUInt64LittleEndian(packed.AsSpan(i * 8), values[i]);
+        return Bytes(field, packed);
+    }
+
+    public ProtobufWriter PackedDouble(int field, params double[] values) =>
+        PackedFixed64(field, values.Select(v => (ulong)BitConverter.DoubleToInt64Bits(v)).ToArray());
+
+    public ProtobufWriter PackedVarint(int field, params ulong[] values)
+    {
+        var packed = new ProtobufWriter();
+        foreach (var value in values) packed.WriteVarint(value);
+        return Bytes(field, packed.ToArray());
+    }
+
+    public byte[] ToArray() => _buffer.ToArray();
+
+    private void Tag(int field, int wireType) => WriteVarint((ulong)((field << 3) | wireType));
+
+    private void WriteVarint(ulong value)
+    {
+        while (value >= 0x80)
+        {
+            _buffer.WriteByte((byte)(value | 0x80));
+            value >>= 7;
+        }
+        _buffer.WriteByte((byte)value);
+    }
+}
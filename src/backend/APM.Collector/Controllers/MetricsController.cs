@@ -53,6 +53,9 @@ public class MetricsController : ControllerBase
             max = m.ValueMax,
             sum = m.ValueSum,
             count = m.ValueCount,
+            p50 = m.ValueP50,
+            p95 = m.ValueP95,
+            p99 = m.ValueP99,
             applicationId = m.ApplicationId,
             applicationName = m.ApplicationName,
             attributes = ParseJson(m.Attributes)
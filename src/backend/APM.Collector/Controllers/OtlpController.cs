@@ -23,7 +23,7 @@ public class OtlpController : ControllerBase
     /// Receive OTLP log records
     /// </summary>
     [HttpPost("logs")]
-    [Consumes("application/json")]
+    [Consumes("application/json", "application/x-protobuf")]
     public IActionResult ReceiveLogs([FromBody] OtlpLogRequest request)
     {
         var applicationId = GetApplicationId();
@@ -38,7 +38,7 @@ public class OtlpController : ControllerBase
     /// Receive OTLP metrics
     /// </summary>
     [HttpPost("metrics")]
-    [Consumes("application/json")]
+    [Consumes("application/json", "application/x-protobuf")]
     public IActionResult ReceiveMetrics([FromBody] OtlpMetricRequest request)
     {
         var applicationId = GetApplicationId();
@@ -53,7 +53,7 @@ public class OtlpController : ControllerBase
     /// Receive OTLP trace spans
     /// </summary>
     [HttpPost("traces")]
-    [Consumes("application/json")]
+    [Consumes("application/json", "application/x-protobuf")]
     public IActionResult ReceiveTraces([FromBody] OtlpTraceRequest request)
     {
         var applicationId = GetApplicationId();
@@ -0,0 +1,49 @@
+using Microsoft.AspNetCore.Mvc.Formatters;
+using APM.Collector.Models.Otlp;
+
+namespace APM.Collector.Formatters;
+
+/// <summary>
+/// Reads OTLP/HTTP protobuf bodies (application/x-protobuf) into the same
+/// request models used for OTLP/JSON.
+/// </summary>
+public class OtlpProtobufInputFormatter : InputFormatter
+{
+    public const string ProtobufContentType = "application/x-protobuf";
+
+    public OtlpProtobufInputFormatter()
+    {
+        SupportedMediaTypes.Add(ProtobufContentType);
+    }
+
+    protected override bool CanReadType(Type type)
+    {
+        return type == typeof(OtlpLogRequest)
+            || type == typeof(OtlpMetricRequest)
+            || type == typeof(OtlpTraceRequest);
+    }
+
+    public override async Task<InputFormatterResult> ReadRequestBodyAsync(InputFormatterContext context)
+    {
+        var request = context.HttpContext.Request;
+        using var buffer = new MemoryStream((int)(request.ContentLength ?? 0));
+        await request.Body.CopyToAsync(buffer, context.HttpContext.RequestAborted);
+        var data = new ReadOnlyMemory<byte>(buffer.GetBuffer(), 0, (int)buffer.Length);
+
+        try
+        {
+            object model = context.ModelType == typeof(OtlpLogRequest)
+                ? OtlpProtobufParser.ParseLogs(data.Span)
+                : context.ModelType == typeof(OtlpMetricRequest)
+                    ? OtlpProtobufParser.ParseMetrics(data.Span)
+                    : OtlpProtobufParser.ParseTraces(data.Span);
+
+            return await InputFormatterResult.SuccessAsync(model);
+        }
+        catch (FormatException ex)
+        {
+            context.ModelState.AddModelError(context.ModelName, ex.Message);
+            return await InputFormatterResult.FailureAsync();
+        }
+    }
+}
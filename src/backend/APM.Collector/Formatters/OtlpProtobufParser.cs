@@ -0,0 +1,517 @@
+using APM.Collector.Models.Otlp;
+
+namespace APM.Collector.Formatters;
+
+/// <summary>
+/// Decodes OTLP/protobuf export requests into the OTLP/JSON request models.
+/// Field numbers follow opentelemetry-proto; unknown fields are skipped.
+/// </summary>
+public static class OtlpProtobufParser
+{
+    public static OtlpLogRequest ParseLogs(ReadOnlySpan<byte> data)
+    {
+        var request = new OtlpLogRequest();
+        var reader = new ProtobufReader(data);
+        while (reader.TryReadTag(out var field, out var wire))
+        {
+            if (field == 1) request.ResourceLogs.Add(ParseResourceLogs(reader.ReadBytes()));
+            else reader.Skip(wire);
+        }
+        return request;
+    }
+
+    public static OtlpMetricRequest ParseMetrics(ReadOnlySpan<byte> data)
+    {
+        var request = new OtlpMetricRequest();
+        var reader = new ProtobufReader(data);
+        while (reader.TryReadTag(out var field, out var wire))
+        {
+            if (field == 1) request.ResourceMetrics.Add(ParseResourceMetrics(reader.ReadBytes()));
+            else reader.Skip(wire);
+        }
+        return request;
+    }
+
+    public static OtlpTraceRequest ParseTraces(ReadOnlySpan<byte> data)
+    {
+        var request = new OtlpTraceRequest();
+        var reader = new ProtobufReader(data);
+        while (reader.TryReadTag(out var field, out var wire))
+        {
+            if (field == 1) request.ResourceSpans.Add(ParseResourceSpans(reader.ReadBytes()));
+            else reader.Skip(wire);
+        }
+        return request;
+    }
+
+    // common/v1
+
+    private static OtlpResource ParseResource(ReadOnlySpan<byte> data)
+    {
+        var resource = new OtlpResource { Attributes = new() };
+        var reader = new ProtobufReader(data);
+        while (reader.TryReadTag(out var field, out var wire))
+        {
+            if (field == 1) resource.Attributes.Add(ParseKeyValue(reader.ReadBytes()));
+            else reader.Skip(wire);
+        }
+        return resource;
+    }
+
+    private static InstrumentationScope ParseScope(ReadOnlySpan<byte> data)
+    {
+        var scope = new InstrumentationScope();
+        var reader = new ProtobufReader(data);
+        while (reader.TryReadTag(out var field, out var wire))
+        {
+            switch (field)
+            {
+                case 1: scope.Name = reader.ReadString(); break;
+                case 2: scope.Version = reader.ReadString(); break;
+                default: reader.Skip(wire); break;
+            }
+        }
+        return scope;
+    }
+
+    private static KeyValue ParseKeyValue(ReadOnlySpan<byte> data)
+    {
+        var keyValue = new KeyValue();
+        var reader = new ProtobufReader(data);
+        while (reader.TryReadTag(out var field, out var wire))
+        {
+            switch (field)
+            {
+                case 1: keyValue.Key = reader.ReadString(); break;
+                case 2: keyValue.Value = ParseAnyValue(reader.ReadBytes()); break;
+                default: reader.Skip(wire); break;
+            }
+        }
+        return keyValue;
+    }
+
+    private static OtlpAnyValue ParseAnyValue(ReadOnlySpan<byte> data)
+    {
+        var value = new OtlpAnyValue();
+        var reader = new ProtobufReader(data);
+        while (reader.TryReadTag(out var field, out var wire))
+        {
+            switch (field)
+            {
+                case 1: value.StringValue = reader.ReadString(); break;
+                case 2: value.BoolValue = reader.ReadVarint() != 0; break;
+                case 3: value.IntValue = (long)reader.ReadVarint(); break;
+                case 4: value.DoubleValue = reader.ReadDouble(); break;
+                case 5: value.ArrayValue = ParseArrayValue(reader.ReadBytes()); break;
+                case 6: value.KvlistValue = ParseKvlistValue(reader.ReadBytes()); break;
+                default: reader.Skip(wire); break;
+            }
+        }
+        return value;
+    }
+
+    private static ArrayValue ParseArrayValue(ReadOnlySpan<byte> data)
+    {
+        var array = new ArrayValue { Values = new() };
+        var reader = new ProtobufReader(data);
+        while (reader.TryReadTag(out var field, out var wire))
+        {
+            if (field == 1) array.Values.Add(ParseAnyValue(reader.ReadBytes()));
+            else reader.Skip(wire);
+        }
+        return array;
+    }
+
+    private static KvlistValue ParseKvlistValue(ReadOnlySpan<byte> data)
+    {
+        var kvlist = new KvlistValue { Values = new() };
+        var reader = new ProtobufReader(data);
+        while (reader.TryReadTag(out var field, out var wire))
+        {
+            if (field == 1) kvlist.Values.Add(ParseKeyValue(reader.ReadBytes()));
+            else reader.Skip(wire);
+        }
+        return kvlist;
+    }
+
+    // logs/v1
+
+    private static ResourceLogs ParseResourceLogs(ReadOnlySpan<byte> data)
+    {
+        var resourceLogs = new ResourceLogs();
+        var reader = new ProtobufReader(data);
+        while (reader.TryReadTag(out var field, out var wire))
+        {
+            switch (field)
+            {
+                case 1: resourceLogs.Resource = ParseResource(reader.ReadBytes()); break;
+                case 2: resourceLogs.ScopeLogs.Add(ParseScopeLogs(reader.ReadBytes())); break;
+                default: reader.Skip(wire); break;
+            }
+        }
+        return resourceLogs;
+    }
+
+    private static ScopeLogs ParseScopeLogs(ReadOnlySpan<byte> data)
+    {
+        var scopeLogs = new ScopeLogs();
+        var reader = new ProtobufReader(data);
+        while (reader.TryReadTag(out var field, out var wire))
+        {
+            switch (field)
+            {
+                case 1: scopeLogs.Scope = ParseScope(reader.ReadBytes()); break;
+                case 2: scopeLogs.LogRecords.Add(ParseLogRecord(reader.ReadBytes())); break;
+                default: reader.Skip(wire); break;
+            }
+        }
+        return scopeLogs;
+    }
+
+    private static LogRecord ParseLogRecord(ReadOnlySpan<byte> data)
+    {
+        var record = new LogRecord();
+        var reader = new ProtobufReader(data);
+        while (reader.TryReadTag(out var field, out var wire))
+        {
+            switch (field)
+            {
+                case 1: record.TimeUnixNano = reader.ReadFixed64(); break;
+                case 2: record.SeverityNumber = (int)reader.ReadVarint(); break;
+                case 3: record.SeverityText = reader.ReadString(); break;
+                case 5: record.Body = ParseAnyValue(reader.ReadBytes()); break;
+                case 6: (record.Attributes ??= new()).Add(ParseKeyValue(reader.ReadBytes())); break;
+                case 9: record.TraceId = reader.ReadHex(); break;
+                case 10: record.SpanId = reader.ReadHex(); break;
+                case 11: record.ObservedTimeUnixNano = reader.ReadFixed64(); break;
+                default: reader.Skip(wire); break;
+            }
+        }
+        return record;
+    }
+
+    // metrics/v1
+
+    private static ResourceMetrics ParseResourceMetrics(ReadOnlySpan<byte> data)
+    {
+        var resourceMetrics = new ResourceMetrics();
+        var reader = new ProtobufReader(data);
+        while (reader.TryReadTag(out var field, out var wire))
+        {
+            switch (field)
+            {
+                case 1: resourceMetrics.Resource = ParseResource(reader.ReadBytes()); break;
+                case 2: resourceMetrics.ScopeMetrics.Add(ParseScopeMetrics(reader.ReadBytes())); break;
+                default: reader.Skip(wire); break;
+            }
+        }
+        return resourceMetrics;
+    }
+
+    private static ScopeMetrics ParseScopeMetrics(ReadOnlySpan<byte> data)
+    {
+        var scopeMetrics = new ScopeMetrics();
+        var reader = new ProtobufReader(data);
+        while (reader.TryReadTag(out var field, out var wire))
+        {
+            switch (field)
+            {
+                case 1: scopeMetrics.Scope = ParseScope(reader.ReadBytes()); break;
+                case 2: scopeMetrics.Metrics.Add(ParseMetric(reader.ReadBytes())); break;
+                default: reader.Skip(wire); break;
+            }
+        }
+        return scopeMetrics;
+    }
+
+    private static Metric ParseMetric(ReadOnlySpan<byte> data)
+    {
+        var metric = new Metric();
+        var reader = new ProtobufReader(data);
+        while (reader.TryReadTag(out var field, out var wire))
+        {
+            switch (field)
+            {
+                case 1: metric.Name = reader.ReadString(); break;
+                case 2: metric.Description = reader.ReadString(); break;
+                case 3: metric.Unit = reader.ReadString(); break;
+                case 5: metric.Gauge = ParseGauge(reader.ReadBytes()); break;
+                case 7: metric.Sum = ParseSum(reader.ReadBytes()); break;
+                case 9: metric.Histogram = ParseHistogram(reader.ReadBytes()); break;
+                case 10: metric.ExponentialHistogram = ParseExponentialHistogram(reader.ReadBytes()); break;
+                default: reader.Skip(wire); break;
+            }
+        }
+        return metric;
+    }
+
+    private static Gauge ParseGauge(ReadOnlySpan<byte> data)
+    {
+        var gauge = new Gauge();
+        var reader = new ProtobufReader(data);
+        while (reader.TryReadTag(out var field, out var wire))
+        {
+            if (field == 1) gauge.DataPoints.Add(ParseNumberDataPoint(reader.ReadBytes()));
+            else reader.Skip(wire);
+        }
+        return gauge;
+    }
+
+    private static Sum ParseSum(ReadOnlySpan<byte> data)
+    {
+        var sum = new Sum();
+        var reader = new ProtobufReader(data);
+        while (reader.TryReadTag(out var field, out var wire))
+        {
+            switch (field)
+            {
+                case 1: sum.DataPoints.Add(ParseNumberDataPoint(reader.ReadBytes())); break;
+                case 2: sum.AggregationTemporality = (int)reader.ReadVarint(); break;
+                case 3: sum.IsMonotonic = reader.ReadVarint() != 0; break;
+                default: reader.Skip(wire); break;
+            }
+        }
+        return sum;
+    }
+
+    private static Histogram ParseHistogram(ReadOnlySpan<byte> data)
+    {
+        var histogram = new Histogram();
+        var reader = new ProtobufReader(data);
+        while (reader.TryReadTag(out var field, out var wire))
+        {
+            switch (field)
+            {
+                case 1: histogram.DataPoints.Add(ParseHistogramDataPoint(reader.ReadBytes())); break;
+                case 2: histogram.AggregationTemporality = (int)reader.ReadVarint(); break;
+                default: reader.Skip(wire); break;
+            }
+        }
+        return histogram;
+    }
+
+    private static ExponentialHistogram ParseExponentialHistogram(ReadOnlySpan<byte> data)
+    {
+        var histogram = new ExponentialHistogram();
+        var reader = new ProtobufReader(data);
+        while (reader.TryReadTag(out var field, out var wire))
+        {
+            switch (field)
+            {
+                case 1: histogram.DataPoints.Add(ParseExponentialHistogramDataPoint(reader.ReadBytes())); break;
+                case 2: histogram.AggregationTemporality = (int)reader.ReadVarint(); break;
+                default: reader.Skip(wire); break;
+            }
+        }
+        return histogram;
+    }
+
+    private static NumberDataPoint ParseNumberDataPoint(ReadOnlySpan<byte> data)
+    {
+        var point = new NumberDataPoint();
+        var reader = new ProtobufReader(data);
+        while (reader.TryReadTag(out var field, out var wire))
+        {
+            switch (field)
+            {
+                case 2: point.StartTimeUnixNano = reader.ReadFixed64(); break;
+                case 3: point.TimeUnixNano = reader.ReadFixed64(); break;
+                case 4: point.AsDouble = reader.ReadDouble(); break;
+                case 6: point.AsInt = (long)reader.ReadFixed64(); break;
+                case 7: (point.Attributes ??= new()).Add(ParseKeyValue(reader.ReadBytes())); break;
+                default: reader.Skip(wire); break;
+            }
+        }
+        return point;
+    }
+
+    private static HistogramDataPoint ParseHistogramDataPoint(ReadOnlySpan<byte> data)
+    {
+        var point = new HistogramDataPoint();
+        var reader = new ProtobufReader(data);
+        while (reader.TryReadTag(out var field, out var wire))
+        {
+            switch (field)
+            {
+                case 2: point.StartTimeUnixNano = reader.ReadFixed64(); break;
+                case 3: point.TimeUnixNano = reader.ReadFixed64(); break;
+                case 4: point.Count = reader.ReadFixed64(); break;
+                case 5: point.Sum = reader.ReadDouble(); break;
+                case 6: ReadFixed64Values(ref reader, wire, point.BucketCounts ??= new()); break;
+                case 7: ReadDoubleValues(ref reader, wire, point.ExplicitBounds ??= new()); break;
+                case 9: (point.Attributes ??= new()).Add(ParseKeyValue(reader.ReadBytes())); break;
+                case 11: point.Min = reader.ReadDouble(); break;
+                case 12: point.Max = reader.ReadDouble(); break;
+                default: reader.Skip(wire); break;
+            }
+        }
+        return point;
+    }
+
+    private static ExponentialHistogramDataPoint ParseExponentialHistogramDataPoint(ReadOnlySpan<byte> data)
+    {
+        var point = new ExponentialHistogramDataPoint();
+        var reader = new ProtobufReader(data);
+        while (reader.TryReadTag(out var field, out var wire))
+        {
+            switch (field)
+            {
+                case 1: (point.Attributes ??= new()).Add(ParseKeyValue(reader.ReadBytes())); break;
+                case 2: point.StartTimeUnixNano = reader.ReadFixed64(); break;
+                case 3: point.TimeUnixNano = reader.ReadFixed64(); break;
+                case 4: point.Count = reader.ReadFixed64(); break;
+                case 5: point.Sum = reader.ReadDouble(); break;
+                case 6: point.Scale = reader.ReadSInt32(); break;
+                case 7: point.ZeroCount = reader.ReadFixed64(); break;
+                case 8: point.Positive = ParseBuckets(reader.ReadBytes()); break;
+                case 9: point.Negative = ParseBuckets(reader.ReadBytes()); break;
+                case 12: point.Min = reader.ReadDouble(); break;
+                case 13: point.Max = reader.ReadDouble(); break;
+                default: reader.Skip(wire); break;
+            }
+        }
+        return point;
+    }
+
+    private static ExponentialHistogramBuckets ParseBuckets(ReadOnlySpan<byte> data)
+    {
+        var buckets = new ExponentialHistogramBuckets { BucketCounts = new() };
+        var reader = new ProtobufReader(data);
+        while (reader.TryReadTag(out var field, out var wire))
+        {
+            switch (field)
+            {
+                case 1: buckets.Offset = reader.ReadSInt32(); break;
+                case 2: ReadVarintValues(ref reader, wire, buckets.BucketCounts); break;
+                default: reader.Skip(wire); break;
+            }
+        }
+        return buckets;
+    }
+
+    // trace/v1
+
+    private static ResourceSpans ParseResourceSpans(ReadOnlySpan<byte> data)
+    {
+        var resourceSpans = new ResourceSpans();
+        var reader = new ProtobufReader(data);
+        while (reader.TryReadTag(out var field, out var wire))
+        {
+            switch (field)
+            {
+                case 1: resourceSpans.Resource = ParseResource(reader.ReadBytes()); break;
+                case 2: resourceSpans.ScopeSpans.Add(ParseScopeSpans(reader.ReadBytes())); break;
+                default: reader.Skip(wire); break;
+            }
+        }
+        return resourceSpans;
+    }
+
+    private static ScopeSpans ParseScopeSpans(ReadOnlySpan<byte> data)
+    {
+        var scopeSpans = new ScopeSpans();
+        var reader = new ProtobufReader(data);
+        while (reader.TryReadTag(out var field, out var wire))
+        {
+            switch (field)
+            {
+                case 1: scopeSpans.Scope = ParseScope(reader.ReadBytes()); break;
+                case 2: scopeSpans.Spans.Add(ParseSpan(reader.ReadBytes())); break;
+                default: reader.Skip(wire); break;
+            }
+        }
+        return scopeSpans;
+    }
+
+    private static Span ParseSpan(ReadOnlySpan<byte> data)
+    {
+        var span = new Span();
+        var reader = new ProtobufReader(data);
+        while (reader.TryReadTag(out var field, out var wire))
+        {
+            switch (field)
+            {
+                case 1: span.TraceId = reader.ReadHex(); break;
+                case 2: span.SpanId = reader.ReadHex(); break;
+                case 4: span.ParentSpanId = reader.ReadHex(); break;
+                case 5: span.Name = reader.ReadString(); break;
+                case 6: span.Kind = (int)reader.ReadVarint(); break;
+                case 7: span.StartTimeUnixNano = reader.ReadFixed64(); break;
+                case 8: span.EndTimeUnixNano = reader.ReadFixed64(); break;
+                case 9: (span.Attributes ??= new()).Add(ParseKeyValue(reader.ReadBytes())); break;
+                case 11: (span.Events ??= new()).Add(ParseSpanEvent(reader.ReadBytes())); break;
+                case 15: span.Status = ParseStatus(reader.ReadBytes()); break;
+                default: reader.Skip(wire); break;
+            }
+        }
+        return span;
+    }
+
+    private static SpanEvent ParseSpanEvent(ReadOnlySpan<byte> data)
+    {
+        var spanEvent = new SpanEvent();
+        var reader = new ProtobufReader(data);
+        while (reader.TryReadTag(out var field, out var wire))
+        {
+            switch (field)
+            {
+                case 1: spanEvent.TimeUnixNano = reader.ReadFixed64(); break;
+                case 2: spanEvent.Name = reader.ReadString(); break;
+                case 3: (spanEvent.Attributes ??= new()).Add(ParseKeyValue(reader.ReadBytes())); break;
+                default: reader.Skip(wire); break;
+            }
+        }
+        return spanEvent;
+    }
+
+    private static SpanStatus ParseStatus(ReadOnlySpan<byte> data)
+    {
+        var status = new SpanStatus();
+        var reader = new ProtobufReader(data);
+        while (reader.TryReadTag(out var field, out var wire))
+        {
+            switch (field)
+            {
+                case 2: status.Message = reader.ReadString(); break;
+                case 3: status.Code = (int)reader.ReadVarint(); break;
+                default: reader.Skip(wire); break;
+            }
+        }
+        return status;
+    }
+
+    // Repeated scalars may arrive packed (length-delimited) or one per tag.
+
+    private static void ReadFixed64Values(ref ProtobufReader reader, int wire, List<ulong> values)
+    {
+        if (wire != ProtobufReader.WireLengthDelimited)
+        {
+            values.Add(reader.ReadFixed64());
+            return;
+        }
+        var packed = new ProtobufReader(reader.ReadBytes());
+        while (packed.HasMore) values.Add(packed.ReadFixed64());
+    }
+
+    private static void ReadDoubleValues(ref ProtobufReader reader, int wire, List<double> values)
+    {
+        if (wire != ProtobufReader.WireLengthDelimited)
+        {
+            values.Add(reader.ReadDouble());
+            return;
+        }
+        var packed = new ProtobufReader(reader.ReadBytes());
+        while (packed.HasMore) values.Add(packed.ReadDouble());
+    }
+
+    private static void ReadVarintValues(ref ProtobufReader reader, int wire, List<ulong> values)
+    {
+        if (wire != ProtobufReader.WireLengthDelimited)
+        {
+            values.Add(reader.ReadVarint());
+            return;
+        }
+        var packed = new ProtobufReader(reader.ReadBytes());
+        while (packed.HasMore) values.Add(packed.ReadVarint());
+    }
+}
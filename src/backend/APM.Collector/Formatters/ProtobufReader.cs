@@ -0,0 +1,97 @@
+using System.Buffers.Binary;
+using System.Text;
+
+namespace APM.Collector.Formatters;
+
+/// <summary>
+/// Minimal forward-only reader for the protobuf wire format.
+/// </summary>
+public ref struct ProtobufReader
+{
+    public const int WireVarint = 0;
+    public const int WireFixed64 = 1;
+    public const int WireLengthDelimited = 2;
+    public const int WireFixed32 = 5;
+
+    private readonly ReadOnlySpan<byte> _data;
+    private int _position;
+
+    public ProtobufReader(ReadOnlySpan<byte> data)
+    {
+        _data = data;
+        _position = 0;
+    }
+
+    public bool HasMore => _position < _data.Length;
+
+    public bool TryReadTag(out int fieldNumber, out int wireType)
+    {
+        if (_position >= _data.Length)
+        {
+            fieldNumber = 0;
+            wireType = 0;
+            return false;
+        }
+
+        var tag = ReadVarint();
+        fieldNumber = (int)(tag >> 3);
+        wireType = (int)(tag & 0x7);
+        return true;
+    }
+
+    public ulong ReadVarint()
+    {
+        ulong result = 0;
+        for (var shift = 0; shift < 64; shift += 7)
+        {
+            if (_position >= _data.Length)
+                throw new FormatException("Truncated varint");
+
+            var b = _data[_position++];
+            result |= (ulong)(b & 0x7F) << shift;
+            if ((b & 0x80) == 0)
+                return result;
+        }
+        throw new FormatException("Malformed varint");
+    }
+
+    public int ReadSInt32()
+    {
+        var value = (uint)ReadVarint();
+        return (int)(value >> 1) ^ -(int)(value & 1);
+    }
+
+    public ulong ReadFixed64() => BinaryPrimitives.ReadUInt64LittleEndian(Take(8));
+
+    public uint ReadFixed32() => BinaryPrimitives.ReadUInt32LittleEndian(Take(4));
+
+    public double ReadDouble() => BitConverter.Int64BitsToDouble((long)ReadFixed64());
+
+    public ReadOnlySpan<byte> ReadBytes() => Take((int)ReadVarint());
+
+    public string ReadString() => Encoding.UTF8.GetString(ReadBytes());
+
+    public string ReadHex() => Convert.ToHexString(ReadBytes()).ToLowerInvariant();
+
+    public void Skip(int wireType)
+    {
+        switch (wireType)
+        {
+            case WireVarint: ReadVarint(); break;
+            case WireFixed64: Take(8); break;
+            case WireLengthDelimited: ReadBytes(); break;
+            case WireFixed32: Take(4); break;
+            default: throw new FormatException($"Unsupported wire type {wireType}");
+        }
+    }
+
+    private ReadOnlySpan<byte> Take(int length)
+    {
+        if (length < 0 || _position + length > _data.Length)
+            throw new FormatException("Truncated message");
+
+        var slice = _data.Slice(_position, length);
+        _position += length;
+        return slice;
+    }
+}
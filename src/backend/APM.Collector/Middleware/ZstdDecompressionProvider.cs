@@ -0,0 +1,18 @@
+using Microsoft.AspNetCore.RequestDecompression;
+using ZstdSharp;
+
+namespace APM.Collector.Middleware;
+
+/// <summary>
+/// Decompresses request bodies sent with <c>Content-Encoding: zstd</c>,
+/// which the built-in request decompression providers do not cover.
+/// </summary>
+public class ZstdDecompressionProvider : IDecompressionProvider
+{
+    public const string EncodingName = "zstd";
+
+    public Stream GetDecompressionStream(Stream stream)
+    {
+        return new DecompressionStream(stream);
+    }
+}
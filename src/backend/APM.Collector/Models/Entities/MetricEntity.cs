@@ -26,6 +26,9 @@ public class MetricEntity : ITableEntity
     public double? ValueMax { get; set; }
     public double? ValueSum { get; set; }
     public long? ValueCount { get; set; }
+    public double? ValueP50 { get; set; }
+    public double? ValueP95 { get; set; }
+    public double? ValueP99 { get; set; }
 
     // Attributes (stored as JSON)
     public string? Attributes { get; set; }
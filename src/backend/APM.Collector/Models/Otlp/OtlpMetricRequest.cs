@@ -48,6 +48,9 @@ public class Metric
 
     [JsonPropertyName("histogram")]
     public Histogram? Histogram { get; set; }
+
+    [JsonPropertyName("exponentialHistogram")]
+    public ExponentialHistogram? ExponentialHistogram { get; set; }
 }
 
 public class Gauge
@@ -77,6 +80,15 @@ public class Histogram
     public int AggregationTemporality { get; set; }
 }
 
+public class ExponentialHistogram
+{
+    [JsonPropertyName("dataPoints")]
+    public List<ExponentialHistogramDataPoint> DataPoints { get; set; } = new();
+
+    [JsonPropertyName("aggregationTemporality")]
+    public int AggregationTemporality { get; set; }
+}
+
 public class NumberDataPoint
 {
     [JsonPropertyName("timeUnixNano")]
@@ -126,3 +138,89 @@ public class HistogramDataPoint
     [JsonPropertyName("attributes")]
     public List<KeyValue>? Attributes { get; set; }
 }
+
+public class ExponentialHistogramDataPoint
+{
+    [JsonPropertyName("timeUnixNano")]
+    public ulong TimeUnixNano { get; set; }
+
+    [JsonPropertyName("startTimeUnixNano")]
+    public ulong? StartTimeUnixNano { get; set; }
+
+    [JsonPropertyName("count")]
+    public ulong Count { get; set; }
+
+    [JsonPropertyName("sum")]
+    public double? Sum { get; set; }
+
+    [JsonPropertyName("min")]
+    public double? Min { get; set; }
+
+    [JsonPropertyName("max")]
+    public double? Max { get; set; }
+
+    [JsonPropertyName("scale")]
+    public int Scale { get; set; }
+
+    [JsonPropertyName("zeroCount")]
+    public ulong ZeroCount { get; set; }
+
+    [JsonPropertyName("positive")]
+    public ExponentialHistogramBuckets? Positive { get; set; }
+
+    [JsonPropertyName("negative")]
+    public ExponentialHistogramBuckets? Negative { get; set; }
+
+    [JsonPropertyName("attributes")]
+    public List<KeyValue>? Attributes { get; set; }
+
+    /// <summary>
+    /// Estimate the value at quantile q (0..1). Bucket i covers
+    /// (base^i, base^(i+1)] with base = 2^(2^-scale).
+    /// </summary>
+    public double? GetQuantile(double q)
+    {
+        if (Count == 0)
+            return null;
+
+        var rank = q * (Count - 1);
+        var logBase = Math.Pow(2, -Scale) * Math.Log(2);
+        double Midpoint(int index) => 2 * Math.Exp((index + 1) * logBase) / (Math.Exp(logBase) + 1);
+        double Clamp(double value) => Math.Min(Math.Max(value, Min ?? value), Max ?? value);
+
+        ulong seen = 0;
+        var negative = Negative?.BucketCounts;
+        if (negative != null)
+        {
+            for (var i = negative.Count - 1; i >= 0; i--)
+            {
+                seen += negative[i];
+                if (seen > rank) return Clamp(-Midpoint(Negative!.Offset + i));
+            }
+        }
+
+        seen += ZeroCount;
+        if (seen > rank) return Clamp(0);
+
+        var positive = Positive?.BucketCounts;
+        if (positive != null)
+        {
+            for (var i = 0; i < positive.Count; i++)
+            {
+                seen += positive[i];
+                if (seen > rank) return Clamp(Midpoint(Positive!.Offset + i));
+            }
+        }
+
+        return Max;
+    }
+}
+
+public class ExponentialHistogramBuckets
+{
+    [JsonPropertyName("offset")]
+    public int Offset { get; set; }
+
+    [JsonPropertyName("bucketCounts")]
+    public List<ulong>? BucketCounts { get; set; }
+}
@@ -1,4 +1,5 @@
 using APM.Collector.Configuration;
+using APM.Collector.Formatters;
 using APM.Collector.Services;
 using APM.Collector.Middleware;
 
@@ -15,8 +16,18 @@ builder.Services.AddSingleton<ITableStorageService, TableStorageService>();
 builder.Services.AddSingleton<ITelemetryProcessor, TelemetryProcessor>();
 builder.Services.AddHostedService<BatchProcessorService>();
 
+// Accept gzip/deflate/brotli/zstd compressed OTLP request bodies
+builder.Services.AddRequestDecompression(options =>
+{
+    options.DecompressionProviders.Add(ZstdDecompressionProvider.EncodingName, new ZstdDecompressionProvider());
+});
+
 // API
-builder.Services.AddControllers();
+builder.Services.AddControllers(options =>
+{
+    // OTLP/HTTP protobuf alongside the default JSON formatter
+    options.InputFormatters.Insert(0, new OtlpProtobufInputFormatter());
+});
 builder.Services.AddEndpointsApiExplorer();
 builder.Services.AddSwaggerGen(c =>
 {
@@ -44,6 +55,7 @@ if (app.Environment.IsDevelopment())
 }
 
 app.UseCors();
+app.UseRequestDecompression();
 app.UseMiddleware<ApiKeyAuthMiddleware>();
 app.MapControllers();
 
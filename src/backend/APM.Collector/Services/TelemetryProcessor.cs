@@ -117,6 +117,24 @@ public class TelemetryProcessor : ITelemetryProcessor
                 _metricQueue.Enqueue(entity);
             }
         }
+
+        if (metric.ExponentialHistogram != null)
+        {
+            foreach (var dp in metric.ExponentialHistogram.DataPoints)
+            {
+                var timestamp = DateTimeOffset.FromUnixTimeMilliseconds((long)(dp.TimeUnixNano / 1_000_000));
+                var entity = CreateMetricEntity(metric, "Histogram", dp.Sum ?? 0, timestamp,
+                    applicationId, appName, resourceAttributes, dp.Attributes);
+                entity.ValueMin = dp.Min;
+                entity.ValueMax = dp.Max;
+                entity.ValueSum = dp.Sum;
+                entity.ValueCount = (long)dp.Count;
+                entity.ValueP50 = dp.GetQuantile(0.50);
+                entity.ValueP95 = dp.GetQuantile(0.95);
+                entity.ValueP99 = dp.GetQuantile(0.99);
+                _metricQueue.Enqueue(entity);
+            }
+        }
     }
 
     private MetricEntity CreateMetricEntity(Metric metric, string type, double value, DateTimeOffset timestamp,
@@ -0,0 +1,256 @@
+"""
+Benchmarks for the Racelogic APM Python SDK.
+
+Measures the per-call cost of the recording hot paths, the cost of
+encoding and exporting a batch, end-to-end exporter throughput and memory
+held while the collector is unreachable, all against the in-process stub
+collector.
+
+Usage:
+    python benchmarks/bench.py
+    python benchmarks/bench.py --json results.json
+    python benchmarks/bench.py --baseline results.json --max-regression 0.25
+"""
+
+import argparse
+import gc
+import json
+import logging
+import os
+import socket
+import sys
+import time
+import tracemalloc
+from typing import Callable, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from racelogic_apm import ApmClient, ApmHandler  # noqa: E402
+from racelogic_apm.middleware import ROUTE_ENVIRON_KEY  # noqa: E402
+from stub_collector import StubCollector  # noqa: E402
+
+
+# Settings that keep the worker idle so hot-path numbers only include the call.
+QUIET = {"flush_interval_ms": 3_600_000, "batch_size": 10_000_000}
+
+
+def _client(endpoint: str, **options) -> ApmClient:
+    return ApmClient(endpoint=endpoint, application_name="apm-bench", **options)
+
+
+def _unreachable_endpoint() -> str:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+
+def measure_call(func: Callable[[], None], iterations: int, repeats: int = 5) -> dict:
+    """Best-of-``repeats`` ns per call, plus memory retained per call."""
+    for _ in range(min(iterations, 1000)):
+        func()
+
+    best = float("inf")
+    for _ in range(repeats):
+        gc.collect()
+        start = time.perf_counter_ns()
+        for _ in range(iterations):
+            func()
+        best = min(best, (time.perf_counter_ns() - start) / iterations)
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for _ in range(iterations):
+        func()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    diff = after.compare_to(before, "filename")
+    return {
+        "ns_per_call": round(best, 1),
+        "retained_bytes_per_call": round(sum(d.size_diff for d in diff) / iterations, 1),
+        "retained_blocks_per_call": round(sum(d.count_diff for d in diff) / iterations, 2),
+    }
+
+
+def bench_hot_paths(endpoint: str, iterations: int) -> dict:
+    # Queues sized so nothing is dropped while measuring.
+    apm = _client(endpoint, max_queue_size=iterations * 8, **QUIET)
+    try:
+        raise RuntimeError("dependency unavailable")
+    except RuntimeError as e:
+        error = e
+
+    @apm.trace("bench_traced")
+    def traced() -> None:
+        pass
+
+    def span() -> None:
+        with apm.tracer.start_span("bench_span"):
+            pass
+
+    stdlib = logging.getLogger("apm.bench")
+    stdlib.propagate = False
+    stdlib.setLevel(logging.INFO)
+    stdlib.addHandler(ApmHandler(apm.logger))
+
+    def wsgi_app(environ, start_response):
+        environ[ROUTE_ENVIRON_KEY] = "/orders/<int:order_id>"
+        start_response("200 OK", [])
+        return [b""]
+
+    wsgi = apm.wsgi_middleware(wsgi_app)
+    environ = {"REQUEST_METHOD": "GET", "PATH_INFO": "/orders/42"}
+
+    def start_response(status, headers, exc_info=None):
+        pass
+
+    cases = {
+        "logger.info": lambda: apm.logger.info("order placed"),
+        "logger.info+attrs": lambda: apm.logger.info(
+            "order placed", order_id=42, region="eu", amount=9.99
+        ),
+        "logger.error+exception": lambda: apm.logger.error("charge failed", exception=error),
+        "metrics.counter": lambda: apm.metrics.counter("orders", 1, region="eu"),
+        "metrics.histogram": lambda: apm.metrics.histogram("latency_ms", 12.5, route="/orders"),
+        "tracer.start_span": span,
+        "@apm.trace": traced,
+        "logging.Handler": lambda: stdlib.info("order %s placed", 42),
+        "wsgi_middleware": lambda: wsgi(environ, start_response),
+    }
+    results = {name: measure_call(func, iterations) for name, func in cases.items()}
+    apm.shutdown(timeout=0)
+    return results
+
+
+def bench_flush(endpoint: str, batches: int) -> dict:
+    """Cost of encoding and exporting one ``batch_size`` batch (the old ``_flush``)."""
+    results = {}
+    for label, options in {
+        "json+gzip": {"encoding": "json", "compression": "gzip"},
+        "json": {"encoding": "json", "compression": None},
+        "protobuf+gzip": {"encoding": "protobuf", "compression": "gzip"},
+    }.items():
+        apm = _client(endpoint, **QUIET, **options)
+        batch_size = apm._config.batch_size = 100
+        best = float("inf")
+        for _ in range(batches):
+            for i in range(batch_size):
+                apm.logger.info("order placed", order_id=i, region="eu")
+            start = time.perf_counter_ns()
+            apm.logger.flush()
+            best = min(best, time.perf_counter_ns() - start)
+        apm.shutdown(timeout=0)
+        results[f"flush[{label}]"] = {
+            "ns_per_batch": best,
+            "ns_per_record": round(best / batch_size, 1),
+        }
+    return results
+
+
+def bench_throughput(collector: StubCollector, records: int, latency_ms: float) -> dict:
+    """End-to-end records/s exported with default settings."""
+    collector.latency_ms = latency_ms
+    collector.stats.reset()
+    apm = _client(collector.endpoint, flush_interval_ms=50, max_queue_size=records)
+    start = time.perf_counter()
+    for i in range(records):
+        apm.logger.info("order placed", order_id=i)
+    recorded = time.perf_counter() - start
+    delivered = collector.wait_for_records(records, timeout=120)
+    elapsed = time.perf_counter() - start
+    apm.shutdown(timeout=5)
+    collector.latency_ms = 0.0
+    return {
+        f"throughput[latency={latency_ms:g}ms]": {
+            "records": collector.stats.records,
+            "complete": delivered,
+            "records_per_s": round(collector.stats.records / elapsed),
+            "record_s": round(recorded, 3),
+            "requests": collector.stats.requests,
+        }
+    }
+
+
+def bench_backlog(records: int) -> dict:
+    """Memory held while the collector is unreachable."""
+    results = {}
+    for max_queue_size in (2048, 100_000):
+        gc.collect()
+        tracemalloc.start()
+        apm = _client(
+            _unreachable_endpoint(), flush_interval_ms=50, max_queue_size=max_queue_size
+        )
+        for i in range(records):
+            apm.logger.info("order placed", order_id=i, region="eu")
+        time.sleep(0.5)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[f"backlog[max_queue_size={max_queue_size}]"] = {
+            "records": records,
+            "queued": apm.logger._processor._queue.qsize(),
+            "dropped": apm.logger.dropped_count,
+            "held_mb": round(current / 1e6, 2),
+            "peak_mb": round(peak / 1e6, 2),
+        }
+        apm.shutdown(timeout=0)
+    return results
+
+
+def check_regressions(results: dict, baseline: dict, max_regression: float) -> list[str]:
+    """Hot-path and flush timings slower than baseline by more than ``max_regression``."""
+    failures = []
+    for name, metrics in results.items():
+        for key in ("ns_per_call", "ns_per_record"):
+            if key not in metrics or key not in baseline.get(name, {}):
+                continue
+            limit = baseline[name][key] * (1 + max_regression)
+            if metrics[key] > limit:
+                failures.append(
+                    f"{name}: {metrics[key]:.0f} {key} > {limit:.0f} "
+                    f"(baseline {baseline[name][key]:.0f})"
+                )
+    return failures
+
+
+def _print(results: dict) -> None:
+    width = max(len(name) for name in results)
+    for name, metrics in results.items():
+        values = "  ".join(f"{key}={value}" for key, value in metrics.items())
+        print(f"{name:<{width}}  {values}")
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20_000, help="calls per hot-path case")
+    parser.add_argument("--records", type=int, default=50_000, help="records for throughput/backlog")
+    parser.add_argument("--latency-ms", type=float, action="append", help="collector latency (repeatable)")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="compare against a previous --json file")
+    parser.add_argument("--max-regression", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    results: dict = {}
+    with StubCollector() as collector:
+        results.update(bench_hot_paths(collector.endpoint, args.iterations))
+        results.update(bench_flush(collector.endpoint, batches=50))
+        for latency_ms in args.latency_ms or [0.0, 20.0]:
+            results.update(bench_throughput(collector, args.records, latency_ms))
+    results.update(bench_backlog(args.records))
+    _print(results)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures = check_regressions(results, json.load(f), args.max_regression)
+        for failure in failures:
+            print(f"REGRESSION {failure}", file=sys.stderr)
+        return 1 if failures else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+"""In-process stub OTLP/HTTP collector for SDK benchmarks."""
+
+import gzip
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+# OTLP/JSON request key -> keys walked down to the records being counted
+_RECORD_PATHS = {
+    "resourceLogs": ("scopeLogs", "logRecords"),
+    "resourceMetrics": ("scopeMetrics", "metrics"),
+    "resourceSpans": ("scopeSpans", "spans"),
+}
+
+
+class CollectorStats:
+    """Counters updated by the stub collector's request threads."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.failures = 0
+        self.records = 0
+        self.bytes = 0
+
+    def add(self, body_size: int, records: int, failed: bool) -> None:
+        with self._lock:
+            self.requests += 1
+            self.bytes += body_size
+            if failed:
+                self.failures += 1
+            else:
+                self.records += records
+
+    def reset(self) -> None:
+        with self._lock:
+            self.requests = self.failures = self.records = self.bytes = 0
+
+
+class StubCollector:
+    """
+    Accepts ``/v1/logs``, ``/v1/metrics`` and ``/v1/traces`` on localhost.
+
+    ``latency_ms`` delays every response and ``failure_rate`` (0..1) answers
+    that fraction of requests with ``failure_status``; both can be changed
+    while running. Records are counted for OTLP/JSON bodies only.
+
+    Usage:
+        with StubCollector(latency_ms=20) as collector:
+            apm = ApmClient(endpoint=collector.endpoint, application_name="bench")
+    """
+
+    def __init__(
+        self,
+        latency_ms: float = 0.0,
+        failure_rate: float = 0.0,
+        failure_status: int = 503,
+        port: int = 0,
+    ):
+        self.latency_ms = latency_ms
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.stats = CollectorStats()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def endpoint(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def start(self) -> "StubCollector":
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="stub-collector", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def wait_for_records(self, count: int, timeout: float) -> bool:
+        """Wait until ``count`` records have been accepted."""
+        deadline = time.monotonic() + timeout
+        while self.stats.records < count:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.005)
+        return True
+
+    def __enter__(self) -> "StubCollector":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def _handler_class(self) -> type:
+        collector = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Avoid Nagle/delayed-ACK stalls between the header and body writes.
+            disable_nagle_algorithm = True
+
+            def do_POST(self) -> None:
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if collector.latency_ms:
+                    time.sleep(collector.latency_ms / 1000)
+
+                failed = random.random() < collector.failure_rate
+                records = 0 if failed else _count_records(self.headers, body)
+                collector.stats.add(len(body), records, failed)
+
+                if failed:
+                    status, payload = collector.failure_status, b"{}"
+                else:
+                    status, payload = 200, b'{"partialSuccess":{}}'
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args) -> None:
+                pass
+
+        return Handler
+
+
+def _count_records(headers, body: bytes) -> int:
+    if headers.get("Content-Type") != "application/json":
+        return 0
+    encoding = headers.get("Content-Encoding")
+    if encoding == "gzip":
+        body = gzip.decompress(body)
+    elif encoding == "zstd":
+        import zstandard
+
+        body = zstandard.ZstdDecompressor().decompressobj().decompress(body)
+    request = json.loads(body)
+    count = 0
+    for key, (scope_key, items_key) in _RECORD_PATHS.items():
+        for resource in request.get(key, []):
+            for scope in resource.get(scope_key, []):
+                count += len(scope.get(items_key, []))
+    return count
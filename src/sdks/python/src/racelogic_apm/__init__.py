@@ -14,20 +14,82 @@ Usage:
     apm.logger.info("User logged in", user_id=123)
     apm.logger.error("Something failed", exception=e)
 
+    # Forward stdlib logging
+    import logging
+    from racelogic_apm import ApmHandler
+    logging.getLogger().addHandler(ApmHandler(apm.logger))
+
     # Metrics
     apm.metrics.counter("user_logins", 1)
     apm.metrics.gauge("active_users", 42)
 
+    # asyncio / ASGI services
+    from racelogic_apm import AsyncApmClient
+    apm = AsyncApmClient(endpoint="https://apm.example.com", application_name="my-asgi-app")
+    apm.logger.info("Handled request")  # never blocks the event loop
+    await apm.shutdown()
+
+    # Web frameworks: request duration labelled by route template
+    apm.instrument_flask(app)                 # Flask
+    app = apm.wsgi_middleware(app)            # any WSGI app
+    app = async_apm.asgi_middleware(app)      # Starlette / FastAPI
+
     # Tracing
     with apm.tracer.start_span("process_order") as span:
         span.set_attribute("order_id", 456)
         # ... do work
+
+    # Sampling: keep every failure, 1% of other traces and 10 request logs/s
+    from racelogic_apm.sampling import (
+        KeepErrorsSampler, ProbabilitySampler, RateLimitingSampler,
+    )
+    apm = ApmClient(
+        ...,
+        trace_sampler=KeepErrorsSampler(ProbabilitySampler(0.01)),
+        request_log_sampler=KeepErrorsSampler(RateLimitingSampler(10)),
+    )
+
+    # Collector outages: retries back off with jitter and honour Retry-After;
+    # after circuit_breaker_threshold straight failures exports pause
+    apm = ApmClient(..., max_retries=3, retry_delay_ms=1000, circuit_breaker_threshold=5)
+
+    # Pre-fork servers: one local agent per host aggregates metrics across
+    # workers and forwards over pooled connections
+    #   $ racelogic-apm agent --endpoint https://apm.example.com \\
+    #         --application-name my-python-app --listen unix:///tmp/racelogic-apm.sock
+    apm = ApmClient(..., agent_address="unix:///tmp/racelogic-apm.sock")
+
+    # Process health: GC pauses, RSS, CPU, FDs, threads and event-loop lag
+    apm = ApmClient(..., runtime_metrics=True)
+
+    # Continuous CPU profiling: a folded-stack "cpu profile" log record per
+    # minute, sampling slowed as needed to stay under 1% of a core
+    apm = ApmClient(..., profiler_enabled=True, profiler_max_cpu_percent=1.0)
+
+    # SDK health: queue depth, drops, export latency, bytes sent
+    apm.stats()
+    apm = ApmClient(..., self_telemetry=True)  # also report as apm.sdk.* metrics
 """
 
 from .client import ApmClient
+from .aio import AsyncApmClient
 from .logger import ApmLogger
+from .handler import ApmHandler
 from .metrics import ApmMetrics
+from .middleware import ApmAsgiMiddleware, ApmWsgiMiddleware
+from .tracer import ApmTracer, Span
 from .config import ApmConfig
 
-__all__ = ["ApmClient", "ApmLogger", "ApmMetrics", "ApmConfig"]
+__all__ = [
+    "ApmClient",
+    "AsyncApmClient",
+    "ApmLogger",
+    "ApmHandler",
+    "ApmMetrics",
+    "ApmWsgiMiddleware",
+    "ApmAsgiMiddleware",
+    "ApmTracer",
+    "Span",
+    "ApmConfig",
+]
 __version__ = "1.0.0"
@@ -0,0 +1,673 @@
+"""
+Local aggregation agent shared by the processes on a host.
+
+With ``agent_address`` set, ``ApmClient`` sends every log record, span and
+metric observation to the agent as a datagram instead of batching and
+exporting it itself. The agent (``racelogic-apm agent``) aggregates metrics
+across all processes, batches logs and spans, and forwards them to the
+collector over one pooled transport, so the collector sees one client per
+host instead of one per worker.
+
+Each datagram carries its sender's ``application_id`` and resource, so
+records keep the ``application_name``, ``environment``, ``service_version``
+and ``resource_attributes`` of the process that produced them and are
+exported under its application id; processes that agree on all of these
+are aggregated together.
+
+Addresses are ``unix:///path/to/socket`` (a Unix datagram socket) or
+``udp://host:port``.
+"""
+
+import hashlib
+import os
+import signal
+import socket
+import threading
+import time
+import weakref
+from dataclasses import replace
+from math import isfinite
+from queue import Empty
+from typing import Any, Callable, Optional
+
+from .config import ApmConfig
+from .encoding import dumps
+from .exporter import (
+    OVERFLOW_DROP_NEWEST, BatchProcessor, BoundedQueue, DaemonThreadPool, time_left,
+)
+from .logger import ApmLogger
+from .metrics import ApmMetrics, metrics_queue_size
+from .stats import ExportStats
+from .tracer import ApmTracer
+from .transport import Transport, build_resource
+
+try:
+    import orjson
+
+    _loads = orjson.loads
+except ImportError:
+    import json
+
+    _loads = json.loads
+
+
+# Fits a UDP datagram on any interface; records larger than this are dropped.
+MAX_DATAGRAM_BYTES = 60_000
+
+# A datagram is ``[pid, application id, resource attributes, [[kind, payload], ...]]``:
+# the sender's application id (or null) and OTLP resource attributes, then log
+# records and spans as OTLP/JSON dicts and metric observations as
+# ``[type, name, value, attributes]``.
+KIND_LOGS = "logs"
+KIND_TRACES = "traces"
+KIND_METRIC = "metric"
+
+_PATH_KINDS = {"/v1/logs": KIND_LOGS, "/v1/traces": KIND_TRACES}
+
+# Distinct sender application ids and resources (application, environment,
+# version, ...) the agent keeps pipelines for; later ones are exported under
+# the agent's own. Every group exports on one shared pool of
+# max_concurrent_exports threads.
+MAX_SENDER_GROUPS = 16
+
+# Resource attributes that differ per process; processes that agree on all
+# the others share one group, so their metrics aggregate together.
+_PER_PROCESS_ATTRIBUTES = frozenset(("process.pid", "service.instance.id"))
+
+
+def parse_agent_address(address: str) -> tuple[int, Any]:
+    """Return ``(address family, socket address)`` for an agent address."""
+    if address.startswith("udp://"):
+        host, _, port = address[len("udp://"):].rpartition(":")
+        if not host or not port.isdigit():
+            raise ValueError(f"Invalid agent address {address!r}; expected udp://host:port")
+        return socket.AF_INET6 if ":" in host else socket.AF_INET, (host.strip("[]"), int(port))
+    if address.startswith("unix://"):
+        return socket.AF_UNIX, address[len("unix://"):]
+    raise ValueError(
+        f"Invalid agent address {address!r}; expected unix:///path or udp://host:port"
+    )
+
+
+class AgentTransport:
+    """
+    Sends records to the local agent as datagrams.
+
+    Recording only queues the record (up to ``max_queue_size``; beyond that
+    records are dropped and counted). A sender thread converts queued
+    records and packs them into a shared buffer, which is sent when the next
+    record would not fit or every ``agent_flush_interval_ms``, so one
+    ``sendto`` carries many records. Sends never block: if the agent is not
+    running or its socket buffer is full, the datagram is dropped and its
+    records counted, so recording stays cheap whatever state the agent is in.
+
+    A forked child reopens its socket and restarts the sender thread.
+    """
+
+    def __init__(self, config: ApmConfig):
+        self._config = config
+        self._family, self._address = parse_agent_address(config.agent_address)
+        self._interval = config.agent_flush_interval_ms / 1000
+        self.datagrams = 0
+        self.bytes_sent = 0
+        self.dropped = 0
+        self._closed = False
+        self._start()
+        if hasattr(os, "register_at_fork"):
+            transport = weakref.ref(self)
+            os.register_at_fork(after_in_child=lambda: _reinit_after_fork(transport))
+
+    def _start(self) -> None:
+        self._socket = socket.socket(self._family, socket.SOCK_DGRAM)
+        self._socket.setblocking(False)
+        self._pid = os.getpid()
+        # The agent exports under each sender's own application id and resource.
+        self._header = b",".join((
+            dumps(self._pid),
+            dumps(self._config.application_id),
+            dumps(build_resource(self._config)["attributes"]),
+        ))
+        self._lock = threading.Lock()
+        self._pending = BoundedQueue(self._config.max_queue_size, OVERFLOW_DROP_NEWEST, 0)
+        self._reset_buffer()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        threading.Thread(target=self._run, name="apm-agent-transport", daemon=True).start()
+
+    def _reset_buffer(self) -> None:
+        # Header "pid,application id,resource" goes in the first slot;
+        # "[", ",[" and "]]" frame it.
+        self._buffer = [self._header]
+        self._buffered = 0
+        self._size = len(self._buffer[0]) + 4
+
+    def defer(self, convert: Callable[[Any], None], record: Any) -> None:
+        """Queue ``record`` for the sender thread to pass to ``convert``. Never blocks."""
+        if (
+            self._pending.put((convert, record), block=False)
+            and self._pending.qsize() >= self._config.batch_size
+            and not self._wake.is_set()
+        ):
+            self._wake.set()
+
+    def send(self, path: str, items: list[dict]) -> None:
+        """Buffer OTLP/JSON-shaped log records or spans for the agent."""
+        kind = _PATH_KINDS[path]
+        for item in items:
+            self._add(dumps([kind, item]))
+
+    def send_metric(
+        self, metric_type: str, name: str, value: float, attributes: dict[str, Any]
+    ) -> None:
+        """Queue one metric observation for the agent to aggregate."""
+        self.defer(self._add_metric, (metric_type, name, value, attributes))
+
+    def _add_metric(self, observation: tuple) -> None:
+        metric_type, name, value, attributes = observation
+        if not isfinite(value):
+            # JSON has no NaN or infinity; the agent would drop it anyway.
+            with self._lock:
+                self.dropped += 1
+            return
+        entry = [KIND_METRIC, [metric_type, name, value, attributes]]
+        try:
+            encoded = dumps(entry)
+        except TypeError:
+            # Attribute values JSON cannot represent are sent as strings.
+            entry[1][3] = {
+                key: v if isinstance(v, (str, bool, int, float)) else str(v)
+                for key, v in attributes.items()
+            }
+            encoded = dumps(entry)
+        self._add(encoded)
+
+    def _add(self, encoded: bytes) -> None:
+        size = len(encoded) + 1
+        with self._lock:
+            if self._size + size > MAX_DATAGRAM_BYTES:
+                if not self._buffered:
+                    self.dropped += 1
+                    return
+                self._send_buffer()
+            self._buffer.append(encoded)
+            self._buffered += 1
+            self._size += size
+
+    def _send_buffer(self) -> None:
+        # Called with the lock held.
+        header, *entries = self._buffer
+        datagram = b"[" + header + b",[" + b",".join(entries) + b"]]"
+        try:
+            self._socket.sendto(datagram, self._address)
+        except OSError:
+            # Agent down (ECONNREFUSED, ENOENT) or buffer full (EAGAIN, ENOBUFS).
+            self.dropped += self._buffered
+        else:
+            self.datagrams += 1
+            self.bytes_sent += len(datagram)
+        self._reset_buffer()
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            self._wake.wait(self._interval)
+            self._wake.clear()
+            self.flush()
+
+    def _convert_pending(self) -> None:
+        while True:
+            try:
+                convert, record = self._pending.get_nowait()
+            except Empty:
+                return
+            try:
+                convert(record)
+            except Exception:
+                # The sender thread must outlive a record it cannot convert.
+                with self._lock:
+                    self.dropped += 1
+
+    def flush(self) -> None:
+        """Convert every queued record and send whatever is buffered now."""
+        self._convert_pending()
+        with self._lock:
+            if self._buffered:
+                self._send_buffer()
+
+    def stats(self) -> dict[str, Any]:
+        """Datagram, byte and drop counters for this transport."""
+        with self._lock:
+            return {
+                "agent": self._config.agent_address,
+                "datagrams": self.datagrams,
+                "bytes_sent": self.bytes_sent,
+                "dropped": self.dropped + self._pending.dropped,
+                "queue_size": self._pending.qsize(),
+            }
+
+    def close(self) -> None:
+        self._closed = True
+        self._stopping.set()
+        self._wake.set()
+        self.flush()
+        self._socket.close()
+
+    def reinit_after_fork(self) -> None:
+        """
+        Give a forked child its own socket, queue, buffer and sender thread.
+
+        Runs from an ``os.register_at_fork`` hook; later calls in the same
+        child do nothing. Records queued in the parent stay with the parent.
+        """
+        if self._closed or self._pid == os.getpid():
+            return
+        self._socket.close()
+        self._start()
+
+
+class AgentProcessor:
+    """
+    Processor for agent mode: records are exported by the transport's sender.
+
+    ``enqueue`` hands each record to ``AgentTransport``'s queue; its sender
+    thread runs ``export`` to convert and buffer it, and ``flush`` sends
+    everything queued. A ``collect`` callable (log deduplication summaries,
+    metric callbacks) runs on a small timer thread every ``flush_interval_ms``.
+    """
+
+    def __init__(
+        self,
+        config: ApmConfig,
+        export: Callable[[list[Any]], None],
+        transport: AgentTransport,
+        name: str,
+        collect: Optional[Callable[[], list[Any]]] = None,
+    ):
+        self._export = export
+        self._transport = transport
+        self._collect = collect
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._exported = 0
+        self._failed = 0
+        # Handing a record to the buffer has no export latency worth timing;
+        # kept empty so self-telemetry treats every processor alike.
+        self.export_stats = ExportStats()
+        if collect is not None:
+            self._interval = config.flush_interval_ms / 1000
+            threading.Thread(target=self._run, name=f"apm-{name}-agent", daemon=True).start()
+
+    def enqueue(self, record: Any) -> None:
+        """Queue a record for the transport's sender thread. Never blocks."""
+        self._transport.defer(self._export_record, record)
+
+    def _export_record(self, record: Any) -> None:
+        self._export_records([record])
+
+    def _export_records(self, records: list[Any]) -> None:
+        try:
+            self._export(records)
+        except Exception:
+            with self._lock:
+                self._failed += len(records)
+            return
+        with self._lock:
+            self._exported += len(records)
+
+    def _run(self) -> None:
+        while not self._stopping.wait(self._interval):
+            self._collect_now()
+
+    def _collect_now(self) -> None:
+        try:
+            records = self._collect()
+        except Exception:
+            return
+        if records:
+            self._export_records(records)
+
+    @property
+    def dropped_count(self) -> int:
+        """Records that could not be converted for sending."""
+        return self._failed
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "enqueued": self._exported + self._failed,
+                "exported": self._exported,
+                "dropped": self._failed,
+                "queue_size": 0,
+                "queue_high_water": 0,
+            }
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        if self._collect is not None:
+            self._collect_now()
+        self._transport.flush()
+        return True
+
+    def shutdown(self, timeout: Optional[float] = None) -> bool:
+        self._stopping.set()
+        return self.flush(timeout)
+
+
+class AgentApmLogger(ApmLogger):
+    """ApmLogger that sends each record to the local agent."""
+
+    def _create_processor(self) -> AgentProcessor:
+        return AgentProcessor(self._config, self._export, self._transport, "logs", collect=self._collect)
+
+
+class AgentApmTracer(ApmTracer):
+    """ApmTracer that sends each finished span to the local agent."""
+
+    def _create_processor(self) -> AgentProcessor:
+        return AgentProcessor(self._config, self._export, self._transport, "traces")
+
+
+class AgentApmMetrics(ApmMetrics):
+    """ApmMetrics that sends raw observations for the agent to aggregate."""
+
+    def _create_processor(self) -> AgentProcessor:
+        # Only runs registered callbacks; observations never aggregate here.
+        return AgentProcessor(
+            self._config, self._export, self._transport, "metrics", collect=self._collect
+        )
+
+    def _record(
+        self, metric_type: str, name: str, value: float, attributes: dict[str, Any]
+    ) -> None:
+        self._transport.send_metric(metric_type, name, value, attributes)
+
+    def _record_series(self, key: tuple, attributes: dict[str, Any], value: float) -> None:
+        name, metric_type, _ = key
+        self._transport.send_metric(metric_type, name, value, attributes)
+
+
+class _GroupMetrics(ApmMetrics):
+    """ApmMetrics exporting on the agent's shared export pool."""
+
+    def __init__(self, config: ApmConfig, group: "SenderGroup", executor: DaemonThreadPool):
+        self._executor = executor
+        super().__init__(config, group)
+
+    def _create_processor(self) -> BatchProcessor:
+        return BatchProcessor(
+            self._config,
+            self._export,
+            "metrics",
+            collect=self._collect,
+            adaptive=False,
+            max_queue_size=metrics_queue_size(self._config),
+            executor=self._executor,
+        )
+
+
+class SenderGroup:
+    """
+    The agent's pipelines for senders that share one application id and resource.
+
+    Processes of the same application, environment and version form one
+    group: their metrics aggregate into a single set of series, and their
+    logs, spans and metrics are exported under their own resource (without
+    per-process attributes) over the ``Transport`` for their application id.
+    Exports run on the agent's shared ``executor``.
+    """
+
+    def __init__(
+        self,
+        config: ApmConfig,
+        transport: Transport,
+        resource: dict,
+        name: str,
+        executor: DaemonThreadPool,
+        application_id: Optional[str] = None,
+    ):
+        self.application_id = application_id
+        self.resource = resource
+        self._transport = transport
+        self._envelopes = {
+            path: transport.envelope(path, resource)
+            for path in ("/v1/logs", "/v1/metrics", "/v1/traces")
+        }
+        self.metrics = _GroupMetrics(config, self, executor)
+        self.processors = {
+            KIND_LOGS: BatchProcessor(
+                config,
+                lambda items: self.send("/v1/logs", items),
+                f"agent-{name}-logs",
+                executor=executor,
+            ),
+            KIND_TRACES: BatchProcessor(
+                config,
+                lambda items: self.send("/v1/traces", items),
+                f"agent-{name}-traces",
+                executor=executor,
+            ),
+        }
+
+    def send(self, path: str, items: list[dict]) -> Any:
+        return self._transport.send(path, items, self._envelopes[path])
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "logs": self.processors[KIND_LOGS].stats(),
+            "metrics": self.metrics.stats(),
+            "traces": self.processors[KIND_TRACES].stats(),
+        }
+
+    def shutdown(self, timeout: float) -> bool:
+        drained = all(p.shutdown(timeout / 2) for p in self.processors.values())
+        return self.metrics.shutdown(timeout / 2) and drained
+
+
+class LocalAgent:
+    """
+    The agent daemon: receives datagrams from SDK processes and forwards them.
+
+    Senders are grouped by application id and resource (``SenderGroup``);
+    each group's metric observations are aggregated across its processes,
+    and log records and spans are batched, all exported over one pooled
+    ``Transport`` per application id (senders without one use the agent's).
+    Log records, spans and gauges are tagged with the ``process.pid`` of
+    their sender, so per-process values such as memory use are not
+    overwritten by another process's.
+    """
+
+    def __init__(self, config: ApmConfig, listen: str):
+        self._config = config
+        self._listen = listen
+        self._transport = Transport(config)
+        self._transports: dict[Optional[str], Transport] = {
+            config.application_id: self._transport
+        }
+        # One pool for every group's exports, however many groups there are.
+        self._executor = DaemonThreadPool(config.max_concurrent_exports, "apm-agent-export")
+        self._groups: dict[tuple, SenderGroup] = {}
+        # Senders without a usable resource, or beyond MAX_SENDER_GROUPS.
+        self._default_group = SenderGroup(
+            config,
+            self._transport,
+            _shared_resource(self._transport.resource["attributes"]),
+            "0",
+            self._executor,
+            config.application_id,
+        )
+        self._socket = self._bind(listen)
+        self._running = False
+        self.received = 0
+        self.malformed = 0
+
+    @staticmethod
+    def _bind(listen: str) -> socket.socket:
+        family, address = parse_agent_address(listen)
+        sock = socket.socket(family, socket.SOCK_DGRAM)
+        if family == socket.AF_UNIX and os.path.exists(address):
+            # A stale socket file from a previous run.
+            os.unlink(address)
+        # Absorb bursts from many processes while the loop is busy.
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        sock.bind(address)
+        sock.settimeout(0.5)
+        return sock
+
+    def serve_forever(self) -> None:
+        """Receive and handle datagrams until ``stop()`` is called."""
+        self._running = True
+        while self._running:
+            try:
+                datagram = self._socket.recv(MAX_DATAGRAM_BYTES + 1024)
+            except socket.timeout:
+                continue
+            except OSError:
+                if not self._running:
+                    break
+                raise
+            self.handle(datagram)
+
+    def handle(self, datagram: bytes) -> None:
+        """Route one datagram's records to its sender group's pipelines."""
+        self.received += 1
+        try:
+            pid, application_id, resource_attributes, entries = _loads(datagram)
+            group = self._group(application_id, resource_attributes)
+        except (ValueError, TypeError, KeyError, AttributeError):
+            self.malformed += 1
+            return
+        pid_attribute = {"key": "process.pid", "value": {"intValue": pid}}
+        for entry in entries:
+            try:
+                kind, payload = entry
+                if kind == KIND_METRIC:
+                    metric_type, name, value, attributes = payload
+                    if metric_type == "gauge":
+                        # Last-value series from different processes must not collide.
+                        attributes["process.pid"] = pid
+                    group.metrics._record(metric_type, name, value, attributes)
+                else:
+                    payload.setdefault("attributes", []).append(pid_attribute)
+                    group.processors[kind].enqueue(payload)
+            except (ValueError, TypeError, KeyError, AttributeError):
+                self.malformed += 1
+
+    def _group(self, application_id: Optional[str], resource_attributes: list[dict]) -> SenderGroup:
+        if application_id is None:
+            application_id = self._config.application_id
+        elif not isinstance(application_id, str):
+            raise TypeError("application id must be a string")
+        resource = _shared_resource(resource_attributes)
+        key = (application_id, *(
+            (attribute["key"], attribute["value"].get("stringValue"))
+            for attribute in resource["attributes"]
+        ))
+        group = self._groups.get(key)
+        if group is None:
+            if len(self._groups) >= MAX_SENDER_GROUPS:
+                return self._default_group
+            group = self._groups[key] = SenderGroup(
+                self._config,
+                self._transport_for(application_id),
+                resource,
+                str(len(self._groups) + 1),
+                self._executor,
+                application_id,
+            )
+        return group
+
+    def _transport_for(self, application_id: Optional[str]) -> Transport:
+        # The application id is a client header, so each one gets its own pool.
+        transport = self._transports.get(application_id)
+        if transport is None:
+            transport = self._transports[application_id] = Transport(
+                _application_config(self._config, application_id)
+            )
+        return transport
+
+    def stats(self) -> dict[str, Any]:
+        """Datagram counters, each transport and each sender group's pipelines."""
+        groups = [self._default_group, *self._groups.values()]
+        return {
+            "received": self.received,
+            "malformed": self.malformed,
+            "groups": [
+                {
+                    "application_id": group.application_id,
+                    "resource": _resource_dict(group.resource),
+                    **group.stats(),
+                }
+                for group in groups
+            ],
+            "transport": self._transport.stats(),
+            "transports": {
+                application_id: transport.stats()
+                for application_id, transport in self._transports.items()
+            },
+        }
+
+    def stop(self) -> None:
+        self._running = False
+
+    def shutdown(self, timeout: Optional[float] = None) -> bool:
+        """Stop receiving and export everything buffered within ``timeout`` seconds."""
+        self.stop()
+        self._socket.close()
+        if self._socket.family == socket.AF_UNIX:
+            try:
+                os.unlink(parse_agent_address(self._listen)[1])
+            except OSError:
+                pass
+        if timeout is None:
+            timeout = self._config.shutdown_timeout_ms / 1000
+        deadline = time.monotonic() + timeout
+        drained = True
+        for group in [self._default_group, *self._groups.values()]:
+            drained = group.shutdown(time_left(deadline)) and drained
+        self._executor.shutdown()
+        for transport in self._transports.values():
+            transport.close()
+        return drained
+
+
+def _shared_resource(attributes: list[dict]) -> dict:
+    """The resource a group exports under: the sender's, minus per-process attributes."""
+    return {
+        "attributes": [
+            attribute for attribute in attributes
+            if attribute["key"] not in _PER_PROCESS_ATTRIBUTES
+        ]
+    }
+
+
+def _application_config(config: ApmConfig, application_id: str) -> ApmConfig:
+    """The agent's config for exporting another application id's records."""
+    spool_dir = config.spool_dir
+    if spool_dir is not None:
+        # Transports must not share a spool; the name is stable across restarts.
+        digest = hashlib.sha256(application_id.encode()).hexdigest()[:16]
+        spool_dir = os.path.join(spool_dir, f"app-{digest}")
+    return replace(config, application_id=application_id, spool_dir=spool_dir)
+
+
+def _reinit_after_fork(transport: "weakref.ref[AgentTransport]") -> None:
+    instance = transport()
+    if instance is not None:
+        instance.reinit_after_fork()
+
+
+def _resource_dict(resource: dict) -> dict[str, Any]:
+    return {
+        attribute["key"]: attribute["value"].get("stringValue")
+        for attribute in resource["attributes"]
+    }
+
+
+def run_agent(config: ApmConfig, listen: str) -> None:
+    """Run the agent in the foreground until SIGINT or SIGTERM."""
+    agent = LocalAgent(config, listen)
+    signal.signal(signal.SIGTERM, lambda *_: agent.stop())
+    try:
+        agent.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        agent.shutdown()
@@ -0,0 +1,246 @@
+"""In-process metric aggregation."""
+
+import threading
+import time
+from bisect import bisect_left
+from math import isfinite
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from .config import ApmConfig
+from .sketch import ExponentialHistogram
+
+# OTLP AggregationTemporality
+AGGREGATION_TEMPORALITY_DELTA = 1
+
+# Attribute set of the series that absorbs observations over a cardinality cap.
+OVERFLOW_ATTRIBUTES = {"otel.metric.overflow": True}
+
+# Overflow series are one per metric name; beyond this many, observations
+# over a cap are dropped (and still counted as rejected).
+MAX_OVERFLOW_SERIES = 256
+
+
+@dataclass
+class MetricPoint:
+    """A single aggregated OTLP data point for one series."""
+
+    name: str
+    kind: str  # OTLP metric field: "sum", "gauge", "histogram", "exponentialHistogram"
+    data_point: dict
+
+
+class SumAggregation:
+    __slots__ = ("value",)
+    kind = "sum"
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def update(self, value: float) -> None:
+        self.value += value
+
+    def to_data_point(self) -> dict:
+        return {"asDouble": self.value}
+
+
+class LastValueAggregation:
+    __slots__ = ("value", "timestamp")
+    kind = "gauge"
+
+    def __init__(self) -> None:
+        self.value = 0.0
+        self.timestamp = 0
+
+    def update(self, value: float) -> None:
+        self.value = value
+        self.timestamp = time.time_ns()
+
+    def to_data_point(self) -> dict:
+        return {"asDouble": self.value, "timeUnixNano": self.timestamp}
+
+
+class HistogramAggregation:
+    __slots__ = ("boundaries", "bucket_counts", "count", "sum", "min", "max")
+    kind = "histogram"
+
+    def __init__(self, boundaries: list[float]) -> None:
+        self.boundaries = boundaries
+        self.bucket_counts = [0] * (len(boundaries) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+
+    def update(self, value: float) -> None:
+        # Buckets are upper-inclusive: (boundaries[i-1], boundaries[i]]
+        self.bucket_counts[bisect_left(self.boundaries, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def to_data_point(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min,
+            "max": self.max,
+            "bucketCounts": self.bucket_counts,
+            "explicitBounds": self.boundaries,
+        }
+
+
+class ExponentialHistogramAggregation(ExponentialHistogram):
+    __slots__ = ()
+    kind = "exponentialHistogram"
+
+
+class MetricAggregator:
+    """
+    Aggregates metric observations per (name, attribute set) series.
+
+    Counters are summed, gauges keep their last value and histograms are
+    folded into either an exponential histogram sketch (the default) or
+    explicit buckets, both with count/sum/min/max. ``collect()`` returns
+    one data point per series with delta temporality and resets the state,
+    so export volume scales with the number of series, not the call rate.
+
+    Each interval, a metric may hold at most ``metric_cardinality_limit``
+    series (or its entry in ``metric_cardinality_limits``) and all metrics
+    together ``metric_total_cardinality_limit``. Attribute sets beyond a cap
+    are folded into that metric's ``otel.metric.overflow=true`` series and
+    counted in ``cardinality_rejected``. NaN and infinite observations are
+    dropped and counted in ``non_finite_dropped``.
+    """
+
+    def __init__(
+        self,
+        config: ApmConfig,
+        convert_attributes: Callable[[dict[str, Any]], list[dict]],
+    ):
+        if config.histogram_aggregation not in ("exponential", "explicit"):
+            raise ValueError(
+                f"Unknown histogram_aggregation {config.histogram_aggregation!r}; "
+                "expected 'exponential' or 'explicit'"
+            )
+        self._exponential = config.histogram_aggregation == "exponential"
+        self._max_buckets = config.histogram_max_buckets
+        self._boundaries = sorted(float(b) for b in config.histogram_boundaries)
+        self._convert_attributes = convert_attributes
+        self._cardinality_limit = config.metric_cardinality_limit
+        self._cardinality_limits = dict(config.metric_cardinality_limits)
+        self._total_cardinality_limit = config.metric_total_cardinality_limit
+        self._lock = threading.Lock()
+        self._series: dict[tuple, tuple[dict[str, Any], Any]] = {}
+        self._series_per_metric: dict[str, int] = {}
+        self._regular_series = 0
+        self._overflow_series = 0
+        self._rejected_keys: set[int] = set()
+        self._start_time = time.time_ns()
+        self.cardinality_rejected = 0
+        self.overflow_dropped = 0
+        self.non_finite_dropped = 0
+
+    def record(
+        self, metric_type: str, name: str, value: float, attributes: dict[str, Any]
+    ) -> None:
+        self.record_series(series_key(metric_type, name, attributes), attributes, value)
+
+    def record_series(self, key: tuple, attributes: dict[str, Any], value: float) -> None:
+        """Record into the series identified by a precomputed ``series_key``."""
+        if not isfinite(value):
+            # NaN and infinities would corrupt the series and fail the export.
+            with self._lock:
+                self.non_finite_dropped += 1
+            return
+        with self._lock:
+            entry = self._series.get(key)
+            if entry is None:
+                entry = self._add_series(key, attributes)
+                if entry is None:
+                    return
+            entry[1].update(value)
+
+    def _add_series(self, key: tuple, attributes: dict[str, Any]) -> Optional[tuple]:
+        # Called with the lock held.
+        name, metric_type, _ = key
+        count = self._series_per_metric.get(name, 0)
+        if (
+            count < self._cardinality_limits.get(name, self._cardinality_limit)
+            and self._regular_series < self._total_cardinality_limit
+        ):
+            self._series_per_metric[name] = count + 1
+            self._regular_series += 1
+            entry = self._series[key] = (dict(attributes), self._create(metric_type))
+            return entry
+
+        # Count each rejected attribute set once per interval, within bounded memory.
+        key_hash = hash(key)
+        if key_hash not in self._rejected_keys:
+            if len(self._rejected_keys) < self._total_cardinality_limit:
+                self._rejected_keys.add(key_hash)
+            self.cardinality_rejected += 1
+
+        overflow_key = (name, metric_type, _OVERFLOW_KEY)
+        entry = self._series.get(overflow_key)
+        if entry is None:
+            if self._overflow_series >= MAX_OVERFLOW_SERIES:
+                self.overflow_dropped += 1
+                return None
+            self._overflow_series += 1
+            entry = self._series[overflow_key] = (
+                dict(OVERFLOW_ATTRIBUTES), self._create(metric_type)
+            )
+        return entry
+
+    def _create(self, metric_type: str):
+        if metric_type == "counter":
+            return SumAggregation()
+        if metric_type == "histogram":
+            if self._exponential:
+                return ExponentialHistogramAggregation(self._max_buckets)
+            return HistogramAggregation(self._boundaries)
+        return LastValueAggregation()
+
+    def collect(self) -> list[MetricPoint]:
+        """Snapshot and reset every series for the elapsed interval."""
+        now = time.time_ns()
+        with self._lock:
+            series, self._series = self._series, {}
+            start_time, self._start_time = self._start_time, now
+            self._series_per_metric = {}
+            self._regular_series = 0
+            self._overflow_series = 0
+            self._rejected_keys = set()
+
+        points = []
+        for (name, _, _), (attributes, aggregation) in series.items():
+            data_point = {
+                "startTimeUnixNano": start_time,
+                "timeUnixNano": now,
+                "attributes": self._convert_attributes(attributes),
+            }
+            data_point.update(aggregation.to_data_point())
+            points.append(MetricPoint(name, aggregation.kind, data_point))
+        return points
+
+
+_OVERFLOW_KEY = tuple(sorted(OVERFLOW_ATTRIBUTES.items()))
+
+
+def series_key(metric_type: str, name: str, attributes: dict[str, Any]) -> tuple:
+    """Identify the series for ``name`` and ``attributes``; stable across intervals."""
+    return (name, metric_type, _attribute_key(attributes))
+
+
+def _attribute_key(attributes: dict[str, Any]) -> tuple:
+    key = tuple(sorted(attributes.items()))
+    try:
+        hash(key)
+        return key
+    except TypeError:
+        # Unhashable values: fall back to their string form.
+        return tuple(sorted((k, str(v)) for k, v in attributes.items()))
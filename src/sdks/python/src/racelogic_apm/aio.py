@@ -0,0 +1,472 @@
+"""asyncio-native APM client for ASGI services."""
+
+import asyncio
+import threading
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+from .config import ApmConfig
+from .exporter import BaseProcessor, time_left
+from .logger import ApmLogger
+from .metrics import ApmMetrics, metrics_queue_size
+from .middleware import ApmAsgiMiddleware
+from .profiler import SamplingProfiler
+from .runtime import RuntimeMetrics
+from .stats import SelfTelemetry
+from .tracer import ApmTracer
+from .transport import AsyncTransport
+
+
+class AsyncBatchProcessor(BaseProcessor):
+    """
+    asyncio counterpart of ``BatchProcessor``.
+
+    Recording only appends to the bounded queue and never waits, so the event
+    loop is never blocked. A background task on the running loop wakes on
+    ``batch_size`` or the flush interval and runs up to
+    ``max_concurrent_exports`` export coroutines alongside request handling.
+    The task starts lazily on the first record recorded inside a running loop.
+    """
+
+    def __init__(
+        self,
+        config: ApmConfig,
+        export: Callable[[list[Any]], Awaitable[None]],
+        name: str,
+        collect: Optional[Callable[[], list[Any]]] = None,
+        adaptive: bool = True,
+        max_queue_size: Optional[int] = None,
+    ):
+        super().__init__(config, export, collect, adaptive, max_queue_size)
+        self._name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self._inflight: Optional[asyncio.Semaphore] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._exports: set[asyncio.Task] = set()
+
+    @property
+    def started(self) -> bool:
+        return self._worker is not None
+
+    def start(self) -> None:
+        """Start the export task on the running loop; no-op outside a loop."""
+        if self._worker is not None or self._shutdown or not self._bind():
+            return
+        self._worker = self._loop.create_task(self._run(), name=f"apm-{self._name}-worker")
+
+    def _bind(self) -> bool:
+        if self._loop is not None:
+            return True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+        self._loop = loop
+        self._loop_thread = threading.get_ident()
+        self._wake = asyncio.Event()
+        self._stopping = asyncio.Event()
+        self._inflight = asyncio.Semaphore(self._config.max_concurrent_exports)
+        return True
+
+    def enqueue(self, record: Any) -> None:
+        """Queue a record for export. Never performs I/O or waits."""
+        if self._shutdown:
+            return
+        if self._worker is None:
+            self.start()
+        if not self._queue.put(record, block=False):
+            return
+        if (
+            self._queue.qsize() >= self._config.batch_size or self._interval.idle
+        ) and self._wake is not None and not self._wake.is_set():
+            if threading.get_ident() == self._loop_thread:
+                self._wake.set()
+            elif not self._loop.is_closed():
+                try:
+                    self._loop.call_soon_threadsafe(self._wake.set)
+                except RuntimeError:
+                    # The loop closed meanwhile; logging must never raise.
+                    pass
+
+    async def _run(self) -> None:
+        while not self._shutdown:
+            woke = True
+            try:
+                await asyncio.wait_for(self._wake.wait(), self._interval.current)
+            except asyncio.TimeoutError:
+                woke = False
+            self._wake.clear()
+            if self._shutdown:
+                break
+            if self._woken_from_idle(woke):
+                continue
+            # Wait out a backoff; records keep queueing meanwhile.
+            backoff = self._resume_at - time.monotonic()
+            if backoff > 0 and await self._sleep(backoff):
+                break
+            self._collect_pending()
+            self._export_failed = False
+            exported = 0
+            full = False
+            while not self._shutdown and not self._export_failed:
+                records = self._take_batch()
+                if not records:
+                    break
+                await self._submit(records)
+                exported += len(records)
+                full = full or len(records) >= self._config.batch_size
+            self._interval.update(exported, full)
+
+    async def _submit(self, records: list[Any]) -> asyncio.Task:
+        try:
+            await self._inflight.acquire()
+        except asyncio.CancelledError:
+            self.requeue(records)
+            raise
+        task = self._loop.create_task(self._export_batch(records))
+        self._exports.add(task)
+        task.add_done_callback(self._exports.discard)
+        return task
+
+    async def _sleep(self, delay: float) -> bool:
+        """Sleep ``delay`` seconds; returns True early if shutdown began."""
+        try:
+            await asyncio.wait_for(self._stopping.wait(), delay)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def _export_batch(self, records: list[Any]) -> bool:
+        start = time.perf_counter()
+        attempt = 0
+        try:
+            while True:
+                try:
+                    await self._export(records)
+                except asyncio.CancelledError:
+                    self.requeue(records)
+                    raise
+                except Exception as e:
+                    delay = self._retry_delay(e, attempt)
+                    if delay is None or await self._sleep(delay):
+                        return self._export_done(records, start, e, attempt)
+                    attempt += 1
+                    self.export_stats.record_retry()
+                else:
+                    return self._export_done(records, start, None, attempt)
+        finally:
+            self._inflight.release()
+
+    async def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Export everything queued so far and wait for it to complete.
+
+        Returns False if ``timeout`` seconds elapsed before every batch
+        finished, or if a batch failed and was re-queued.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        self._bind()
+        self._collect_pending()
+
+        remaining = self._queue.qsize()
+        tasks = []
+        while remaining > 0:
+            records = self._take_batch(remaining)
+            if not records:
+                break
+            remaining -= len(records)
+            try:
+                tasks.append(await asyncio.wait_for(self._submit(records), time_left(deadline)))
+            except asyncio.TimeoutError:
+                return False
+
+        # Also wait for batches the export task already had in flight.
+        tasks.extend(self._exports)
+        if not tasks:
+            return True
+        done, pending = await asyncio.wait(tasks, timeout=time_left(deadline))
+        return not pending and all(not t.cancelled() and t.result() for t in done)
+
+    async def shutdown(self, timeout: Optional[float] = None) -> bool:
+        """
+        Stop the export task and drain pending records within ``timeout`` seconds.
+
+        Returns False if the deadline passed before the backlog was exported.
+        """
+        if self._shutdown:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        self._shutdown = True
+        if self._stopping is not None:
+            self._stopping.set()
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        drained = await self.flush(time_left(deadline))
+        for task in list(self._exports):
+            task.cancel()
+        return drained
+
+
+class AsyncApmLogger(ApmLogger):
+    """ApmLogger whose records are exported by an asyncio task."""
+
+    def _create_processor(self) -> AsyncBatchProcessor:
+        return AsyncBatchProcessor(self._config, self._export, "logs", collect=self._collect)
+
+    async def _export(self, records: list[dict]) -> None:
+        # Message formatting and tracebacks run off the event loop, like encoding.
+        items = await asyncio.to_thread(self._build_records, records)
+        await self._transport.send("/v1/logs", items)
+
+    async def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Export all pending log records.
+
+        Returns False if ``timeout`` seconds elapsed before the backlog drained.
+        """
+        return await self._processor.flush(timeout)
+
+    async def shutdown(self, timeout: Optional[float] = None) -> bool:
+        """Shutdown the logger, draining pending records within ``timeout`` seconds."""
+        return await self._processor.shutdown(timeout)
+
+
+class AsyncApmMetrics(ApmMetrics):
+    """ApmMetrics whose aggregated series are exported by an asyncio task."""
+
+    def _create_processor(self) -> AsyncBatchProcessor:
+        return AsyncBatchProcessor(
+            self._config,
+            self._export,
+            "metrics",
+            collect=self._collect,
+            adaptive=False,
+            max_queue_size=metrics_queue_size(self._config),
+        )
+
+    def _record(
+        self, metric_type: str, name: str, value: float, attributes: dict[str, Any]
+    ) -> None:
+        super()._record(metric_type, name, value, attributes)
+        if not self._processor.started:
+            self._processor.start()
+
+    def _record_series(self, key: tuple, attributes: dict[str, Any], value: float) -> None:
+        super()._record_series(key, attributes, value)
+        if not self._processor.started:
+            self._processor.start()
+
+    async def _export(self, records: list) -> None:
+        await self._transport.send("/v1/metrics", self._build_metrics(records))
+
+    async def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Export all pending metrics.
+
+        Returns False if ``timeout`` seconds elapsed before the backlog drained.
+        """
+        return await self._processor.flush(timeout)
+
+    async def shutdown(self, timeout: Optional[float] = None) -> bool:
+        """Shutdown the metrics collector, draining pending metrics within ``timeout`` seconds."""
+        return await self._processor.shutdown(timeout)
+
+
+class AsyncApmTracer(ApmTracer):
+    """ApmTracer whose finished spans are exported by an asyncio task."""
+
+    def _create_processor(self) -> AsyncBatchProcessor:
+        return AsyncBatchProcessor(self._config, self._export, "traces")
+
+    async def _export(self, spans: list) -> None:
+        items = await asyncio.to_thread(self._build_spans, spans)
+        await self._transport.send("/v1/traces", items)
+
+    async def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Export all finished spans.
+
+        Returns False if ``timeout`` seconds elapsed before the backlog drained.
+        """
+        return await self._processor.flush(timeout)
+
+    async def shutdown(self, timeout: Optional[float] = None) -> bool:
+        """Shutdown the tracer, draining finished spans within ``timeout`` seconds."""
+        return await self._processor.shutdown(timeout)
+
+
+class AsyncApmClient:
+    """
+    asyncio-native APM client for ASGI services (FastAPI, Starlette, aiohttp).
+
+    Exposes the same ``logger``/``metrics``/``tracer`` surface as ``ApmClient``
+    but exports from a background task using ``httpx.AsyncClient``, so
+    recording never blocks the event loop. There is no atexit hook; await ``shutdown()``
+    from the framework's shutdown event or use ``async with``.
+
+    Usage:
+        apm = AsyncApmClient(
+            endpoint="https://apm.example.com",
+            application_name="my-asgi-app",
+        )
+
+        @app.on_event("shutdown")
+        async def shutdown_apm():
+            await apm.shutdown()
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        application_name: str,
+        api_key: Optional[str] = None,
+        application_id: Optional[str] = None,
+        environment: str = "development",
+        service_version: Optional[str] = None,
+        batch_size: int = 100,
+        flush_interval_ms: int = 5000,
+        **kwargs,
+    ):
+        """
+        Initialize the async APM client.
+
+        Accepts the same arguments as ``ApmClient``.
+        """
+        self._config = ApmConfig(
+            endpoint=endpoint,
+            application_name=application_name,
+            api_key=api_key,
+            application_id=application_id,
+            environment=environment,
+            service_version=service_version,
+            batch_size=batch_size,
+            flush_interval_ms=flush_interval_ms,
+            **kwargs,
+        )
+        if self._config.agent_address:
+            # Agent sends never block, so ApmClient is already loop-safe there.
+            raise ValueError("agent_address is not supported by AsyncApmClient; use ApmClient")
+
+        self._transport = AsyncTransport(self._config)
+        self._logger = AsyncApmLogger(self._config, self._transport)
+        self._metrics = AsyncApmMetrics(self._config, self._transport)
+        self._tracer = AsyncApmTracer(self._config, self._transport)
+        if self._config.self_telemetry:
+            self._metrics.register_callback(
+                SelfTelemetry(
+                    {"logs": self._logger, "metrics": self._metrics, "traces": self._tracer},
+                    self._transport,
+                )
+            )
+        self._runtime: Optional[RuntimeMetrics] = None
+        if self._config.runtime_metrics:
+            # Metrics are collected on the loop, so its lag is watched too.
+            self._runtime = RuntimeMetrics(watch_running_loop=True)
+            self._metrics.register_callback(self._runtime)
+        self._profiler: Optional[SamplingProfiler] = None
+        if self._config.profiler_enabled:
+            # Profiles are logged from the sampling thread; enqueue is thread-safe.
+            self._profiler = SamplingProfiler(self._config, self._logger._log_distinct)
+
+    @property
+    def logger(self) -> AsyncApmLogger:
+        """Get the logger instance."""
+        return self._logger
+
+    @property
+    def metrics(self) -> AsyncApmMetrics:
+        """Get the metrics instance."""
+        return self._metrics
+
+    @property
+    def tracer(self) -> AsyncApmTracer:
+        """Get the tracer instance."""
+        return self._tracer
+
+    def dropped_records(self) -> dict[str, int]:
+        """Get the number of records dropped by each signal's bounded queue."""
+        return {
+            "logs": self._logger.dropped_count,
+            "metrics": self._metrics.dropped_count,
+            "traces": self._tracer.dropped_count,
+        }
+
+    def stats(self) -> dict[str, Any]:
+        """Snapshot of the SDK's own pipeline; see ``ApmClient.stats``."""
+        stats = {
+            "logs": self._logger.stats(),
+            "metrics": self._metrics.stats(),
+            "traces": self._tracer.stats(),
+            "transport": self._transport.stats(),
+        }
+        if self._profiler is not None:
+            stats["profiler"] = self._profiler.stats()
+        return stats
+
+    def asgi_middleware(
+        self, app: Callable, route_resolver: Optional[Callable[[dict], Optional[str]]] = None
+    ) -> ApmAsgiMiddleware:
+        """
+        Wrap an ASGI application to record request duration and request logs.
+
+        See ``ApmAsgiMiddleware``; by default the route template is read from
+        ``scope["route"]`` (Starlette, FastAPI).
+        """
+        return ApmAsgiMiddleware(app, self, route_resolver)
+
+    async def start(self) -> None:
+        """Start the export tasks now instead of on the first record."""
+        self._logger._processor.start()
+        self._metrics._processor.start()
+        self._tracer._processor.start()
+        if self._runtime is not None:
+            self._runtime.watch_loop()
+
+    async def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Export all pending telemetry.
+
+        Returns False if ``timeout`` seconds elapsed before everything drained.
+        """
+        results = await asyncio.gather(
+            self._logger.flush(timeout),
+            self._metrics.flush(timeout),
+            self._tracer.flush(timeout),
+        )
+        return all(results)
+
+    async def shutdown(self, timeout: Optional[float] = None) -> bool:
+        """
+        Shutdown the client and export all pending telemetry.
+
+        Waits at most ``timeout`` seconds (default ``shutdown_timeout_ms``) and
+        returns False if some telemetry could not be exported in time.
+        """
+        if timeout is None:
+            timeout = self._config.shutdown_timeout_ms / 1000
+        if self._profiler is not None:
+            # Emits the last partial profile without waiting on the sampler.
+            self._profiler.shutdown(0)
+        if self._runtime is not None:
+            self._runtime.shutdown()
+        results = await asyncio.gather(
+            self._logger.shutdown(timeout),
+            self._metrics.shutdown(timeout),
+            self._tracer.shutdown(timeout),
+        )
+        await self._transport.close()
+        return all(results)
+
+    async def __aenter__(self) -> "AsyncApmClient":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.shutdown()
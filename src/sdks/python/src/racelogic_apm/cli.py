@@ -0,0 +1,61 @@
+"""Command line entry point: ``racelogic-apm``."""
+
+import argparse
+import sys
+from typing import Optional
+
+from .agent import run_agent
+from .config import ApmConfig
+from .transport import COMPRESSIONS, ENCODINGS
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="racelogic-apm")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    agent = commands.add_parser(
+        "agent",
+        help="run the local agent that aggregates and forwards telemetry for this host",
+    )
+    agent.add_argument("--endpoint", required=True, help="APM collector URL")
+    agent.add_argument(
+        "--application-name",
+        default="racelogic-apm-agent",
+        help="resource for datagrams that do not carry their sender's (default: %(default)s)",
+    )
+    agent.add_argument("--api-key")
+    agent.add_argument(
+        "--application-id",
+        help="for datagrams that do not carry their sender's application id",
+    )
+    agent.add_argument("--environment", default="development")
+    agent.add_argument(
+        "--listen",
+        default="unix:///tmp/racelogic-apm.sock",
+        help="unix:///path/to/socket or udp://host:port (default: %(default)s)",
+    )
+    agent.add_argument("--batch-size", type=int, default=100)
+    agent.add_argument("--flush-interval-ms", type=int, default=5000)
+    agent.add_argument("--max-concurrent-exports", type=int, default=4)
+    agent.add_argument("--encoding", choices=ENCODINGS, default="json")
+    agent.add_argument("--compression", choices=(*COMPRESSIONS, "none"), default="gzip")
+
+    args = parser.parse_args(argv)
+    config = ApmConfig(
+        endpoint=args.endpoint,
+        application_name=args.application_name,
+        api_key=args.api_key,
+        application_id=args.application_id,
+        environment=args.environment,
+        batch_size=args.batch_size,
+        flush_interval_ms=args.flush_interval_ms,
+        max_concurrent_exports=args.max_concurrent_exports,
+        encoding=args.encoding,
+        compression=None if args.compression == "none" else args.compression,
+    )
+    run_agent(config, args.listen)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,23 @@
 """Main APM Client implementation."""
 
-from typing import Optional
+from typing import Any, Callable, Optional
 import atexit
+import functools
+import os
+import time
+import weakref
 
+from .agent import AgentApmLogger, AgentApmMetrics, AgentApmTracer, AgentTransport
 from .config import ApmConfig
+from .exporter import time_left
 from .logger import ApmLogger
 from .metrics import ApmMetrics
+from .middleware import ROUTE_ENVIRON_KEY, ApmWsgiMiddleware
+from .profiler import SamplingProfiler
+from .runtime import RuntimeMetrics
+from .stats import SelfTelemetry
+from .tracer import ApmTracer
+from .transport import Transport
 
 
 class ApmClient:
@@ -21,6 +33,9 @@ class ApmClient:
 
         apm.logger.info("Hello, APM!")
         apm.metrics.counter("requests", 1)
+
+        with apm.tracer.start_span("process_order") as span:
+            span.set_attribute("order_id", 456)
     """
 
     _instance: Optional["ApmClient"] = None
@@ -49,6 +64,7 @@ class ApmClient:
             service_version: Version of this application
             batch_size: Number of records to batch before sending
             flush_interval_ms: Interval in milliseconds to flush the buffer
+            **kwargs: Additional ApmConfig options (e.g. max_concurrent_exports)
         """
         self._config = ApmConfig(
             endpoint=endpoint,
@@ -59,14 +75,45 @@ class ApmClient:
             service_version=service_version,
             batch_size=batch_size,
             flush_interval_ms=flush_interval_ms,
+            **kwargs,
         )
 
-        self._logger = ApmLogger(self._config)
-        self._metrics = ApmMetrics(self._config)
+        if self._config.agent_address:
+            # Every record goes to the local agent as a non-blocking datagram
+            self._transport = AgentTransport(self._config)
+            self._logger = AgentApmLogger(self._config, self._transport)
+            self._metrics = AgentApmMetrics(self._config, self._transport)
+            self._tracer = AgentApmTracer(self._config, self._transport)
+        else:
+            # One pooled transport shared by every signal
+            self._transport = Transport(self._config)
+            self._logger = ApmLogger(self._config, self._transport)
+            self._metrics = ApmMetrics(self._config, self._transport)
+            self._tracer = ApmTracer(self._config, self._transport)
+        if self._config.self_telemetry:
+            self._metrics.register_callback(
+                SelfTelemetry(
+                    {"logs": self._logger, "metrics": self._metrics, "traces": self._tracer},
+                    self._transport,
+                )
+            )
+        self._runtime: Optional[RuntimeMetrics] = None
+        if self._config.runtime_metrics:
+            self._runtime = RuntimeMetrics()
+            self._metrics.register_callback(self._runtime)
+        self._profiler: Optional[SamplingProfiler] = None
+        if self._config.profiler_enabled:
+            self._profiler = SamplingProfiler(self._config, self._logger._log_distinct)
 
         # Register shutdown handler
         atexit.register(self.shutdown)
 
+        # Worker threads and pooled sockets do not survive fork(), so pre-fork
+        # servers (gunicorn, uWSGI, multiprocessing) restart them per child.
+        if hasattr(os, "register_at_fork"):
+            client = weakref.ref(self)
+            os.register_at_fork(after_in_child=lambda: _reinit_after_fork(client))
+
         # Set as singleton
         ApmClient._instance = self
 
@@ -87,83 +134,167 @@ class ApmClient:
         """Get the metrics instance."""
         return self._metrics
 
-    def flush(self) -> None:
-        """Flush all pending telemetry."""
-        self._logger.flush()
-        self._metrics.flush()
+    @property
+    def tracer(self) -> ApmTracer:
+        """Get the tracer instance."""
+        return self._tracer
+
+    def dropped_records(self) -> dict[str, int]:
+        """Get the number of records dropped by each signal's bounded queue."""
+        return {
+            "logs": self._logger.dropped_count,
+            "metrics": self._metrics.dropped_count,
+            "traces": self._tracer.dropped_count,
+        }
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Snapshot of the SDK's own pipeline.
+
+        Per signal: records enqueued, exported, dropped and re-queued, failed
+        exports, queue size and high-water mark, and export latency. Under
+        ``transport``: requests, bytes sent, HTTP and connection errors,
+        requests written to the spool and records rejected by the collector;
+        with ``agent_address`` set, datagrams, bytes and records dropped.
+        Under ``profiler``, when enabled: samples taken and profiles exported.
+        """
+        stats = {
+            "logs": self._logger.stats(),
+            "metrics": self._metrics.stats(),
+            "traces": self._tracer.stats(),
+            "transport": self._transport.stats(),
+        }
+        if self._profiler is not None:
+            stats["profiler"] = self._profiler.stats()
+        return stats
+
+    def reinit_after_fork(self) -> None:
+        """
+        Restart queues, worker threads and the transport in a forked child.
+
+        Called automatically after ``os.fork()``. Telemetry queued in the
+        parent before the fork stays with the parent.
+        """
+        self._transport.reinit_after_fork()
+        self._logger.reinit_after_fork()
+        self._metrics.reinit_after_fork()
+        self._tracer.reinit_after_fork()
+        if self._profiler is not None:
+            self._profiler.reinit_after_fork()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Export all pending telemetry.
+
+        Returns False if ``timeout`` seconds elapsed before everything drained.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        logs_drained = self._logger.flush(time_left(deadline))
+        metrics_drained = self._metrics.flush(time_left(deadline))
+        traces_drained = self._tracer.flush(time_left(deadline))
+        return logs_drained and metrics_drained and traces_drained
+
+    def shutdown(self, timeout: Optional[float] = None) -> bool:
+        """
+        Shutdown the APM client and export all pending telemetry.
+
+        Waits at most ``timeout`` seconds (default ``shutdown_timeout_ms``) and
+        returns False if some telemetry could not be exported in time.
+        """
+        if timeout is None:
+            timeout = self._config.shutdown_timeout_ms / 1000
+        deadline = time.monotonic() + timeout
+        if self._profiler is not None:
+            # Emits the last partial profile before the logger drains.
+            self._profiler.shutdown(time_left(deadline))
+        if self._runtime is not None:
+            self._runtime.shutdown()
+        logs_drained = self._logger.shutdown(time_left(deadline))
+        metrics_drained = self._metrics.shutdown(time_left(deadline))
+        traces_drained = self._tracer.shutdown(time_left(deadline))
+        self._transport.close()
+        return logs_drained and metrics_drained and traces_drained
+
+    def watch_event_loop(self) -> None:
+        """
+        Record the running asyncio loop's lag as ``process.runtime.event_loop.lag_ms``.
+
+        Call from inside the loop (e.g. an ASGI startup hook); requires
+        ``runtime_metrics=True``.
+        """
+        if self._runtime is None:
+            raise RuntimeError("watch_event_loop() requires runtime_metrics=True")
+        self._runtime.watch_loop()
+
+    # Framework integration
+    def wsgi_middleware(
+        self, app: Callable, route_resolver: Optional[Callable[[dict], Optional[str]]] = None
+    ) -> ApmWsgiMiddleware:
+        """
+        Wrap a WSGI application to record request duration and request logs.
 
-    def shutdown(self) -> None:
-        """Shutdown the APM client and flush all pending telemetry."""
-        self._logger.shutdown()
-        self._metrics.shutdown()
+        See ``ApmWsgiMiddleware``; ``route_resolver(environ)`` returns the
+        matched route template used to label the duration histogram.
+        """
+        return ApmWsgiMiddleware(app, self, route_resolver)
 
-    # Flask integration
     def instrument_flask(self, app) -> None:
         """
         Add APM middleware to a Flask application.
 
+        Request duration is labelled by the matched URL rule (e.g.
+        ``/users/<int:user_id>``) rather than the raw path; the per-request
+        log is subject to ``request_log_sampler``.
+
         Usage:
             from flask import Flask
             app = Flask(__name__)
             apm.instrument_flask(app)
         """
-        import time
+        from flask import request
 
         @app.before_request
-        def before_request():
-            from flask import g
-
-            g.apm_start_time = time.time()
-
-        @app.after_request
-        def after_request(response):
-            from flask import g, request
-
-            duration_ms = (time.time() - g.apm_start_time) * 1000
-            self._metrics.histogram(
-                "http_request_duration_ms",
-                duration_ms,
-                method=request.method,
-                path=request.path,
-                status=response.status_code,
-            )
-            self._logger.info(
-                f"{request.method} {request.path}",
-                method=request.method,
-                path=request.path,
-                status_code=response.status_code,
-                duration_ms=duration_ms,
-            )
-            return response
+        def record_route():
+            if request.url_rule is not None:
+                request.environ[ROUTE_ENVIRON_KEY] = request.url_rule.rule
+
+        app.wsgi_app = ApmWsgiMiddleware(app.wsgi_app, self)
 
     # Context manager for tracing
     def trace(self, name: str):
         """
         Decorator for tracing a function.
 
+        Each call runs in a span named ``name`` and records a
+        ``<name>_duration_ms`` histogram.
+
         Usage:
             @apm.trace("process_order")
             def process_order(order_id):
                 ...
         """
-        import functools
-        import time
-
         def decorator(func):
             @functools.wraps(func)
             def wrapper(*args, **kwargs):
-                start = time.time()
-                try:
-                    result = func(*args, **kwargs)
-                    duration_ms = (time.time() - start) * 1000
-                    self._metrics.histogram(f"{name}_duration_ms", duration_ms)
-                    return result
-                except Exception as e:
-                    duration_ms = (time.time() - start) * 1000
-                    self._logger.error(f"{name} failed", exception=e)
-                    self._metrics.histogram(f"{name}_duration_ms", duration_ms)
-                    raise
+                with self._tracer.start_span(name):
+                    start = time.perf_counter()
+                    try:
+                        result = func(*args, **kwargs)
+                        duration_ms = (time.perf_counter() - start) * 1000
+                        self._metrics.histogram(f"{name}_duration_ms", duration_ms)
+                        return result
+                    except Exception as e:
+                        duration_ms = (time.perf_counter() - start) * 1000
+                        self._logger.error(f"{name} failed", exception=e)
+                        self._metrics.histogram(f"{name}_duration_ms", duration_ms)
+                        raise
 
             return wrapper
 
         return decorator
+
+
+def _reinit_after_fork(client: "weakref.ref[ApmClient]") -> None:
+    instance = client()
+    if instance is not None:
+        instance.reinit_after_fork()
@@ -3,6 +3,15 @@
 from dataclasses import dataclass, field
 from typing import Optional
 
+from .sampling import Sampler
+
+
+# OpenTelemetry default explicit bucket boundaries (milliseconds-friendly).
+DEFAULT_HISTOGRAM_BOUNDARIES = [
+    0.0, 5.0, 10.0, 25.0, 50.0, 75.0, 100.0, 250.0,
+    500.0, 750.0, 1000.0, 2500.0, 5000.0, 7500.0, 10000.0,
+]
+
 
 @dataclass
 class ApmConfig:
@@ -23,10 +32,83 @@ class ApmConfig:
     # Batching
     batch_size: int = 100
     flush_interval_ms: int = 5000
+    # Logs and traces flush faster under load and back off when idle
+    min_flush_interval_ms: int = 250
+    max_flush_interval_ms: int = 30000
+    # Encoded (uncompressed) request size cap; larger batches are split
+    max_batch_bytes: int = 1024 * 1024
+    max_concurrent_exports: int = 2
+    shutdown_timeout_ms: int = 5000
+
+    # Transport
+    export_timeout_ms: int = 30000
+    encoding: str = "json"  # "json" or "protobuf"
+    compression: Optional[str] = "gzip"  # "gzip", "zstd" or None
+    http2: bool = False
+    max_connections: int = 10
+    max_keepalive_connections: int = 5
+    keepalive_expiry_s: float = 30.0
+
+    # Queue bounds
+    max_queue_size: int = 2048
+    queue_overflow_policy: str = "drop_oldest"  # "drop_oldest", "drop_newest", "block"
+    queue_block_timeout_ms: int = 100
+
+    # Disk spool for collector outages (disabled when spool_dir is None)
+    spool_dir: Optional[str] = None
+    spool_max_bytes: int = 64 * 1024 * 1024
+    spool_max_age_s: float = 24 * 60 * 60
+    spool_segment_bytes: int = 4 * 1024 * 1024
+
+    # Logs: collapse repeats of the same message, severity and exception
+    # type within this window into one summary record (0 disables)
+    log_dedup_window_ms: int = 0
+
+    # Metrics
+    histogram_aggregation: str = "exponential"  # "exponential" or "explicit"
+    histogram_max_buckets: int = 160
+    histogram_boundaries: list = field(
+        default_factory=lambda: list(DEFAULT_HISTOGRAM_BOUNDARIES)
+    )
+    # Series per metric and across all metrics per export interval; extra
+    # attribute sets fold into an otel.metric.overflow=true series
+    metric_cardinality_limit: int = 2000
+    metric_cardinality_limits: dict = field(default_factory=dict)  # name -> limit
+    metric_total_cardinality_limit: int = 20000
+
+    # Sampling. No trace_sampler records every trace; no request_log_sampler
+    # logs only failed (5xx) requests and those slower than request_log_slow_ms
+    trace_sampler: Optional[Sampler] = None
+    request_log_sampler: Optional[Sampler] = None
+    request_log_slow_ms: float = 1000.0
+
+    # Record process health (GC, RSS, CPU, FDs, threads, loop lag) as
+    # process.* metrics every export interval
+    runtime_metrics: bool = False
+
+    # Continuous CPU profiler: samples every thread's stack and logs one
+    # folded-stack "cpu profile" record per export interval, slowing its
+    # sampling as needed to stay under profiler_max_cpu_percent of a core
+    profiler_enabled: bool = False
+    profiler_sample_hz: float = 100.0
+    profiler_max_cpu_percent: float = 1.0
+    profiler_export_interval_ms: int = 60000
+
+    # Send records to a local ``racelogic-apm agent`` instead of exporting
+    # them from this process: "unix:///path/to/socket" or "udp://host:port".
+    # Records are packed into one datagram per agent_flush_interval_ms
+    agent_address: Optional[str] = None
+    agent_flush_interval_ms: int = 100
+
+    # Report the SDK's own queue and export counters as apm.sdk.* metrics
+    self_telemetry: bool = False
 
-    # Retry
+    # Retry: exponential backoff with jitter from retry_delay_ms, capped at
+    # max_retry_delay_ms; the circuit opens after this many straight failures
     max_retries: int = 3
     retry_delay_ms: int = 1000
+    max_retry_delay_ms: int = 30000
+    circuit_breaker_threshold: int = 5
 
     # Additional resource attributes
     resource_attributes: dict = field(default_factory=dict)
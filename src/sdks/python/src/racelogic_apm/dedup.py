@@ -0,0 +1,80 @@
+"""Deduplication of repeated log records during error storms."""
+
+import threading
+import time
+from typing import Any, Hashable
+
+
+# Distinct keys tracked at once; beyond this, records pass through unchanged.
+MAX_TRACKED_KEYS = 1024
+
+
+class _Window:
+    __slots__ = ("start", "record", "repeats", "first_repeat", "last_repeat")
+
+    def __init__(self, start: int):
+        self.start = start
+        self.record: Any = None
+        self.repeats = 0
+        self.first_repeat = 0
+        self.last_repeat = 0
+
+
+class LogDeduplicator:
+    """
+    Collapses repeats of the same log record within a time window.
+
+    The first record for a key is exported as usual. Repeats inside the
+    window are only counted, so callers can skip formatting them; once the
+    window closes, ``collect`` reports the repeat count and the first/last
+    repeat timestamps so the caller can emit a single summary record.
+    """
+
+    def __init__(self, window_ms: int):
+        self._window_ns = window_ms * 1_000_000
+        self._windows: dict[Hashable, _Window] = {}
+        self._closed: list[_Window] = []
+        self._lock = threading.Lock()
+
+    def admit(self, key: Hashable) -> bool:
+        """Return True if a record for ``key`` should be built and exported."""
+        now = time.time_ns()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is not None and now - window.start < self._window_ns:
+                if not window.repeats:
+                    window.first_repeat = now
+                window.repeats += 1
+                window.last_repeat = now
+                return False
+            if window is not None and window.repeats:
+                self._closed.append(window)
+            if window is not None or len(self._windows) < MAX_TRACKED_KEYS:
+                self._windows[key] = _Window(now)
+            return True
+
+    def remember(self, key: Hashable, record: Any) -> None:
+        """Keep the exported record for ``key`` as the template for its summary."""
+        with self._lock:
+            window = self._windows.get(key)
+            if window is not None and window.record is None:
+                window.record = record
+
+    def collect(self) -> list[tuple[Any, int, int, int]]:
+        """
+        Return ``(record, repeats, first_repeat_ns, last_repeat_ns)`` for each
+        window that closed with repeats.
+        """
+        now = time.time_ns()
+        with self._lock:
+            closed, self._closed = self._closed, []
+            for key, window in list(self._windows.items()):
+                if now - window.start >= self._window_ns:
+                    del self._windows[key]
+                    if window.repeats:
+                        closed.append(window)
+        return [
+            (window.record, window.repeats, window.first_repeat, window.last_repeat)
+            for window in closed
+            if window.record is not None
+        ]
@@ -0,0 +1,126 @@
+"""Shared OTLP encoding: attribute conversion, export envelopes and JSON."""
+
+import json
+import sys
+from typing import Any, Callable
+
+from .protobuf import request_encoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Instrumentation scope reported for every signal
+SCOPE = {"name": "racelogic-apm"}
+
+# OTLP/HTTP path -> (resource list key, scope list key, record list key)
+ENVELOPE_KEYS = {
+    "/v1/logs": ("resourceLogs", "scopeLogs", "logRecords"),
+    "/v1/metrics": ("resourceMetrics", "scopeMetrics", "metrics"),
+    "/v1/traces": ("resourceSpans", "scopeSpans", "spans"),
+}
+
+# Converted attribute sets kept for reuse; the cache is reset when full.
+MAX_CACHED_ATTRIBUTE_SETS = 4096
+
+_attribute_cache: dict[tuple, list[dict]] = {}
+
+_VALUE_CONVERTERS: dict[type, Callable[[Any], dict]] = {
+    str: lambda v: {"stringValue": v},
+    bool: lambda v: {"boolValue": v},
+    int: lambda v: {"intValue": v},
+    float: lambda v: {"doubleValue": v},
+}
+
+
+def dumps(value: Any) -> bytes:
+    """Serialise to compact JSON, using orjson when it is installed."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(value)
+        except TypeError:
+            # e.g. integers beyond 64 bits; the stdlib encoder handles them.
+            pass
+    return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+
+def convert_attributes(attributes: dict[str, Any]) -> list[dict]:
+    """
+    Convert a Python dict to OTLP attributes format.
+
+    Whole attribute sets are memoised, so recurring sets (route, method,
+    status, ...) are converted once. The returned list may be shared between
+    records and must not be mutated.
+    """
+    if not attributes:
+        return []
+    try:
+        # Types are part of the key because True == 1 == 1.0.
+        key = (tuple(attributes.items()), tuple(map(type, attributes.values())))
+        cached = _attribute_cache.get(key)
+    except TypeError:
+        # Unhashable value
+        return _convert(attributes)
+    if cached is None:
+        cached = _convert(attributes)
+        if len(_attribute_cache) >= MAX_CACHED_ATTRIBUTE_SETS:
+            _attribute_cache.clear()
+        _attribute_cache[key] = cached
+    return cached
+
+
+def _convert(attributes: dict[str, Any]) -> list[dict]:
+    return [
+        {"key": sys.intern(key) if type(key) is str else key, "value": _convert_value(value)}
+        for key, value in attributes.items()
+        if value is not None
+    ]
+
+
+def _convert_value(value: Any) -> dict:
+    convert = _VALUE_CONVERTERS.get(type(value))
+    if convert is not None:
+        return convert(value)
+    # Subclasses such as enums; str() of a str enum would give its name.
+    if isinstance(value, str):
+        return {"stringValue": str.__str__(value)}
+    if isinstance(value, bool):
+        return {"boolValue": bool(value)}
+    if isinstance(value, int):
+        return {"intValue": int(value)}
+    if isinstance(value, float):
+        return {"doubleValue": float(value)}
+    return {"stringValue": str(value)}
+
+
+class Envelope:
+    """
+    Export request wrapper for one signal, serialised once per transport.
+
+    The resource and scope blocks around the records never change, so they
+    are encoded up front and only the records are encoded per export.
+    """
+
+    def __init__(self, path: str, resource: dict, protobuf: bool):
+        self.path = path
+        self._encode_protobuf = request_encoder(path, resource, SCOPE) if protobuf else None
+        if protobuf:
+            return
+
+        resource_key, scope_key, items_key = ENVELOPE_KEYS[path]
+        template = dumps(
+            {resource_key: [{"resource": resource, scope_key: [{"scope": SCOPE, items_key: []}]}]}
+        )
+        marker = f'"{items_key}":['.encode("utf-8")
+        split = template.rindex(marker) + len(marker) - 1
+        # Keep the brackets out; the serialised record list brings its own.
+        self._prefix = template[:split]
+        self._suffix = template[split + 2:]
+
+    def encode(self, items: list) -> bytes:
+        """Encode ``items`` (log records, metrics or spans) as a full request."""
+        if self._encode_protobuf is not None:
+            return self._encode_protobuf(items)
+        return self._prefix + dumps(items) + self._suffix
@@ -0,0 +1,472 @@
+"""Background export pipeline shared by the APM signals."""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, wait
+from queue import Empty, SimpleQueue
+from typing import Any, Callable, Optional
+
+from .config import ApmConfig
+from .retry import Backoff, CircuitOpenError, is_retryable
+from .stats import ExportStats
+
+
+OVERFLOW_DROP_OLDEST = "drop_oldest"
+OVERFLOW_DROP_NEWEST = "drop_newest"
+OVERFLOW_BLOCK = "block"
+
+OVERFLOW_POLICIES = (OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST, OVERFLOW_BLOCK)
+
+
+class BoundedQueue:
+    """
+    Fixed-capacity FIFO with an overflow policy and drop accounting.
+
+    When full, ``drop_oldest`` evicts the oldest record, ``drop_newest``
+    discards the incoming one and ``block`` waits up to ``block_timeout``
+    seconds for space before discarding the incoming record.
+    """
+
+    def __init__(self, maxsize: int, policy: str, block_timeout: float):
+        if maxsize <= 0:
+            raise ValueError("max_queue_size must be positive")
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(
+                f"Unknown queue_overflow_policy {policy!r}; "
+                f"expected one of {', '.join(OVERFLOW_POLICIES)}"
+            )
+        self._maxsize = maxsize
+        self._policy = policy
+        self._block_timeout = block_timeout
+        self._items: deque = deque()
+        self._lock = threading.Lock()
+        self._not_full = threading.Condition(self._lock)
+        self.enqueued = 0
+        self.dropped = 0
+        self.high_water = 0
+
+    def put(self, item: Any, block: bool = True) -> bool:
+        """Add a record, applying the overflow policy. Returns False if dropped."""
+        with self._lock:
+            if len(self._items) >= self._maxsize:
+                if self._policy == OVERFLOW_DROP_OLDEST:
+                    self._items.popleft()
+                    self.dropped += 1
+                elif self._policy == OVERFLOW_BLOCK and block:
+                    self._not_full.wait_for(
+                        lambda: len(self._items) < self._maxsize, self._block_timeout
+                    )
+                if len(self._items) >= self._maxsize:
+                    self.dropped += 1
+                    return False
+            self._items.append(item)
+            self.enqueued += 1
+            if len(self._items) > self.high_water:
+                self.high_water = len(self._items)
+            return True
+
+    def put_front(self, items: list[Any]) -> None:
+        """
+        Return records to the head of the queue, keeping their order.
+
+        Never blocks; records that do not fit are dropped, oldest first.
+        """
+        with self._lock:
+            space = self._maxsize - len(self._items)
+            if len(items) > space:
+                overflow = len(items) - max(space, 0)
+                self.dropped += overflow
+                items = items[overflow:]
+            self._items.extendleft(reversed(items))
+
+    def get_nowait(self) -> Any:
+        with self._lock:
+            if not self._items:
+                raise Empty
+            item = self._items.popleft()
+            self._not_full.notify()
+            return item
+
+    def qsize(self) -> int:
+        return len(self._items)
+
+
+class FlushInterval:
+    """
+    Export interval that adapts to load.
+
+    A tick that exports a full batch halves the interval, down to
+    ``min_flush_interval_ms``; a tick with nothing to export doubles it, up
+    to ``max_flush_interval_ms``; any other tick returns to
+    ``flush_interval_ms``. With ``adaptive=False`` it stays at
+    ``flush_interval_ms``.
+    """
+
+    def __init__(self, config: ApmConfig, adaptive: bool = True):
+        self.base = config.flush_interval_ms / 1000
+        if adaptive:
+            self.minimum = min(config.min_flush_interval_ms / 1000, self.base)
+            self.maximum = max(config.max_flush_interval_ms / 1000, self.base)
+        else:
+            self.minimum = self.maximum = self.base
+        self.current = self.base
+
+    @property
+    def idle(self) -> bool:
+        """True while stretched beyond the base interval for lack of records."""
+        return self.current > self.base
+
+    def update(self, exported: int, full: bool) -> None:
+        if full:
+            self.current = max(self.minimum, self.current / 2)
+        elif not exported:
+            self.current = min(self.maximum, self.current * 2)
+        else:
+            self.current = self.base
+
+    def resume(self) -> None:
+        """Records arrived after an idle stretch; go back to the base interval."""
+        self.current = self.base
+
+
+class DaemonThreadPool:
+    """
+    Fixed pool of daemon threads running submitted calls.
+
+    Unlike ``ThreadPoolExecutor``, whose threads are joined at interpreter
+    exit, an export stuck on a slow collector cannot hold the process open
+    past the shutdown deadline.
+    """
+
+    def __init__(self, workers: int, name: str):
+        self._tasks: SimpleQueue = SimpleQueue()
+        self._closed = False
+        self._threads = [
+            threading.Thread(target=self._work, name=f"{name}-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> Future:
+        if self._closed:
+            raise RuntimeError("cannot submit after shutdown")
+        future: Future = Future()
+        self._tasks.put((future, fn, args))
+        return future
+
+    def _work(self) -> None:
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                return
+            future, fn, args = task
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args))
+            except BaseException as e:
+                future.set_exception(e)
+
+    def shutdown(self) -> None:
+        """Cancel calls not yet started and let idle threads exit; never waits."""
+        self._closed = True
+        while True:
+            try:
+                task = self._tasks.get_nowait()
+            except Empty:
+                break
+            if task is not None:
+                task[0].cancel()
+        for _ in self._threads:
+            self._tasks.put(None)
+
+
+class BaseProcessor:
+    """
+    Bounded record queue shared by the thread and asyncio export pipelines.
+
+    Signals that aggregate in process pass a ``collect`` callable; it is
+    invoked once per interval (and on flush) to enqueue the aggregated
+    records instead of recording through ``enqueue``.
+
+    ``export`` raises on failure. Retryable failures are retried up to
+    ``max_retries`` times with jittered exponential backoff (honouring
+    ``Retry-After``), then the batch is re-queued and the worker holds off
+    for another backoff delay. Every other failure (``ExportError`` with
+    ``retryable=False``, or any other exception, such as a record that
+    cannot be encoded) is permanent and the batch is discarded. Outcomes
+    and latency are counted in ``export_stats``.
+
+    The worker wakes every ``FlushInterval``; signals exported on a fixed
+    cadence (metrics) pass ``adaptive=False``. ``max_queue_size`` overrides
+    the configured capacity, for signals whose ``collect`` output must fit.
+    """
+
+    def __init__(
+        self,
+        config: ApmConfig,
+        export: Callable[[list[Any]], Any],
+        collect: Optional[Callable[[], list[Any]]] = None,
+        adaptive: bool = True,
+        max_queue_size: Optional[int] = None,
+    ):
+        self._config = config
+        self._export = export
+        self._collect = collect
+        self._interval = FlushInterval(config, adaptive)
+        self._queue = BoundedQueue(
+            max_queue_size or config.max_queue_size,
+            config.queue_overflow_policy,
+            config.queue_block_timeout_ms / 1000,
+        )
+        self._shutdown = False
+        self._export_failed = False
+        self._backoff = Backoff(config.retry_delay_ms / 1000, config.max_retry_delay_ms / 1000)
+        self._resume_at = 0.0
+        self.export_stats = ExportStats()
+
+    def requeue(self, records: list[Any]) -> None:
+        """Return records from a failed export without waking the worker."""
+        self._export_failed = True
+        self.export_stats.record_requeue(len(records))
+        self._queue.put_front(records)
+
+    def stats(self) -> dict[str, Any]:
+        """Queue and export counters for this signal."""
+        stats = self.export_stats.snapshot()
+        stats.update(
+            enqueued=self._queue.enqueued,
+            dropped=self._queue.dropped,
+            queue_size=self._queue.qsize(),
+            queue_high_water=self._queue.high_water,
+        )
+        return stats
+
+    @property
+    def dropped_count(self) -> int:
+        """Number of records discarded because the queue was full."""
+        return self._queue.dropped
+
+    def _collect_pending(self) -> None:
+        if self._collect is not None:
+            # The worker is the consumer, so it must never block on its own queue.
+            for record in self._collect():
+                self._queue.put(record, block=False)
+
+    def _woken_from_idle(self, woke: bool) -> bool:
+        # A record arriving after an idle stretch wakes the worker early; it
+        # then waits one base interval so the record is batched as usual.
+        if woke and self._interval.idle and self._queue.qsize() < self._config.batch_size:
+            self._interval.resume()
+            return True
+        return False
+
+    def _retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        # None stops retrying: the batch is discarded or re-queued.
+        if not is_retryable(error) or isinstance(error, CircuitOpenError):
+            return None
+        if attempt >= self._config.max_retries:
+            return None
+        return self._backoff.delay(attempt, getattr(error, "retry_after", None))
+
+    def _export_done(
+        self, records: list[Any], start: float, error: Optional[Exception], attempt: int
+    ) -> bool:
+        """Account for a finished export. Returns False if the batch was re-queued."""
+        duration_ms = (time.perf_counter() - start) * 1000
+        self.export_stats.record_export(len(records), duration_ms, succeeded=error is None)
+        if error is None:
+            return True
+        if not is_retryable(error):
+            # Permanent failures (bad request, auth, a batch that cannot be
+            # encoded) would fail on every retry and block the records behind.
+            self.export_stats.record_discard(len(records))
+            return True
+        # Hold off the worker so a struggling collector is not hit every tick.
+        self._resume_at = time.monotonic() + self._backoff.delay(
+            attempt, getattr(error, "retry_after", None)
+        )
+        self.requeue(records)
+        return False
+
+    def _take_batch(self, limit: Optional[int] = None) -> list[Any]:
+        size = self._config.batch_size if limit is None else min(limit, self._config.batch_size)
+        records: list[Any] = []
+        while len(records) < size:
+            try:
+                records.append(self._queue.get_nowait())
+            except Empty:
+                break
+        return records
+
+
+class BatchProcessor(BaseProcessor):
+    """
+    Queues telemetry records and exports them off the calling thread.
+
+    Recording only enqueues. A dedicated worker thread is woken when the queue
+    reaches ``batch_size`` or the flush interval elapses, and hands batches to
+    a small pool of daemon threads so up to ``max_concurrent_exports``
+    requests can be in flight at once. Processors may share one ``executor``
+    pool, which is then left running when a processor shuts down.
+    """
+
+    def __init__(
+        self,
+        config: ApmConfig,
+        export: Callable[[list[Any]], None],
+        name: str,
+        collect: Optional[Callable[[], list[Any]]] = None,
+        adaptive: bool = True,
+        max_queue_size: Optional[int] = None,
+        executor: Optional[DaemonThreadPool] = None,
+    ):
+        super().__init__(config, export, collect, adaptive, max_queue_size)
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._inflight = threading.BoundedSemaphore(config.max_concurrent_exports)
+        self._owns_executor = executor is None
+        self._executor = executor or DaemonThreadPool(
+            config.max_concurrent_exports, f"apm-{name}-export"
+        )
+        self._futures: set[Future] = set()
+        self._futures_lock = threading.Lock()
+        self._worker = threading.Thread(
+            target=self._run, name=f"apm-{name}-worker", daemon=True
+        )
+        self._worker.start()
+
+    def enqueue(self, record: Any) -> None:
+        """Queue a record for export. Never performs I/O."""
+        if not self._queue.put(record):
+            return
+        if (
+            self._queue.qsize() >= self._config.batch_size or self._interval.idle
+        ) and not self._wake.is_set():
+            self._wake.set()
+
+    def _run(self) -> None:
+        while not self._shutdown:
+            woke = self._wake.wait(self._interval.current)
+            self._wake.clear()
+            if self._shutdown:
+                break
+            if self._woken_from_idle(woke):
+                continue
+            # Wait out a backoff; records keep queueing meanwhile.
+            backoff = self._resume_at - time.monotonic()
+            if backoff > 0 and self._stopping.wait(backoff):
+                break
+            self._collect_pending()
+            self._export_failed = False
+            exported = 0
+            full = False
+            # Keep exporting while a backlog exists instead of sleeping until
+            # the next tick; stop early if the collector is rejecting batches.
+            while not self._shutdown and not self._export_failed:
+                records = self._take_batch()
+                if not records or self._submit(records) is None:
+                    break
+                exported += len(records)
+                full = full or len(records) >= self._config.batch_size
+            self._interval.update(exported, full)
+
+    def _submit(
+        self, records: list[Any], timeout: Optional[float] = None
+    ) -> Optional[Future]:
+        # Blocks only the worker (or flushing) thread when every slot is busy.
+        if not self._inflight.acquire(timeout=timeout):
+            self.requeue(records)
+            return None
+        try:
+            future = self._executor.submit(self._export_batch, records)
+        except RuntimeError:
+            # Executor already shut down.
+            self._inflight.release()
+            self.requeue(records)
+            return None
+        with self._futures_lock:
+            self._futures.add(future)
+        future.add_done_callback(self._forget)
+        return future
+
+    def _forget(self, future: Future) -> None:
+        with self._futures_lock:
+            self._futures.discard(future)
+
+    def _export_batch(self, records: list[Any]) -> bool:
+        start = time.perf_counter()
+        attempt = 0
+        try:
+            while True:
+                try:
+                    self._export(records)
+                except Exception as e:
+                    delay = self._retry_delay(e, attempt)
+                    # Backoffs end early on shutdown, which must not wait them out.
+                    if delay is None or self._stopping.wait(delay):
+                        return self._export_done(records, start, e, attempt)
+                    attempt += 1
+                    self.export_stats.record_retry()
+                else:
+                    return self._export_done(records, start, None, attempt)
+        finally:
+            self._inflight.release()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Export everything queued so far and wait for it to complete.
+
+        The backlog is split into batches that are exported in parallel.
+        Returns False if ``timeout`` seconds elapsed before every batch
+        finished, or if a batch failed and was re-queued.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        self._collect_pending()
+
+        # Bound the work to what is queued now so re-queued failures and
+        # records arriving meanwhile cannot keep the caller waiting.
+        remaining = self._queue.qsize()
+        futures = []
+        while remaining > 0:
+            records = self._take_batch(remaining)
+            if not records:
+                break
+            remaining -= len(records)
+            future = self._submit(records, time_left(deadline))
+            if future is None:
+                return False
+            futures.append(future)
+
+        # Also wait for batches the worker already had in flight.
+        with self._futures_lock:
+            futures.extend(self._futures)
+        done, not_done = wait(futures, timeout=time_left(deadline))
+        return not not_done and all(not f.cancelled() and f.result() for f in done)
+
+    def shutdown(self, timeout: Optional[float] = None) -> bool:
+        """
+        Stop the worker and drain pending records within ``timeout`` seconds.
+
+        Returns False if the deadline passed before the backlog was exported.
+        """
+        if self._shutdown:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        self._shutdown = True
+        self._stopping.set()
+        self._wake.set()
+        self._worker.join(time_left(deadline))
+        drained = self.flush(time_left(deadline))
+        if self._owns_executor:
+            self._executor.shutdown()
+        return drained
+
+
+def time_left(deadline: Optional[float]) -> Optional[float]:
+    """Seconds left until a ``time.monotonic()`` deadline, or None for no deadline."""
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
@@ -0,0 +1,76 @@
+"""Bridge from the stdlib ``logging`` module to APM."""
+
+import logging
+
+from .logger import ApmLogger
+
+
+# Attributes every logging.LogRecord has; anything else came from ``extra``.
+_RESERVED_ATTRIBUTES = frozenset(
+    logging.LogRecord("", 0, "", 0, "", (), None).__dict__
+) | {"message", "asctime"}
+
+# The SDK's own HTTP stack logs every export; forwarding those records
+# would feed back into the pipeline. Matched as the logger name or its
+# children only, so unrelated packages such as ``h2o`` still get through.
+_IGNORED_LOGGERS = frozenset(("httpx", "httpcore", "h2", "hpack"))
+_IGNORED_PREFIXES = tuple(f"{name}." for name in _IGNORED_LOGGERS)
+
+
+def _level_name(levelno: int) -> str:
+    if levelno < logging.DEBUG:
+        return "trace"
+    if levelno < logging.INFO:
+        return "debug"
+    if levelno < logging.WARNING:
+        return "info"
+    if levelno < logging.ERROR:
+        return "warn"
+    if levelno < logging.CRITICAL:
+        return "error"
+    return "fatal"
+
+
+class ApmHandler(logging.Handler):
+    """
+    ``logging.Handler`` that forwards stdlib log records to an ``ApmLogger``.
+
+    ``emit()`` only enqueues: message interpolation and traceback formatting
+    happen on the export thread, and handler formatters are not applied.
+    Levels map onto ``SEVERITY_MAP``, ``extra`` fields become attributes and
+    ``logger.name`` is always set. Records from the SDK's HTTP stack
+    (httpx, httpcore) are ignored.
+
+    Usage:
+        import logging
+        from racelogic_apm import ApmHandler
+
+        logging.getLogger().addHandler(ApmHandler(apm.logger))
+    """
+
+    def __init__(self, logger: ApmLogger, level: int = logging.NOTSET):
+        super().__init__(level)
+        self._logger = logger
+
+    def emit(self, record: logging.LogRecord) -> None:
+        name = record.name
+        if name in _IGNORED_LOGGERS or name.startswith(_IGNORED_PREFIXES):
+            return
+        try:
+            attributes = {"logger.name": name}
+            extra = record.__dict__.keys() - _RESERVED_ATTRIBUTES
+            if extra:
+                record_dict = record.__dict__
+                for key in extra:
+                    attributes[key] = record_dict[key]
+            exception = record.exc_info[1] if record.exc_info else None
+            self._logger._log(
+                _level_name(record.levelno),
+                record.msg,
+                exception,
+                attributes,
+                args=record.args,
+                time_ns=int(record.created * 1_000_000_000),
+            )
+        except Exception:
+            self.handleError(record)
@@ -1,14 +1,15 @@
 """APM Logger implementation."""
 
 import time
-import threading
 import traceback
 from typing import Any, Optional
-from queue import Queue
-
-import httpx
 
 from .config import ApmConfig
+from .dedup import LogDeduplicator
+from .encoding import convert_attributes
+from .exporter import BaseProcessor, BatchProcessor
+from .tracer import current_span
+from .transport import Transport
 
 
 SEVERITY_MAP = {
@@ -22,16 +23,48 @@ SEVERITY_MAP = {
 }
 
 
+class LogRecord:
+    """
+    A queued log record holding raw references.
+
+    Formatting the traceback and converting to OTLP happen on the export
+    thread, keeping ``ApmLogger`` calls cheap and queued records small.
+    """
+
+    __slots__ = (
+        "time_ns", "level", "message", "args", "exception", "attributes", "trace_id", "span_id",
+    )
+
+    def __init__(
+        self,
+        time_ns: int,
+        level: str,
+        message: str,
+        exception: Optional[BaseException],
+        attributes: dict[str, Any],
+        args: Any = None,
+        trace_id: Optional[int] = None,
+        span_id: Optional[int] = None,
+    ):
+        self.time_ns = time_ns
+        self.level = level
+        self.message = message
+        self.args = args
+        self.exception = exception
+        self.attributes = attributes
+        self.trace_id = trace_id
+        self.span_id = span_id
+
+
 class ApmLogger:
     """Logger for sending log records to APM Collector."""
 
-    def __init__(self, config: ApmConfig):
+    def __init__(self, config: ApmConfig, transport: Optional[Transport] = None):
         self._config = config
-        self._queue: Queue = Queue()
-        self._client = httpx.Client(timeout=30.0)
-        self._shutdown = False
-        self._flush_thread = threading.Thread(target=self._flush_loop, daemon=True)
-        self._flush_thread.start()
+        self._owns_transport = transport is None
+        self._transport = transport or Transport(config)
+        self._dedup = self._create_deduplicator()
+        self._processor = self._create_processor()
 
     def trace(self, message: str, **attributes: Any) -> None:
         """Log a trace message."""
@@ -71,120 +104,157 @@ class ApmLogger:
         """Log a fatal error message."""
         self._log("fatal", message, exception, attributes)
 
+    def _log_distinct(self, message: str, **attributes: Any) -> None:
+        """
+        Log an informational record that is never deduplicated.
+
+        For records whose content is all in their attributes, such as CPU
+        profiles, which the deduplicator would collapse into the first one.
+        """
+        self._log("info", message, None, attributes, deduplicate=False)
+
     def _log(
         self,
         level: str,
         message: str,
         exception: Optional[BaseException],
         attributes: dict[str, Any],
+        args: Any = None,
+        time_ns: Optional[int] = None,
+        deduplicate: bool = True,
     ) -> None:
-        severity_number, severity_text = SEVERITY_MAP.get(level, (9, "INFO"))
+        """
+        Queue a record. ``args`` are %-style arguments for ``message``,
+        applied on the export thread; ``message`` stays the dedup key.
+        ``deduplicate=False`` bypasses the deduplicator.
+        """
+        dedup_key = None
+        if self._dedup is not None and deduplicate:
+            # Checked before any formatting so repeats cost almost nothing.
+            # stdlib logging accepts any object as the message, hashable or not.
+            dedup_key = (
+                message if isinstance(message, str) else repr(message),
+                level,
+                type(exception) if exception else None,
+            )
+            if not self._dedup.admit(dedup_key):
+                return
+
+        if time_ns is None:
+            time_ns = time.time_ns()
+        record = LogRecord(time_ns, level, message, exception, attributes, args)
+
+        # Correlate with the active span, if any
+        span = current_span()
+        if span is not None:
+            record.trace_id = span.trace_id
+            record.span_id = span.span_id
+
+        if dedup_key is not None:
+            self._dedup.remember(dedup_key, record)
+        self._processor.enqueue(record)
+
+    def _create_deduplicator(self) -> Optional[LogDeduplicator]:
+        if self._config.log_dedup_window_ms <= 0:
+            return None
+        return LogDeduplicator(self._config.log_dedup_window_ms)
 
-        body = message
-        if exception:
-            body = f"{message}\n{traceback.format_exception(type(exception), exception, exception.__traceback__)}"
+    def _create_processor(self) -> BaseProcessor:
+        return BatchProcessor(self._config, self._export, "logs", collect=self._collect)
 
-        record = {
-            "timeUnixNano": int(time.time() * 1_000_000_000),
+    def _collect(self) -> list[LogRecord]:
+        # Summaries for repeats collapsed by the deduplicator
+        if self._dedup is None:
+            return []
+        return [
+            LogRecord(
+                last,
+                record.level,
+                record.message,
+                record.exception,
+                {
+                    **record.attributes,
+                    "log.repeat_count": repeats,
+                    "log.repeat_first_time_unix_nano": first,
+                    "log.repeat_last_time_unix_nano": last,
+                },
+                record.args,
+            )
+            for record, repeats, first, last in self._dedup.collect()
+        ]
+
+    def _record_to_otlp(self, record: LogRecord) -> dict:
+        severity_number, severity_text = SEVERITY_MAP.get(record.level, (9, "INFO"))
+
+        body = record.message
+        if record.args:
+            body = _format_message(body, record.args)
+        elif not isinstance(body, str):
+            body = str(body)
+        exception = record.exception
+        if exception is not None:
+            formatted = "".join(
+                traceback.format_exception(type(exception), exception, exception.__traceback__)
+            )
+            body = f"{body}\n{formatted}"
+
+        otlp = {
+            "timeUnixNano": record.time_ns,
             "severityNumber": severity_number,
             "severityText": severity_text,
             "body": {"stringValue": body},
-            "attributes": self._convert_attributes(attributes),
+            "attributes": convert_attributes(record.attributes),
         }
+        if record.trace_id is not None:
+            otlp["traceId"] = f"{record.trace_id:032x}"
+            otlp["spanId"] = f"{record.span_id:016x}"
+        return otlp
 
-        self._queue.put(record)
-
-        if self._queue.qsize() >= self._config.batch_size:
-            self._flush()
-
-    def _convert_attributes(self, attributes: dict[str, Any]) -> list[dict]:
-        result = []
-        for key, value in attributes.items():
-            if value is None:
-                continue
-            if isinstance(value, str):
-                result.append({"key": key, "value": {"stringValue": value}})
-            elif isinstance(value, bool):
-                result.append({"key": key, "value": {"boolValue": value}})
-            elif isinstance(value, int):
-                result.append({"key": key, "value": {"intValue": value}})
-            elif isinstance(value, float):
-                result.append({"key": key, "value": {"doubleValue": value}})
-            else:
-                result.append({"key": key, "value": {"stringValue": str(value)}})
-        return result
-
-    def _flush(self) -> None:
-        records = []
-        while not self._queue.empty() and len(records) < self._config.batch_size:
-            try:
-                records.append(self._queue.get_nowait())
-            except Exception:
-                break
-
-        if not records:
-            return
-
-        request = {
-            "resourceLogs": [
-                {
-                    "resource": {
-                        "attributes": [
-                            {
-                                "key": "service.name",
-                                "value": {"stringValue": self._config.application_name},
-                            },
-                            {
-                                "key": "service.version",
-                                "value": {
-                                    "stringValue": self._config.service_version or "1.0.0"
-                                },
-                            },
-                            {
-                                "key": "deployment.environment",
-                                "value": {"stringValue": self._config.environment},
-                            },
-                        ]
-                    },
-                    "scopeLogs": [
-                        {
-                            "scope": {"name": "racelogic-apm"},
-                            "logRecords": records,
-                        }
-                    ],
-                }
-            ]
-        }
+    def _build_records(self, records: list[LogRecord]) -> list[dict]:
+        return [self._record_to_otlp(record) for record in records]
 
-        headers = {"Content-Type": "application/json"}
-        if self._config.api_key:
-            headers["X-API-Key"] = self._config.api_key
-        if self._config.application_id:
-            headers["X-Application-Id"] = self._config.application_id
-
-        try:
-            self._client.post(
-                f"{self._config.endpoint}/v1/logs",
-                json=request,
-                headers=headers,
-            )
-        except Exception:
-            # Re-queue on failure
-            for record in records:
-                self._queue.put(record)
-
-    def _flush_loop(self) -> None:
-        while not self._shutdown:
-            time.sleep(self._config.flush_interval_ms / 1000)
-            if not self._shutdown:
-                self._flush()
-
-    def flush(self) -> None:
-        """Flush all pending log records."""
-        self._flush()
-
-    def shutdown(self) -> None:
-        """Shutdown the logger and flush pending records."""
-        self._shutdown = True
-        self._flush()
-        self._client.close()
+    def _export(self, records: list[LogRecord]) -> None:
+        self._transport.send("/v1/logs", self._build_records(records))
+
+    @property
+    def dropped_count(self) -> int:
+        """Number of log records dropped because the export queue was full."""
+        return self._processor.dropped_count
+
+    def stats(self) -> dict[str, Any]:
+        """Queue depth, high-water mark and export counters for this signal."""
+        return self._processor.stats()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Export all pending log records.
+
+        Returns False if ``timeout`` seconds elapsed before the backlog drained.
+        """
+        return self._processor.flush(timeout)
+
+    def reinit_after_fork(self) -> None:
+        """
+        Restart the export pipeline in a forked child.
+
+        Records queued by the parent are left to the parent to export.
+        """
+        self._dedup = self._create_deduplicator()
+        self._processor = self._create_processor()
+        if self._owns_transport:
+            self._transport.reinit_after_fork()
+
+    def shutdown(self, timeout: Optional[float] = None) -> bool:
+        """Shutdown the logger, draining pending records within ``timeout`` seconds."""
+        drained = self._processor.shutdown(timeout)
+        if self._owns_transport:
+            self._transport.close()
+        return drained
+
+
+def _format_message(message: Any, args: Any) -> str:
+    # Same as logging.LogRecord.getMessage(), but never raises on the export thread.
+    try:
+        return str(message) % args
+    except (TypeError, ValueError, KeyError):
+        return f"{message} {args!r}"
@@ -1,174 +1,181 @@
 """APM Metrics implementation."""
 
-import time
-import threading
-from typing import Any, Optional
-from queue import Queue
-from dataclasses import dataclass
-
-import httpx
+from typing import Any, Callable, Optional
 
+from .aggregation import (
+    AGGREGATION_TEMPORALITY_DELTA, MAX_OVERFLOW_SERIES, MetricAggregator, MetricPoint,
+    series_key,
+)
 from .config import ApmConfig
+from .encoding import convert_attributes
+from .exporter import BaseProcessor, BatchProcessor
+from .transport import Transport
+
+
+class BoundInstrument:
+    """
+    A metric series resolved once for a fixed name and attribute set.
 
+    ``record`` skips building and hashing the attribute key, for hot paths
+    that keep recording into the same series. Create with ``ApmMetrics.bind``.
+    """
 
-@dataclass
-class MetricRecord:
-    name: str
-    type: str  # "gauge", "counter", "histogram"
-    value: float
-    timestamp: int
-    attributes: dict
+    __slots__ = ("_metrics", "key", "attributes")
+
+    def __init__(self, metrics: "ApmMetrics", key: tuple, attributes: dict[str, Any]):
+        self._metrics = metrics
+        self.key = key
+        self.attributes = attributes
+
+    def record(self, value: float) -> None:
+        """Add to a counter, set a gauge or observe a histogram value."""
+        self._metrics._record_series(self.key, self.attributes, value)
 
 
 class ApmMetrics:
     """Metrics collector for sending metrics to APM Collector."""
 
-    def __init__(self, config: ApmConfig):
+    def __init__(self, config: ApmConfig, transport: Optional[Transport] = None):
         self._config = config
-        self._queue: Queue = Queue()
-        self._client = httpx.Client(timeout=30.0)
-        self._shutdown = False
-        self._flush_thread = threading.Thread(target=self._flush_loop, daemon=True)
-        self._flush_thread.start()
+        self._owns_transport = transport is None
+        self._transport = transport or Transport(config)
+        self._aggregator = MetricAggregator(config, convert_attributes)
+        self._callbacks: list[Callable[["ApmMetrics"], None]] = []
+        self._processor = self._create_processor()
 
     def counter(self, name: str, value: int, **attributes: Any) -> None:
-        """Record a counter metric (monotonically increasing value)."""
+        """Record a counter metric (summed per series each interval)."""
         self._record("counter", name, float(value), attributes)
 
     def gauge(self, name: str, value: float, **attributes: Any) -> None:
-        """Record a gauge metric (point-in-time value)."""
+        """Record a gauge metric (last value per series each interval)."""
         self._record("gauge", name, value, attributes)
 
     def histogram(self, name: str, value: float, **attributes: Any) -> None:
-        """Record a histogram metric (distribution of values)."""
+        """Record a histogram metric (distribution sketch per series)."""
         self._record("histogram", name, value, attributes)
 
+    def bind(self, metric_type: str, name: str, **attributes: Any) -> BoundInstrument:
+        """
+        Resolve a ``"counter"``, ``"gauge"`` or ``"histogram"`` series up front.
+
+        Usage:
+            latency = apm.metrics.bind("histogram", "db_query_ms", table="orders")
+            latency.record(12.5)
+        """
+        if metric_type not in ("counter", "gauge", "histogram"):
+            raise ValueError(
+                f"Unknown metric type {metric_type!r}; expected counter, gauge or histogram"
+            )
+        return BoundInstrument(self, series_key(metric_type, name, attributes), dict(attributes))
+
+    def register_callback(self, callback: Callable[["ApmMetrics"], None]) -> None:
+        """
+        Call ``callback(metrics)`` at the end of every export interval.
+
+        Use it to sample observable values (queue depths, resource usage)
+        just before the interval's series are collected.
+        """
+        self._callbacks.append(callback)
+
     def _record(
         self, metric_type: str, name: str, value: float, attributes: dict[str, Any]
     ) -> None:
-        record = MetricRecord(
-            name=name,
-            type=metric_type,
-            value=value,
-            timestamp=int(time.time() * 1_000_000_000),
-            attributes=attributes,
+        self._aggregator.record(metric_type, name, value, attributes)
+
+    def _record_series(self, key: tuple, attributes: dict[str, Any], value: float) -> None:
+        self._aggregator.record_series(key, attributes, value)
+
+    def _create_processor(self) -> BaseProcessor:
+        # Metrics keep a fixed export interval so every point covers the same window.
+        return BatchProcessor(
+            self._config,
+            self._export,
+            "metrics",
+            collect=self._collect,
+            adaptive=False,
+            max_queue_size=metrics_queue_size(self._config),
         )
-        self._queue.put(record)
-
-        if self._queue.qsize() >= self._config.batch_size:
-            self._flush()
-
-    def _convert_attributes(self, attributes: dict[str, Any]) -> list[dict]:
-        result = []
-        for key, value in attributes.items():
-            if value is None:
-                continue
-            if isinstance(value, str):
-                result.append({"key": key, "value": {"stringValue": value}})
-            elif isinstance(value, bool):
-                result.append({"key": key, "value": {"boolValue": value}})
-            elif isinstance(value, int):
-                result.append({"key": key, "value": {"intValue": value}})
-            elif isinstance(value, float):
-                result.append({"key": key, "value": {"doubleValue": value}})
-            else:
-                result.append({"key": key, "value": {"stringValue": str(value)}})
-        return result
-
-    def _flush(self) -> None:
-        records: list[MetricRecord] = []
-        while not self._queue.empty() and len(records) < self._config.batch_size:
+
+    def _collect(self) -> list[MetricPoint]:
+        for callback in self._callbacks:
             try:
-                records.append(self._queue.get_nowait())
+                callback(self)
             except Exception:
-                break
-
-        if not records:
-            return
+                # A failing callback must not stop the interval's export.
+                pass
+        return self._aggregator.collect()
 
-        # Group by metric name
-        grouped: dict[str, list[MetricRecord]] = {}
+    def _build_metrics(self, records: list[MetricPoint]) -> list[dict]:
+        # Group data points by metric name and OTLP kind
+        grouped: dict[tuple[str, str], list[dict]] = {}
         for record in records:
-            if record.name not in grouped:
-                grouped[record.name] = []
-            grouped[record.name].append(record)
+            grouped.setdefault((record.name, record.kind), []).append(record.data_point)
 
         metrics = []
-        for name, recs in grouped.items():
-            first = recs[0]
-            data_points = [
-                {
-                    "timeUnixNano": r.timestamp,
-                    "asDouble": r.value,
-                    "attributes": self._convert_attributes(r.attributes),
-                }
-                for r in recs
-            ]
-
-            if first.type == "counter":
-                metrics.append(
-                    {
-                        "name": name,
-                        "sum": {
-                            "dataPoints": data_points,
-                            "isMonotonic": True,
-                            "aggregationTemporality": 2,
-                        },
-                    }
-                )
-            else:
-                metrics.append({"name": name, "gauge": {"dataPoints": data_points}})
-
-        request = {
-            "resourceMetrics": [
-                {
-                    "resource": {
-                        "attributes": [
-                            {
-                                "key": "service.name",
-                                "value": {"stringValue": self._config.application_name},
-                            }
-                        ]
-                    },
-                    "scopeMetrics": [
-                        {
-                            "scope": {"name": "racelogic-apm"},
-                            "metrics": metrics,
-                        }
-                    ],
-                }
-            ]
-        }
-
-        headers = {"Content-Type": "application/json"}
-        if self._config.api_key:
-            headers["X-API-Key"] = self._config.api_key
-        if self._config.application_id:
-            headers["X-Application-Id"] = self._config.application_id
-
-        try:
-            self._client.post(
-                f"{self._config.endpoint}/v1/metrics",
-                json=request,
-                headers=headers,
-            )
-        except Exception:
-            # Re-queue on failure
-            for record in records:
-                self._queue.put(record)
-
-    def _flush_loop(self) -> None:
-        while not self._shutdown:
-            time.sleep(self._config.flush_interval_ms / 1000)
-            if not self._shutdown:
-                self._flush()
-
-    def flush(self) -> None:
-        """Flush all pending metrics."""
-        self._flush()
-
-    def shutdown(self) -> None:
-        """Shutdown the metrics collector."""
-        self._shutdown = True
-        self._flush()
-        self._client.close()
+        for (name, kind), data_points in grouped.items():
+            data: dict[str, Any] = {"dataPoints": data_points}
+            if kind != "gauge":
+                data["aggregationTemporality"] = AGGREGATION_TEMPORALITY_DELTA
+            if kind == "sum":
+                data["isMonotonic"] = True
+            metrics.append({"name": name, kind: data})
+        return metrics
+
+    def _export(self, records: list[MetricPoint]) -> None:
+        self._transport.send("/v1/metrics", self._build_metrics(records))
+
+    @property
+    def dropped_count(self) -> int:
+        """Number of metric data points dropped because the export queue was full."""
+        return self._processor.dropped_count
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Queue depth, high-water mark and export counters for this signal, plus
+        attribute sets rejected by the cardinality caps and NaN or infinite
+        observations dropped.
+        """
+        stats = self._processor.stats()
+        stats["cardinality_rejected"] = self._aggregator.cardinality_rejected
+        stats["overflow_dropped"] = self._aggregator.overflow_dropped
+        stats["non_finite_dropped"] = self._aggregator.non_finite_dropped
+        return stats
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Export all pending metrics.
+
+        Returns False if ``timeout`` seconds elapsed before the backlog drained.
+        """
+        return self._processor.flush(timeout)
+
+    def reinit_after_fork(self) -> None:
+        """
+        Restart aggregation and export in a forked child.
+
+        Series aggregated by the parent are left to the parent to export.
+        """
+        self._aggregator = MetricAggregator(self._config, convert_attributes)
+        self._processor = self._create_processor()
+        if self._owns_transport:
+            self._transport.reinit_after_fork()
+
+    def shutdown(self, timeout: Optional[float] = None) -> bool:
+        """Shutdown the metrics collector, draining pending metrics within ``timeout`` seconds."""
+        drained = self._processor.shutdown(timeout)
+        if self._owns_transport:
+            self._transport.close()
+        return drained
+
+
+def metrics_queue_size(config: ApmConfig) -> int:
+    """
+    Export queue capacity for metrics: at least one interval's worth of points.
+
+    ``collect`` may return a point for every series the cardinality caps
+    allow; a smaller queue would evict them as they are enqueued.
+    """
+    return max(
+        config.max_queue_size, config.metric_total_cardinality_limit + MAX_OVERFLOW_SERIES
+    )
@@ -0,0 +1,195 @@
+"""WSGI and ASGI middleware recording request duration and request logs."""
+
+from time import perf_counter_ns
+from typing import Any, Callable, Optional
+
+from .metrics import BoundInstrument
+
+
+# Set by frameworks (or ``instrument_flask``) to the matched route template.
+ROUTE_ENVIRON_KEY = "racelogic_apm.route"
+
+REQUEST_DURATION_METRIC = "http_request_duration_ms"
+
+# Anything else is reported as "_OTHER" so clients cannot create series at will.
+KNOWN_METHODS = frozenset(
+    ("GET", "HEAD", "POST", "PUT", "DELETE", "CONNECT", "OPTIONS", "TRACE", "PATCH")
+)
+
+# Bound instruments cached per (method, route, status); beyond this, new
+# combinations are recorded without caching.
+MAX_CACHED_INSTRUMENTS = 1024
+
+
+class RequestRecorder:
+    """
+    Records one finished request into the duration histogram and request log.
+
+    The histogram is labelled by method, route template and status, never by
+    the raw path, and recorded through cached ``BoundInstrument`` objects.
+    The request log is subject to the client's ``request_log_sampler`` (keyed
+    on the route); use ``ALWAYS_OFF`` to disable it. Without one, only failed
+    requests and those taking at least ``request_log_slow_ms`` are logged, so
+    the common fast request costs no more than the histogram update.
+    """
+
+    def __init__(self, apm: Any):
+        self._metrics = apm.metrics
+        self._logger = apm.logger
+        self._sampler = apm._config.request_log_sampler
+        self._slow_ms = apm._config.request_log_slow_ms
+        self._instruments: dict[tuple, BoundInstrument] = {}
+
+    def record(
+        self,
+        method: str,
+        route: Optional[str],
+        path: str,
+        status: Optional[int],
+        duration_ns: int,
+    ) -> None:
+        duration_ms = duration_ns / 1_000_000
+        key = (method if method in KNOWN_METHODS else "_OTHER", route, status)
+        instrument = self._instruments.get(key)
+        if instrument is None:
+            instrument = self._bind(key)
+        instrument.record(duration_ms)
+
+        error = status is not None and status >= 500
+        if self._sampler is None:
+            sampled = error or duration_ms >= self._slow_ms
+        else:
+            sampled = self._sampler.should_sample(route or path, error=error)
+        if sampled:
+            # Only sampled requests pay for the message and attributes.
+            attributes: dict[str, Any] = {"method": method, "path": path}
+            if route is not None:
+                attributes["route"] = route
+            if status is not None:
+                attributes["status_code"] = status
+            attributes["duration_ms"] = duration_ms
+            log = self._logger.error if error else self._logger.info
+            log(f"{method} {path}", **attributes)
+
+    def _bind(self, key: tuple) -> BoundInstrument:
+        method, route, status = key
+        attributes: dict[str, Any] = {"method": method}
+        if route is not None:
+            attributes["route"] = route
+        if status is not None:
+            attributes["status"] = status
+        instrument = self._metrics.bind("histogram", REQUEST_DURATION_METRIC, **attributes)
+        if len(self._instruments) < MAX_CACHED_INSTRUMENTS:
+            self._instruments[key] = instrument
+        return instrument
+
+
+class ApmWsgiMiddleware:
+    """
+    WSGI middleware timing each request with ``perf_counter_ns``.
+
+    Duration runs until the application returns its response iterable, so
+    ``wsgi.file_wrapper`` and streaming are left untouched. The route template
+    comes from ``route_resolver(environ)``; by default it is read from
+    ``environ[ROUTE_ENVIRON_KEY]``, which ``ApmClient.instrument_flask`` sets.
+
+    Usage:
+        app.wsgi_app = ApmWsgiMiddleware(app.wsgi_app, apm)
+    """
+
+    def __init__(
+        self,
+        app: Callable,
+        apm: Any,
+        route_resolver: Optional[Callable[[dict], Optional[str]]] = None,
+    ):
+        self.app = app
+        self._recorder = RequestRecorder(apm)
+        self._resolve_route = route_resolver or _environ_route
+
+    def __call__(self, environ: dict, start_response: Callable) -> Any:
+        start = perf_counter_ns()
+        status: list[Optional[int]] = [None]
+
+        def record_status(status_line: str, headers: list, exc_info: Any = None) -> Callable:
+            status[0] = int(status_line[:3])
+            return start_response(status_line, headers, exc_info)
+
+        try:
+            return self.app(environ, record_status)
+        except Exception:
+            status[0] = 500
+            raise
+        finally:
+            self._recorder.record(
+                environ.get("REQUEST_METHOD", ""),
+                self._resolve_route(environ),
+                environ.get("PATH_INFO", ""),
+                status[0],
+                perf_counter_ns() - start,
+            )
+
+
+class ApmAsgiMiddleware:
+    """
+    ASGI middleware timing each HTTP request with ``perf_counter_ns``.
+
+    Duration runs until the application returns, i.e. after the response
+    body has been sent. The route template comes from
+    ``route_resolver(scope)``; by default it is taken from ``scope["route"]``
+    as set by Starlette and FastAPI routers. Lifespan and WebSocket scopes
+    pass through untouched.
+
+    Usage:
+        app.add_middleware(ApmAsgiMiddleware, apm=apm)
+    """
+
+    def __init__(
+        self,
+        app: Callable,
+        apm: Any,
+        route_resolver: Optional[Callable[[dict], Optional[str]]] = None,
+    ):
+        self.app = app
+        self._recorder = RequestRecorder(apm)
+        self._resolve_route = route_resolver or _scope_route
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = perf_counter_ns()
+        status: Optional[int] = None
+
+        async def record_status(message: dict) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, record_status)
+        except Exception:
+            if status is None:
+                status = 500
+            raise
+        finally:
+            self._recorder.record(
+                scope.get("method", ""),
+                self._resolve_route(scope),
+                scope.get("path", ""),
+                status,
+                perf_counter_ns() - start,
+            )
+
+
+def _environ_route(environ: dict) -> Optional[str]:
+    return environ.get(ROUTE_ENVIRON_KEY)
+
+
+def _scope_route(scope: dict) -> Optional[str]:
+    route = scope.get("route")
+    if route is None:
+        return None
+    return getattr(route, "path_format", None) or getattr(route, "path", None)
@@ -0,0 +1,236 @@
+"""Continuous sampling CPU profiler exported as folded stacks."""
+
+import os
+import sys
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from .config import ApmConfig
+
+
+# Frames kept per stack, innermost first; deeper frames are cut from the root.
+MAX_STACK_DEPTH = 64
+
+# Distinct stacks kept per export interval; later ones are counted as "[other]".
+MAX_STACKS = 2000
+
+# Folded profile text per record. The collector stores each attribute in one
+# 64 KiB (32K UTF-16 unit) table property; 16K code points stay under that
+# even if every one needs a surrogate pair. Larger profiles are split.
+MAX_PROFILE_CHARS = 16 * 1024
+
+# Records one profile may be split into; stacks beyond them count as "[other]".
+MAX_PROFILE_RECORDS = 8
+
+# Room kept in each record for the "[other] <count>" line.
+_OTHER_LINE_CHARS = 32
+
+# Frame labels cached per code object.
+MAX_CACHED_LABELS = 8192
+
+PROFILE_MESSAGE = "cpu profile"
+
+
+class SamplingProfiler:
+    """
+    Samples every thread's Python stack and reports folded-stack counts.
+
+    A daemon thread reads ``sys._current_frames()`` ``profiler_sample_hz``
+    times a second. Where the platform exposes per-thread CPU clocks
+    (Linux, macOS) only threads that used CPU since the previous sample are
+    counted, so idle and blocked threads do not show up; elsewhere every
+    thread is counted (a wall-clock profile).
+
+    Samples are aggregated in process as ``thread;outer;...;inner`` stack
+    strings with counts. Every ``profiler_export_interval_ms`` they are
+    emitted through ``emit`` (the logger, bypassing log deduplication,
+    since every profile shares one message) as ``cpu profile`` records whose
+    ``profile.folded`` attribute is the profile in folded format (one
+    ``stack count`` line per stack), ready for flame graph tools. A profile
+    over ``MAX_PROFILE_CHARS`` is split across up to ``MAX_PROFILE_RECORDS``
+    records, numbered by ``profile.part`` of ``profile.parts``; joining
+    their folded text gives the whole profile.
+
+    The time spent sampling is measured, and the sampling period is
+    stretched whenever needed to keep it under ``profiler_max_cpu_percent``
+    of one core.
+    """
+
+    def __init__(self, config: ApmConfig, emit: Callable[..., None]):
+        if config.profiler_sample_hz <= 0:
+            raise ValueError("profiler_sample_hz must be positive")
+        self._emit = emit
+        self._period = 1 / config.profiler_sample_hz
+        self._max_overhead = config.profiler_max_cpu_percent / 100
+        self._export_interval = config.profiler_export_interval_ms / 1000
+        self._labels: dict[Any, str] = {}
+        self._lock = threading.Lock()
+        self.samples = 0
+        self.exported_profiles = 0
+        self._start()
+
+    def _start(self) -> None:
+        self._stacks: dict[str, int] = {}
+        self._cpu_times: dict[int, float] = {}
+        self._interval_samples = 0
+        self._sampling_time = 0.0
+        self._interval_start = time.monotonic()
+        # Average cost of one sample, used to enforce the CPU cap.
+        self._sample_cost = 0.0
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="apm-profiler", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        delay = self._period
+        while not self._stopping.wait(delay):
+            start = time.perf_counter()
+            self._sample()
+            cost = time.perf_counter() - start
+            self._sample_cost = cost if not self._sample_cost else 0.9 * self._sample_cost + 0.1 * cost
+            delay = self._period
+            if self._max_overhead > 0:
+                delay = max(delay, self._sample_cost / self._max_overhead - self._sample_cost)
+            with self._lock:
+                self._sampling_time += cost
+            if time.monotonic() - self._interval_start >= self._export_interval:
+                self.export()
+
+    def _sample(self) -> None:
+        own = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        frames = sys._current_frames()
+        stacks = []
+        for ident, frame in frames.items():
+            if ident == own or not self._on_cpu(ident):
+                continue
+            stacks.append(self._fold(names.get(ident, str(ident)), frame))
+        del frames
+
+        # Threads that exited stop being tracked.
+        for ident in self._cpu_times.keys() - names.keys():
+            del self._cpu_times[ident]
+
+        with self._lock:
+            self.samples += 1
+            self._interval_samples += 1
+            counts = self._stacks
+            for stack in stacks:
+                if stack in counts or len(counts) < MAX_STACKS:
+                    counts[stack] = counts.get(stack, 0) + 1
+                else:
+                    counts["[other]"] = counts.get("[other]", 0) + 1
+
+    def _on_cpu(self, ident: int) -> bool:
+        """Return True if the thread used CPU since the previous sample."""
+        try:
+            cpu = time.clock_gettime(time.pthread_getcpuclockid(ident))
+        except (AttributeError, OSError):
+            # No per-thread CPU clock here; count the thread regardless.
+            return True
+        last = self._cpu_times.get(ident)
+        self._cpu_times[ident] = cpu
+        return last is not None and cpu > last
+
+    def _fold(self, thread_name: str, frame: Any) -> str:
+        labels = []
+        depth = 0
+        while frame is not None and depth < MAX_STACK_DEPTH:
+            code = frame.f_code
+            label = self._labels.get(code)
+            if label is None:
+                label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                # ';' separates frames in folded stacks.
+                label = label.replace(";", ":")
+                if len(self._labels) < MAX_CACHED_LABELS:
+                    self._labels[code] = label
+            labels.append(label)
+            frame = frame.f_back
+            depth += 1
+        labels.append(thread_name.replace(";", ":"))
+        labels.reverse()
+        return ";".join(labels)
+
+    def export(self) -> None:
+        """Emit the profile collected since the previous export, if any."""
+        now = time.monotonic()
+        with self._lock:
+            stacks, self._stacks = self._stacks, {}
+            samples, self._interval_samples = self._interval_samples, 0
+            sampling_time, self._sampling_time = self._sampling_time, 0.0
+            start, self._interval_start = self._interval_start, now
+        if not stacks:
+            return
+
+        duration = max(now - start, 1e-9)
+        parts = _split_folded(stacks)
+        attributes = {
+            "profile.format": "folded",
+            "profile.samples": samples,
+            "profile.stacks": len(stacks),
+            "profile.duration_ms": round(duration * 1000),
+            "profile.sample_hz": round(samples / duration, 2),
+            "profile.overhead_percent": round(sampling_time / duration * 100, 3),
+            "profile.parts": len(parts),
+        }
+        try:
+            for index, lines in enumerate(parts):
+                self._emit(
+                    PROFILE_MESSAGE,
+                    **attributes,
+                    **{"profile.part": index, "profile.folded": "\n".join(lines)},
+                )
+        except Exception:
+            # The profiler must never take the application down.
+            return
+        self.exported_profiles += 1
+
+    def stats(self) -> dict[str, Any]:
+        """Samples taken, profiles exported and the current sampling cost."""
+        return {
+            "samples": self.samples,
+            "exported_profiles": self.exported_profiles,
+            "sample_cost_ms": self._sample_cost * 1000,
+        }
+
+    def reinit_after_fork(self) -> None:
+        """Restart sampling in a forked child, without the parent's samples."""
+        self._lock = threading.Lock()
+        self._start()
+
+    def shutdown(self, timeout: Optional[float] = None) -> None:
+        """Stop sampling and emit what was collected since the last export."""
+        self._stopping.set()
+        if self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self.export()
+
+
+def _split_folded(stacks: dict[str, int]) -> list[list[str]]:
+    """
+    Fold ``stacks`` into ``stack count`` lines, heaviest first, grouped into
+    parts of at most ``MAX_PROFILE_CHARS``. Stacks that do not fit are
+    summed into an ``[other]`` line at the end of the last part.
+    """
+    limit = MAX_PROFILE_CHARS - _OTHER_LINE_CHARS
+    parts: list[list[str]] = [[]]
+    size = 0
+    other = 0
+    for stack, count in sorted(stacks.items(), key=lambda item: item[1], reverse=True):
+        line = f"{stack} {count}"
+        if stack == "[other]" or len(line) + 1 > limit:
+            other += count
+            continue
+        if size + len(line) + 1 > limit:
+            if len(parts) >= MAX_PROFILE_RECORDS:
+                # Smaller stacks may still fit in the last part.
+                other += count
+                continue
+            parts.append([])
+            size = 0
+        parts[-1].append(line)
+        size += len(line) + 1
+    if other:
+        parts[-1].append(f"[other] {other}")
+    return parts
@@ -0,0 +1,329 @@
+"""
+Minimal OTLP protobuf encoder with no third-party dependencies.
+
+Payloads are built in their OTLP/JSON shape throughout the SDK; this module
+walks the same dicts against a table of OTLP field numbers and writes the
+protobuf wire format, so ``application/x-protobuf`` needs no generated code.
+Only the fields the SDK emits are described; unknown keys are ignored.
+"""
+
+import struct
+from typing import Any, Callable
+
+
+_pack_double = struct.Struct("<d").pack
+_pack_fixed64 = struct.Struct("<Q").pack
+_pack_sfixed64 = struct.Struct("<q").pack
+_pack_fixed32 = struct.Struct("<I").pack
+
+_SMALL_VARINTS = [bytes((i,)) for i in range(128)]
+
+# Varints carry uint64, or int64 as its two's complement.
+_INT64_MIN = -(1 << 63)
+_UINT64_LIMIT = 1 << 64
+
+# Wire types
+_VARINT = 0
+_I64 = 1
+_LEN = 2
+_I32 = 5
+
+
+def _varint(value: int) -> bytes:
+    if 0 <= value < 128:
+        return _SMALL_VARINTS[value]
+    if value < 0:
+        if value < _INT64_MIN:
+            raise ValueError(f"{value} is below the int64 range")
+        value += _UINT64_LIMIT
+    elif value >= _UINT64_LIMIT:
+        raise ValueError(f"{value} does not fit in 64 bits")
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _key(number: int, wire_type: int) -> bytes:
+    return _varint((number << 3) | wire_type)
+
+
+def _zigzag(value: int) -> int:
+    return (value << 1) ^ (value >> 63)
+
+
+# Field type -> (wire type, value encoder)
+_SCALARS: dict[str, tuple[int, Callable[[Any], bytes]]] = {
+    # Lone surrogates cannot be UTF-8 encoded; they become "?" instead of
+    # failing the whole request.
+    "string": (_LEN, lambda v: _length_prefixed(v.encode("utf-8", "replace"))),
+    "bytes_hex": (_LEN, lambda v: _length_prefixed(bytes.fromhex(v))),
+    "bool": (_VARINT, lambda v: b"\x01" if v else b"\x00"),
+    "int64": (_VARINT, lambda v: _varint(int(v))),
+    "enum": (_VARINT, lambda v: _varint(int(v))),
+    "sint32": (_VARINT, lambda v: _varint(_zigzag(int(v)))),
+    "fixed64": (_I64, lambda v: _pack_fixed64(int(v))),
+    "sfixed64": (_I64, lambda v: _pack_sfixed64(int(v))),
+    "fixed32": (_I32, lambda v: _pack_fixed32(int(v))),
+    "double": (_I64, lambda v: _pack_double(float(v))),
+}
+
+_PACKED: dict[str, Callable[[list], bytes]] = {
+    "packed_fixed64": lambda vs: b"".join(_pack_fixed64(int(v)) for v in vs),
+    "packed_double": lambda vs: b"".join(_pack_double(float(v)) for v in vs),
+    "packed_uint64": lambda vs: b"".join(_varint(int(v)) for v in vs),
+}
+
+
+def _length_prefixed(data: bytes) -> bytes:
+    return _varint(len(data)) + data
+
+
+# message -> {json key: (field number, type)}; types naming another message
+# in this table are encoded as embedded (repeated when the value is a list).
+SCHEMA: dict[str, dict[str, tuple[int, str]]] = {
+    # common/v1
+    "AnyValue": {
+        "stringValue": (1, "string"),
+        "boolValue": (2, "bool"),
+        "intValue": (3, "int64"),
+        "doubleValue": (4, "double"),
+        "arrayValue": (5, "ArrayValue"),
+        "kvlistValue": (6, "KeyValueList"),
+    },
+    "ArrayValue": {"values": (1, "AnyValue")},
+    "KeyValueList": {"values": (1, "KeyValue")},
+    "KeyValue": {"key": (1, "string"), "value": (2, "AnyValue")},
+    "InstrumentationScope": {"name": (1, "string"), "version": (2, "string")},
+    "Resource": {"attributes": (1, "KeyValue")},
+    # logs/v1
+    "ExportLogsServiceRequest": {"resourceLogs": (1, "ResourceLogs")},
+    "ResourceLogs": {"resource": (1, "Resource"), "scopeLogs": (2, "ScopeLogs")},
+    "ScopeLogs": {"scope": (1, "InstrumentationScope"), "logRecords": (2, "LogRecord")},
+    "LogRecord": {
+        "timeUnixNano": (1, "fixed64"),
+        "severityNumber": (2, "enum"),
+        "severityText": (3, "string"),
+        "body": (5, "AnyValue"),
+        "attributes": (6, "KeyValue"),
+        "traceId": (9, "bytes_hex"),
+        "spanId": (10, "bytes_hex"),
+        "observedTimeUnixNano": (11, "fixed64"),
+    },
+    # metrics/v1
+    "ExportMetricsServiceRequest": {"resourceMetrics": (1, "ResourceMetrics")},
+    "ResourceMetrics": {"resource": (1, "Resource"), "scopeMetrics": (2, "ScopeMetrics")},
+    "ScopeMetrics": {"scope": (1, "InstrumentationScope"), "metrics": (2, "Metric")},
+    "Metric": {
+        "name": (1, "string"),
+        "description": (2, "string"),
+        "unit": (3, "string"),
+        "gauge": (5, "Gauge"),
+        "sum": (7, "Sum"),
+        "histogram": (9, "Histogram"),
+        "exponentialHistogram": (10, "ExponentialHistogram"),
+    },
+    "Gauge": {"dataPoints": (1, "NumberDataPoint")},
+    "Sum": {
+        "dataPoints": (1, "NumberDataPoint"),
+        "aggregationTemporality": (2, "enum"),
+        "isMonotonic": (3, "bool"),
+    },
+    "Histogram": {
+        "dataPoints": (1, "HistogramDataPoint"),
+        "aggregationTemporality": (2, "enum"),
+    },
+    "ExponentialHistogram": {
+        "dataPoints": (1, "ExponentialHistogramDataPoint"),
+        "aggregationTemporality": (2, "enum"),
+    },
+    "NumberDataPoint": {
+        "startTimeUnixNano": (2, "fixed64"),
+        "timeUnixNano": (3, "fixed64"),
+        "asDouble": (4, "double"),
+        "asInt": (6, "sfixed64"),
+        "attributes": (7, "KeyValue"),
+    },
+    "HistogramDataPoint": {
+        "startTimeUnixNano": (2, "fixed64"),
+        "timeUnixNano": (3, "fixed64"),
+        "count": (4, "fixed64"),
+        "sum": (5, "double"),
+        "bucketCounts": (6, "packed_fixed64"),
+        "explicitBounds": (7, "packed_double"),
+        "attributes": (9, "KeyValue"),
+        "min": (11, "double"),
+        "max": (12, "double"),
+    },
+    "ExponentialHistogramDataPoint": {
+        "attributes": (1, "KeyValue"),
+        "startTimeUnixNano": (2, "fixed64"),
+        "timeUnixNano": (3, "fixed64"),
+        "count": (4, "fixed64"),
+        "sum": (5, "double"),
+        "scale": (6, "sint32"),
+        "zeroCount": (7, "fixed64"),
+        "positive": (8, "Buckets"),
+        "negative": (9, "Buckets"),
+        "min": (12, "double"),
+        "max": (13, "double"),
+    },
+    "Buckets": {"offset": (1, "sint32"), "bucketCounts": (2, "packed_uint64")},
+    # trace/v1
+    "ExportTraceServiceRequest": {"resourceSpans": (1, "ResourceSpans")},
+    "ResourceSpans": {"resource": (1, "Resource"), "scopeSpans": (2, "ScopeSpans")},
+    "ScopeSpans": {"scope": (1, "InstrumentationScope"), "spans": (2, "Span")},
+    "Span": {
+        "traceId": (1, "bytes_hex"),
+        "spanId": (2, "bytes_hex"),
+        "parentSpanId": (4, "bytes_hex"),
+        "name": (5, "string"),
+        "kind": (6, "enum"),
+        "startTimeUnixNano": (7, "fixed64"),
+        "endTimeUnixNano": (8, "fixed64"),
+        "attributes": (9, "KeyValue"),
+        "events": (11, "SpanEvent"),
+        "status": (15, "Status"),
+    },
+    "SpanEvent": {
+        "timeUnixNano": (1, "fixed64"),
+        "name": (2, "string"),
+        "attributes": (3, "KeyValue"),
+    },
+    "Status": {"message": (2, "string"), "code": (3, "enum")},
+}
+
+# OTLP/HTTP path -> root export request message
+REQUEST_MESSAGES = {
+    "/v1/logs": "ExportLogsServiceRequest",
+    "/v1/metrics": "ExportMetricsServiceRequest",
+    "/v1/traces": "ExportTraceServiceRequest",
+}
+
+
+def _build_encoders() -> dict[str, dict[str, tuple[bytes, Callable[[Any], bytes], bool]]]:
+    """Precompute json key -> (field key bytes, encoder, is message) per message."""
+    encoders: dict[str, dict] = {name: {} for name in SCHEMA}
+
+    def embedded(message: str) -> Callable[[Any], bytes]:
+        fields = encoders[message]
+        return lambda v: _length_prefixed(_encode_message(fields, v))
+
+    for name, fields in SCHEMA.items():
+        for json_key, (number, field_type) in fields.items():
+            if field_type in SCHEMA:
+                entry = (_key(number, _LEN), embedded(field_type), True)
+            elif field_type in _PACKED:
+                packed = _PACKED[field_type]
+                entry = (_key(number, _LEN), lambda vs, p=packed: _length_prefixed(p(vs)), False)
+            else:
+                wire_type, encode = _SCALARS[field_type]
+                entry = (_key(number, wire_type), encode, False)
+            encoders[name][json_key] = entry
+    return encoders
+
+
+def _encode_message(fields: dict, value: dict) -> bytes:
+    out = bytearray()
+    for json_key, field in value.items():
+        spec = fields.get(json_key)
+        if spec is None or field is None:
+            continue
+        key, encode, is_message = spec
+        if is_message and field.__class__ is list:
+            for item in field:
+                out += key
+                out += encode(item)
+        else:
+            out += key
+            out += encode(field)
+    return bytes(out)
+
+
+_ENCODERS = _build_encoders()
+
+
+def encode_request(path: str, payload: dict) -> bytes:
+    """Encode an OTLP/JSON-shaped export request for ``path`` as protobuf."""
+    return _encode_message(_ENCODERS[REQUEST_MESSAGES[path]], payload)
+
+
+def request_encoder(path: str, resource: dict, scope: dict) -> Callable[[list], bytes]:
+    """
+    Precompute the resource and scope wrapper of the export request for ``path``.
+
+    Returns a function that encodes a list of records (log records, metrics
+    or spans) into a complete request, encoding only the records per call.
+    """
+    request = REQUEST_MESSAGES[path]
+    ((resource_key, (_, resource_message)),) = SCHEMA[request].items()
+    scope_key, scope_message = next(
+        (key, message) for key, (_, message) in SCHEMA[resource_message].items() if key != "resource"
+    )
+    items_key = next(key for key in SCHEMA[scope_message] if key != "scope")
+
+    request_field = _ENCODERS[request][resource_key][0]
+    scope_field = _ENCODERS[resource_message][scope_key][0]
+    resource_head = _encode_message(_ENCODERS[resource_message], {"resource": resource})
+    scope_head = _encode_message(_ENCODERS[scope_message], {"scope": scope})
+    item_field, encode_item, _ = _ENCODERS[scope_message][items_key]
+
+    def encode(items: list) -> bytes:
+        scope_body = scope_head + b"".join(item_field + encode_item(item) for item in items)
+        resource_body = resource_head + scope_field + _length_prefixed(scope_body)
+        return request_field + _length_prefixed(resource_body)
+
+    return encode
+
+
+def _read_varint(data: bytes, pos: int) -> tuple[int, int]:
+    result = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _fields(data: bytes):
+    """Yield ``(field number, wire type, value)``; LEN values are bytes."""
+    pos = 0
+    while pos < len(data):
+        key, pos = _read_varint(data, pos)
+        number, wire_type = key >> 3, key & 0x7
+        if wire_type == _VARINT:
+            value, pos = _read_varint(data, pos)
+        elif wire_type == _LEN:
+            length, pos = _read_varint(data, pos)
+            value, pos = data[pos:pos + length], pos + length
+        elif wire_type == _I64:
+            value, pos = data[pos:pos + 8], pos + 8
+        elif wire_type == _I32:
+            value, pos = data[pos:pos + 4], pos + 4
+        else:
+            raise ValueError(f"Unsupported wire type {wire_type}")
+        yield number, wire_type, value
+
+
+def decode_partial_success(body: bytes) -> tuple[int, str]:
+    """
+    Read ``(rejected count, error message)`` from an OTLP export response.
+
+    Every signal's response carries ``partial_success`` as field 1, with the
+    rejected count as field 1 and the message as field 2.
+    """
+    rejected, message = 0, ""
+    for number, wire_type, value in _fields(body):
+        if number != 1 or wire_type != _LEN:
+            continue
+        for inner, inner_type, inner_value in _fields(value):
+            if inner == 1 and inner_type == _VARINT:
+                rejected = inner_value
+            elif inner == 2 and inner_type == _LEN:
+                message = inner_value.decode("utf-8", "replace")
+    return rejected, message
@@ -0,0 +1,148 @@
+"""Retry policy for exports: error classification, backoff and circuit breaking."""
+
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+import httpx
+
+
+# OTLP/HTTP status codes worth retrying; every other failure is permanent.
+RETRYABLE_STATUS_CODES = frozenset((429, 502, 503, 504))
+
+
+class ExportError(Exception):
+    """
+    An export the collector did not accept.
+
+    ``retryable`` is False for failures that will never succeed (e.g. 400
+    or 401), so the batch is discarded instead of re-queued. ``retry_after``
+    is the delay in seconds the collector asked for, if any.
+    """
+
+    def __init__(
+        self,
+        message: str,
+        retryable: bool,
+        retry_after: Optional[float] = None,
+        status_code: Optional[int] = None,
+    ):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+        self.status_code = status_code
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Return True if an export that failed with ``error`` may succeed later.
+
+    Only retryable ``ExportError`` and connection-level ``httpx`` errors
+    qualify; anything else (a record that cannot be encoded, a bug) would
+    fail the same way on every attempt.
+    """
+    if isinstance(error, ExportError):
+        return error.retryable
+    return isinstance(error, httpx.TransportError)
+
+
+class CircuitOpenError(ExportError):
+    """Raised without contacting the collector while the circuit is open."""
+
+    def __init__(self, retry_after: float):
+        super().__init__("collector circuit open", retryable=True, retry_after=retry_after)
+
+
+class Backoff:
+    """
+    Exponential backoff with jitter.
+
+    The ``attempt``-th delay is drawn from ``[d/2, d]`` where
+    ``d = min(maximum, base * 2 ** attempt)``, so clients that failed
+    together do not all retry together.
+    """
+
+    def __init__(self, base: float, maximum: float):
+        self.base = base
+        self.maximum = maximum
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        ceiling = min(self.maximum, self.base * (2 ** attempt))
+        delay = ceiling / 2 + random.uniform(0, ceiling / 2)
+        if retry_after is not None:
+            # Honour the collector's request, within our own upper bound.
+            delay = max(delay, min(retry_after, self.maximum))
+        return delay
+
+
+class CircuitBreaker:
+    """
+    Stops export attempts while the collector is down.
+
+    After ``threshold`` consecutive failures the circuit opens for a
+    backoff delay (longer each time it re-opens, or as long as the
+    collector's ``Retry-After``). Once the delay has passed a single probe
+    request is let through: success closes the circuit, failure re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, threshold: int, backoff: Backoff):
+        self._threshold = max(1, threshold)
+        self._backoff = backoff
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened = 0
+        self._open_until = 0.0
+        self.state = self.CLOSED
+
+    @property
+    def retry_after(self) -> float:
+        """Seconds until the next probe is allowed (0 when closed)."""
+        return max(0.0, self._open_until - time.monotonic())
+
+    def allow(self) -> bool:
+        """Return True if a request may be sent now."""
+        if self.state == self.CLOSED:
+            return True
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() >= self._open_until:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self) -> None:
+        if self.state == self.CLOSED and not self._failures:
+            return
+        with self._lock:
+            self._failures = 0
+            self._opened = 0
+            self.state = self.CLOSED
+
+    def record_failure(self, retry_after: Optional[float] = None) -> None:
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self._threshold:
+                self._open_until = time.monotonic() + self._backoff.delay(
+                    self._opened, retry_after
+                )
+                self._opened += 1
+                self.state = self.OPEN
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a ``Retry-After`` header (delay seconds or HTTP date) into seconds."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,159 @@
+"""Process and interpreter health metrics: GC, memory, CPU, FDs, threads, loop lag."""
+
+import asyncio
+import gc
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Optional
+
+from .stats import DeltaCounters
+
+
+# GC pauses and loop lag samples kept between two collections.
+MAX_PENDING_SAMPLES = 1024
+
+# How often a watched event loop is probed for lag, in seconds.
+LOOP_LAG_PROBE_INTERVAL = 0.5
+
+_STATM_PATH = "/proc/self/statm"
+_FD_DIRS = ("/proc/self/fd", "/dev/fd")
+
+
+class RuntimeMetrics:
+    """
+    Metrics callback recording process health at the end of every interval.
+
+    Reported metrics (each only where the platform provides it):
+
+    - ``process.runtime.gc.collections`` counter and
+      ``process.runtime.gc.pause_ms`` histogram, per ``generation``
+    - ``process.memory.rss_bytes`` gauge (from ``/proc``)
+    - ``process.cpu.time_s`` counter per ``state`` (user, system) and
+      ``process.cpu.utilization`` gauge (cores busy over the interval)
+    - ``process.open_fds`` and ``process.threads`` gauges
+    - ``process.runtime.event_loop.lag_ms`` histogram for watched loops
+
+    GC pauses are timed by a ``gc.callbacks`` hook that only appends to a
+    deque; everything else is read once per interval on the export worker.
+    With ``watch_running_loop``, the loop the callback runs on (an async
+    client's) is watched automatically.
+    """
+
+    def __init__(self, watch_running_loop: bool = False) -> None:
+        self._watch_running_loop = watch_running_loop
+        self._page_size = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 0
+        self._fd_dir = next((path for path in _FD_DIRS if os.path.isdir(path)), None)
+        self._gc_pauses: deque = deque(maxlen=MAX_PENDING_SAMPLES)
+        self._gc_start: Optional[float] = None
+        self._loop_lags: deque = deque(maxlen=MAX_PENDING_SAMPLES)
+        self._loop_tasks: dict[Any, asyncio.Task] = {}
+        # Counters report what happened after the collector was created.
+        times = os.times()
+        self._deltas = DeltaCounters()
+        self._deltas.baseline("user", times.user)
+        self._deltas.baseline("system", times.system)
+        for generation, stats in enumerate(gc.get_stats()):
+            self._deltas.baseline(("gc", generation), stats["collections"])
+        self._last_time = time.monotonic()
+        self._last_cpu = times.user + times.system
+        gc.callbacks.append(self._on_gc)
+
+    def _on_gc(self, phase: str, info: dict) -> None:
+        # Runs inside the collector: no locks, no allocation-heavy work.
+        if phase == "start":
+            self._gc_start = time.perf_counter()
+        elif self._gc_start is not None:
+            self._gc_pauses.append(
+                (info["generation"], (time.perf_counter() - self._gc_start) * 1000)
+            )
+            self._gc_start = None
+
+    def watch_loop(self) -> None:
+        """
+        Record lag of the running event loop.
+
+        Must be called from inside the loop. A task sleeps for
+        ``LOOP_LAG_PROBE_INTERVAL`` and records how late it woke up.
+        """
+        loop = asyncio.get_running_loop()
+        if loop not in self._loop_tasks:
+            self._loop_tasks[loop] = loop.create_task(
+                self._probe_loop(), name="apm-runtime-loop-lag"
+            )
+
+    async def _probe_loop(self) -> None:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(LOOP_LAG_PROBE_INTERVAL)
+            lag = time.perf_counter() - start - LOOP_LAG_PROBE_INTERVAL
+            self._loop_lags.append(max(0.0, lag) * 1000)
+
+    def __call__(self, metrics: Any) -> None:
+        if self._watch_running_loop:
+            try:
+                # Async clients collect on their loop; watch it from the first interval.
+                self.watch_loop()
+            except RuntimeError:
+                pass
+        self._record_gc(metrics)
+        self._record_cpu(metrics)
+
+        rss = self._rss_bytes()
+        if rss is not None:
+            metrics.gauge("process.memory.rss_bytes", rss)
+        if self._fd_dir is not None:
+            try:
+                metrics.gauge("process.open_fds", len(os.listdir(self._fd_dir)))
+            except OSError:
+                pass
+        metrics.gauge("process.threads", threading.active_count())
+
+        for _ in range(len(self._loop_lags)):
+            metrics.histogram("process.runtime.event_loop.lag_ms", self._loop_lags.popleft())
+
+    def _record_gc(self, metrics: Any) -> None:
+        for generation, stats in enumerate(gc.get_stats()):
+            self._deltas.emit(
+                metrics,
+                "process.runtime.gc.collections",
+                ("gc", generation),
+                stats["collections"],
+                generation=generation,
+            )
+        for _ in range(len(self._gc_pauses)):
+            generation, pause_ms = self._gc_pauses.popleft()
+            metrics.histogram("process.runtime.gc.pause_ms", pause_ms, generation=generation)
+
+    def _record_cpu(self, metrics: Any) -> None:
+        times = os.times()
+        self._deltas.emit(metrics, "process.cpu.time_s", "user", times.user, state="user")
+        self._deltas.emit(metrics, "process.cpu.time_s", "system", times.system, state="system")
+
+        now = time.monotonic()
+        cpu = times.user + times.system
+        elapsed = now - self._last_time
+        if elapsed > 0 and cpu >= self._last_cpu:
+            metrics.gauge("process.cpu.utilization", (cpu - self._last_cpu) / elapsed)
+        self._last_time, self._last_cpu = now, cpu
+
+    def _rss_bytes(self) -> Optional[int]:
+        if not self._page_size:
+            return None
+        try:
+            with open(_STATM_PATH, "rb") as statm:
+                return int(statm.read().split()[1]) * self._page_size
+        except (OSError, IndexError, ValueError):
+            return None
+
+    def shutdown(self) -> None:
+        """Remove the GC hook and stop probing event loops."""
+        try:
+            gc.callbacks.remove(self._on_gc)
+        except ValueError:
+            pass
+        for loop, task in self._loop_tasks.items():
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(task.cancel)
+        self._loop_tasks.clear()
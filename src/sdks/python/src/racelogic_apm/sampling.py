@@ -0,0 +1,134 @@
+"""Samplers deciding which traces and request logs are recorded."""
+
+import random
+import threading
+import time
+from typing import Optional
+
+
+_TRACE_ID_LOW_MASK = (1 << 64) - 1
+
+
+class Sampler:
+    """
+    Base class for sampling decisions.
+
+    ``name`` is the span name or route, ``trace_id`` is set for spans so
+    decisions can be consistent across a trace, ``parent_sampled`` carries
+    the parent span's decision (None for a root) and ``error`` is True when
+    the operation is known to have failed.
+    """
+
+    def should_sample(
+        self,
+        name: str,
+        trace_id: Optional[int] = None,
+        parent_sampled: Optional[bool] = None,
+        error: bool = False,
+    ) -> bool:
+        raise NotImplementedError
+
+
+class AlwaysOnSampler(Sampler):
+    """Record everything."""
+
+    def should_sample(self, name, trace_id=None, parent_sampled=None, error=False) -> bool:
+        return True
+
+
+class AlwaysOffSampler(Sampler):
+    """Record nothing."""
+
+    def should_sample(self, name, trace_id=None, parent_sampled=None, error=False) -> bool:
+        return False
+
+
+ALWAYS_ON = AlwaysOnSampler()
+ALWAYS_OFF = AlwaysOffSampler()
+
+
+class ProbabilitySampler(Sampler):
+    """
+    Record a fixed fraction (``rate``, 0..1) of operations.
+
+    Spans are decided from the low 64 bits of their trace id, so every
+    service sampling at the same rate keeps the same traces.
+    """
+
+    def __init__(self, rate: float):
+        if not 0.0 <= rate <= 1.0:
+            raise ValueError("rate must be between 0 and 1")
+        self.rate = rate
+        self._threshold = int(rate * (1 << 64))
+
+    def should_sample(self, name, trace_id=None, parent_sampled=None, error=False) -> bool:
+        if trace_id is None:
+            return random.random() < self.rate
+        return (trace_id & _TRACE_ID_LOW_MASK) < self._threshold
+
+
+class RateLimitingSampler(Sampler):
+    """Record at most ``per_second`` operations per second (token bucket)."""
+
+    def __init__(self, per_second: float, burst: Optional[float] = None):
+        if per_second <= 0:
+            raise ValueError("per_second must be positive")
+        self._rate = per_second
+        self._capacity = burst if burst is not None else max(per_second, 1.0)
+        self._tokens = self._capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def should_sample(self, name, trace_id=None, parent_sampled=None, error=False) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._capacity, self._tokens + (now - self._last) * self._rate)
+            self._last = now
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            return False
+
+
+class RouteSampler(Sampler):
+    """
+    Pick a sampler per route or span name, falling back to ``default``.
+
+    Usage:
+        RouteSampler(
+            {"/health": ALWAYS_OFF, "/api/orders/<int:id>": ProbabilitySampler(0.01)},
+            default=RateLimitingSampler(100),
+        )
+    """
+
+    def __init__(self, routes: dict[str, Sampler], default: Sampler = ALWAYS_ON):
+        self._routes = dict(routes)
+        self._default = default
+
+    def should_sample(self, name, trace_id=None, parent_sampled=None, error=False) -> bool:
+        sampler = self._routes.get(name, self._default)
+        return sampler.should_sample(name, trace_id, parent_sampled, error)
+
+
+class KeepErrorsSampler(Sampler):
+    """Always record failures; delegate everything else."""
+
+    def __init__(self, delegate: Sampler):
+        self._delegate = delegate
+
+    def should_sample(self, name, trace_id=None, parent_sampled=None, error=False) -> bool:
+        if error:
+            return True
+        return self._delegate.should_sample(name, trace_id, parent_sampled, error)
+
+
+class ParentBasedSampler(Sampler):
+    """Follow the parent span's decision; use ``root`` for new traces."""
+
+    def __init__(self, root: Sampler = ALWAYS_ON):
+        self._root = root
+
+    def should_sample(self, name, trace_id=None, parent_sampled=None, error=False) -> bool:
+        if parent_sampled is not None:
+            return parent_sampled
+        return self._root.should_sample(name, trace_id, None, error)
@@ -0,0 +1,202 @@
+"""Base-2 exponential histogram sketch (OTLP ExponentialHistogram)."""
+
+import math
+from typing import Optional
+
+
+MAX_SCALE = 20
+DEFAULT_MAX_SIZE = 160
+
+
+class _Buckets:
+    """Sparse bucket counts for one sign of the value range."""
+
+    __slots__ = ("counts", "low", "high")
+
+    def __init__(self) -> None:
+        self.counts: dict[int, int] = {}
+        self.low = 0
+        self.high = -1
+
+    def __bool__(self) -> bool:
+        return bool(self.counts)
+
+    def range_with(self, low: int, high: int) -> tuple[int, int]:
+        if not self.counts:
+            return low, high
+        return min(self.low, low), max(self.high, high)
+
+    def increment(self, index: int, count: int = 1) -> None:
+        if not self.counts:
+            self.low = self.high = index
+        elif index < self.low:
+            self.low = index
+        elif index > self.high:
+            self.high = index
+        self.counts[index] = self.counts.get(index, 0) + count
+
+    def downscale(self, change: int) -> None:
+        if not self.counts or change <= 0:
+            return
+        counts, self.counts = self.counts, {}
+        for index, count in counts.items():
+            index >>= change
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.low >>= change
+        self.high >>= change
+
+    def to_otlp(self) -> dict:
+        if not self.counts:
+            return {"offset": 0, "bucketCounts": []}
+        return {
+            "offset": self.low,
+            "bucketCounts": [self.counts.get(i, 0) for i in range(self.low, self.high + 1)],
+        }
+
+
+class ExponentialHistogram:
+    """
+    Mergeable quantile sketch with bounded relative error and fixed memory.
+
+    Values are mapped to buckets whose boundaries grow by
+    ``base = 2 ** (2 ** -scale)``. At most ``max_size`` buckets are kept per
+    sign; when a new value would exceed that, the scale is lowered and
+    adjacent buckets are merged, so memory stays constant whatever the input
+    and the relative error of any quantile is at most ``(base - 1) / (base + 1)``.
+    """
+
+    __slots__ = (
+        "max_size", "scale", "count", "sum", "min", "max",
+        "zero_count", "positive", "negative",
+    )
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE, scale: int = MAX_SCALE):
+        self.max_size = max_size
+        self.scale = scale
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.zero_count = 0
+        self.positive = _Buckets()
+        self.negative = _Buckets()
+
+    @property
+    def relative_error(self) -> float:
+        base = 2.0 ** (2.0 ** -self.scale)
+        return (base - 1) / (base + 1)
+
+    def update(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+        if value == 0:
+            self.zero_count += 1
+            return
+        buckets = self.positive if value > 0 else self.negative
+        self._increment(buckets, abs(value), 1)
+
+    def _increment(self, buckets: _Buckets, magnitude: float, count: int) -> None:
+        index = _map_to_index(magnitude, self.scale)
+        change = _downscale_needed(*buckets.range_with(index, index), self.max_size)
+        if change:
+            self._downscale(change)
+            index >>= change
+        buckets.increment(index, count)
+
+    def _downscale(self, change: int) -> None:
+        self.positive.downscale(change)
+        self.negative.downscale(change)
+        self.scale -= change
+
+    def merge(self, other: "ExponentialHistogram") -> None:
+        """Fold another sketch into this one."""
+        if other.count == 0:
+            return
+        if other.scale < self.scale:
+            self._downscale(self.scale - other.scale)
+        shift = other.scale - self.scale
+
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.zero_count += other.zero_count
+
+        for mine, theirs in ((self.positive, other.positive), (self.negative, other.negative)):
+            if not theirs:
+                continue
+            low, high = mine.range_with(theirs.low >> shift, theirs.high >> shift)
+            change = _downscale_needed(low, high, self.max_size)
+            if change:
+                self._downscale(change)
+                shift += change
+            for index, count in theirs.counts.items():
+                mine.increment(index >> shift, count)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate the value at quantile ``q`` (0..1), or None if empty."""
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        base = 2.0 ** (2.0 ** -self.scale)
+
+        seen = 0
+        # Negative buckets hold magnitudes, so walk them from the largest down.
+        for index in sorted(self.negative.counts, reverse=True):
+            seen += self.negative.counts[index]
+            if seen > rank:
+                return self._clamp(-_bucket_midpoint(index, base))
+        seen += self.zero_count
+        if seen > rank:
+            return self._clamp(0.0)
+        for index in sorted(self.positive.counts):
+            seen += self.positive.counts[index]
+            if seen > rank:
+                return self._clamp(_bucket_midpoint(index, base))
+        return self.max
+
+    def _clamp(self, value: float) -> float:
+        return min(max(value, self.min), self.max)
+
+    def to_data_point(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min,
+            "max": self.max,
+            "scale": self.scale,
+            "zeroCount": self.zero_count,
+            "positive": self.positive.to_otlp(),
+            "negative": self.negative.to_otlp(),
+        }
+
+
+def _map_to_index(magnitude: float, scale: int) -> int:
+    # Bucket ``i`` holds (base ** i, base ** (i + 1)]; exact powers of two
+    # belong to the bucket below, which frexp lets us detect precisely.
+    mantissa, exponent = math.frexp(magnitude)
+    if scale > 0:
+        if mantissa == 0.5:
+            return ((exponent - 1) << scale) - 1
+        return math.ceil(math.log2(magnitude) * (1 << scale)) - 1
+    exponent -= 1
+    if mantissa == 0.5:
+        exponent -= 1
+    return exponent >> -scale
+
+
+def _downscale_needed(low: int, high: int, max_size: int) -> int:
+    change = 0
+    while (high >> change) - (low >> change) + 1 > max_size:
+        change += 1
+    return change
+
+
+def _bucket_midpoint(index: int, base: float) -> float:
+    # Midpoint that minimises relative error across the bucket.
+    return 2.0 * base ** (index + 1) / (base + 1)
@@ -0,0 +1,312 @@
+"""Disk-backed spool for export requests the collector could not accept."""
+
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import NamedTuple, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+# body length, crc32 of the rest of the entry, then the lengths of the path,
+# content type and content encoding that precede the body
+_HEADER = struct.Struct("<IIHBB")
+# segment sequence, offset of the next unread entry
+_CURSOR = struct.Struct("<QQ")
+
+_SEGMENT_SUFFIX = ".seg"
+_CURSOR_FILE = "cursor"
+_LOCK_FILE = "lock"
+_MAX_SLOTS = 256
+
+
+class SpoolEntry(NamedTuple):
+    """An export request as it was sent: replay it with the same headers."""
+
+    path: str
+    body: bytes
+    content_type: str
+    content_encoding: Optional[str]
+
+
+class DiskSpool:
+    """
+    Segmented append-only spool of encoded export requests.
+
+    Failed batches are appended as ``SpoolEntry`` records (path, body,
+    content type and content encoding) to numbered
+    segment files and read back oldest first, so replay preserves order.
+    Segments older than ``max_age_s``, and the oldest segments once the spool
+    exceeds ``max_bytes``, are evicted. A persisted read cursor lets a
+    restarted process resume where the previous one stopped.
+
+    Each process claims its own slot directory under ``directory`` with an
+    exclusive lock, so pre-fork workers never write to the same segment.
+    Slots whose lock is free when the spool opens belong to processes that
+    exited (for example after the worker count shrank); their unread entries
+    are moved into the claimed slot so they are still replayed. Without
+    ``fcntl`` (Windows) live slots cannot be told apart, so nothing is adopted.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int,
+        max_age_s: float,
+        segment_bytes: int,
+    ):
+        self._max_bytes = max_bytes
+        self._max_age_s = max_age_s
+        self._segment_bytes = segment_bytes
+        self._lock = threading.Lock()
+        self._slot_lock = None
+        self._dir = self._claim_slot(directory)
+        self._adopt_orphans(directory)
+
+        self._sizes = {seq: os.path.getsize(self._segment_path(seq)) for seq in _segments(self._dir)}
+        self._segments = sorted(self._sizes)
+        self._read_seq, self._read_offset = self._load_cursor()
+        self._pending_size = 0
+
+        # Always start a fresh segment so a torn tail left by a crash is
+        # never appended to.
+        self._write_seq = self._segments[-1] + 1 if self._segments else 0
+        self._writer: Optional[int] = None
+        self.evicted_bytes = 0
+
+    @property
+    def size_bytes(self) -> int:
+        """Bytes currently held on disk."""
+        return sum(self._sizes.values())
+
+    def append(
+        self, path: str, body: bytes, content_type: str, content_encoding: Optional[str]
+    ) -> None:
+        """Persist one encoded export request for ``path`` and the headers describing its body."""
+        path_bytes = path.encode("utf-8")
+        type_bytes = content_type.encode("ascii")
+        encoding_bytes = (content_encoding or "").encode("ascii")
+        rest = path_bytes + type_bytes + encoding_bytes + body
+        entry = _HEADER.pack(
+            len(body), zlib.crc32(rest), len(path_bytes), len(type_bytes), len(encoding_bytes)
+        ) + rest
+        with self._lock:
+            if self._writer is None or self._sizes[self._write_seq] >= self._segment_bytes:
+                self._rotate()
+            os.write(self._writer, entry)
+            self._sizes[self._write_seq] += len(entry)
+            self._enforce_size()
+
+    def peek(self) -> Optional[SpoolEntry]:
+        """Return the oldest unsent entry without consuming it."""
+        with self._lock:
+            while self._segments:
+                seq = self._segments[0]
+                if seq != self._read_seq:
+                    self._read_seq, self._read_offset = seq, 0
+                entry = self._read_entry(seq, self._read_offset)
+                if entry is not None:
+                    entry, self._pending_size = entry
+                    return entry
+                if seq == self._write_seq:
+                    return None
+                # Fully consumed, or the rest of the segment is a torn write.
+                self._remove(seq)
+            return None
+
+    def pop(self) -> None:
+        """Consume the entry returned by the last ``peek()``."""
+        with self._lock:
+            if not self._pending_size:
+                return
+            self._read_offset += self._pending_size
+            self._pending_size = 0
+            self._save_cursor()
+
+    def evict_expired(self) -> None:
+        """Drop segments whose newest entry is older than ``max_age_s``."""
+        cutoff = time.time() - self._max_age_s
+        with self._lock:
+            for seq in list(self._segments):
+                try:
+                    expired = os.path.getmtime(self._segment_path(seq)) < cutoff
+                except OSError:
+                    expired = True
+                if not expired:
+                    break
+                self.evicted_bytes += self._sizes.get(seq, 0)
+                self._remove(seq)
+
+    def close(self) -> None:
+        """Release file handles and the slot lock."""
+        with self._lock:
+            if self._writer is not None:
+                os.close(self._writer)
+                self._writer = None
+            if self._slot_lock is not None:
+                self._slot_lock.close()
+                self._slot_lock = None
+
+    def _claim_slot(self, directory: str) -> str:
+        for slot in range(_MAX_SLOTS):
+            path = os.path.join(directory, str(slot))
+            os.makedirs(path, exist_ok=True)
+            if fcntl is None:
+                return path
+            handle = open(os.path.join(path, _LOCK_FILE), "wb")
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                handle.close()
+                continue
+            self._slot_lock = handle
+            return path
+        raise RuntimeError(f"No free spool slot under {directory!r}")
+
+    def _adopt_orphans(self, directory: str) -> None:
+        if fcntl is None:
+            return
+        next_seq = max(_segments(self._dir), default=-1) + 1
+        for slot in range(_MAX_SLOTS):
+            path = os.path.join(directory, str(slot))
+            if path == self._dir or not os.path.isdir(path):
+                continue
+            with open(os.path.join(path, _LOCK_FILE), "wb") as handle:
+                try:
+                    fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    # Owned by a live process.
+                    continue
+                next_seq = self._adopt_slot(path, next_seq)
+
+    def _adopt_slot(self, path: str, next_seq: int) -> int:
+        seqs = _segments(path)
+        if not seqs:
+            return next_seq
+        read_seq, read_offset = _read_cursor(path)
+        if read_seq not in seqs:
+            read_seq, read_offset = seqs[0], 0
+        for seq in seqs:
+            source = _segment_path(path, seq)
+            if seq < read_seq:
+                os.remove(source)
+                continue
+            target = self._segment_path(next_seq)
+            if seq == read_seq and read_offset:
+                # Entries before the cursor were already sent.
+                with open(source, "rb") as src, open(target, "wb") as dst:
+                    src.seek(read_offset)
+                    dst.write(src.read())
+                mtime = os.path.getmtime(source)
+                os.utime(target, (mtime, mtime))
+                os.remove(source)
+            else:
+                os.replace(source, target)
+            next_seq += 1
+        try:
+            os.remove(os.path.join(path, _CURSOR_FILE))
+        except FileNotFoundError:
+            pass
+        return next_seq
+
+    def _segment_path(self, seq: int) -> str:
+        return _segment_path(self._dir, seq)
+
+    def _rotate(self) -> None:
+        if self._writer is not None:
+            os.close(self._writer)
+        if self._write_seq in self._sizes:
+            self._write_seq += 1
+        # Unbuffered appends: a forked child holds no pending writes to repeat.
+        self._writer = os.open(
+            self._segment_path(self._write_seq),
+            os.O_WRONLY | os.O_CREAT | os.O_APPEND | getattr(os, "O_BINARY", 0),
+            0o600,
+        )
+        self._sizes[self._write_seq] = 0
+        self._segments.append(self._write_seq)
+
+    def _read_entry(self, seq: int, offset: int) -> Optional[tuple[SpoolEntry, int]]:
+        if offset + _HEADER.size > self._sizes.get(seq, 0):
+            return None
+        with open(self._segment_path(seq), "rb") as f:
+            f.seek(offset)
+            header = f.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                return None
+            body_length, crc, path_length, type_length, encoding_length = _HEADER.unpack(header)
+            length = path_length + type_length + encoding_length + body_length
+            rest = f.read(length)
+        if len(rest) < length or zlib.crc32(rest) != crc:
+            return None
+        type_end = path_length + type_length
+        encoding_end = type_end + encoding_length
+        entry = SpoolEntry(
+            rest[:path_length].decode("utf-8"),
+            rest[encoding_end:],
+            rest[path_length:type_end].decode("ascii"),
+            rest[type_end:encoding_end].decode("ascii") or None,
+        )
+        return entry, _HEADER.size + length
+
+    def _enforce_size(self) -> None:
+        # Evict oldest first, but never the segment being written.
+        while sum(self._sizes.values()) > self._max_bytes and len(self._segments) > 1:
+            seq = self._segments[0]
+            self.evicted_bytes += self._sizes[seq]
+            self._remove(seq)
+
+    def _remove(self, seq: int) -> None:
+        if seq == self._write_seq and self._writer is not None:
+            os.close(self._writer)
+            self._writer = None
+        try:
+            os.remove(self._segment_path(seq))
+        except FileNotFoundError:
+            pass
+        self._segments.remove(seq)
+        del self._sizes[seq]
+        if seq == self._read_seq:
+            self._read_offset = 0
+            self._pending_size = 0
+            self._read_seq = self._segments[0] if self._segments else self._write_seq
+            self._save_cursor()
+
+    def _load_cursor(self) -> tuple[int, int]:
+        seq, offset = _read_cursor(self._dir)
+        if seq not in self._sizes:
+            return (self._segments[0] if self._segments else 0), 0
+        return seq, offset
+
+    def _save_cursor(self) -> None:
+        path = os.path.join(self._dir, _CURSOR_FILE)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(_CURSOR.pack(self._read_seq, self._read_offset))
+        os.replace(tmp, path)
+
+
+def _segment_path(directory: str, seq: int) -> str:
+    return os.path.join(directory, f"{seq:012d}{_SEGMENT_SUFFIX}")
+
+
+def _segments(directory: str) -> list[int]:
+    return sorted(
+        int(name[: -len(_SEGMENT_SUFFIX)])
+        for name in os.listdir(directory)
+        if name.endswith(_SEGMENT_SUFFIX)
+    )
+
+
+def _read_cursor(directory: str) -> tuple[int, int]:
+    """Return the persisted ``(segment, offset)``, or ``(-1, 0)`` if there is none."""
+    try:
+        with open(os.path.join(directory, _CURSOR_FILE), "rb") as f:
+            return _CURSOR.unpack(f.read(_CURSOR.size))
+    except (OSError, struct.error):
+        return -1, 0
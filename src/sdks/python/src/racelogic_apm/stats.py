@@ -0,0 +1,198 @@
+"""Self-telemetry counters describing the SDK's own export pipeline."""
+
+import threading
+from collections import deque
+from typing import Any, Optional
+
+from .sketch import ExponentialHistogram
+
+
+# Export latencies kept between two self-telemetry collections.
+MAX_PENDING_LATENCIES = 1024
+
+
+class ExportStats:
+    """Export outcomes and latency for one signal's processor."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.exported = 0
+        self.failed_exports = 0
+        self.requeued = 0
+        self.retries = 0
+        self.discarded = 0
+        self._latency = ExponentialHistogram(max_size=64)
+        self._pending_latencies: deque = deque(maxlen=MAX_PENDING_LATENCIES)
+
+    def record_export(self, records: int, duration_ms: float, succeeded: bool) -> None:
+        with self._lock:
+            if succeeded:
+                self.exported += records
+            else:
+                self.failed_exports += 1
+            self._latency.update(duration_ms)
+            self._pending_latencies.append(duration_ms)
+
+    def record_requeue(self, records: int) -> None:
+        with self._lock:
+            self.requeued += records
+
+    def record_retry(self) -> None:
+        with self._lock:
+            self.retries += 1
+
+    def record_discard(self, records: int) -> None:
+        with self._lock:
+            self.discarded += records
+
+    def drain_latencies(self) -> list[float]:
+        """Export latencies (ms) observed since the previous call."""
+        with self._lock:
+            latencies = list(self._pending_latencies)
+            self._pending_latencies.clear()
+        return latencies
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            latency = self._latency
+            return {
+                "exported": self.exported,
+                "failed_exports": self.failed_exports,
+                "requeued": self.requeued,
+                "retries": self.retries,
+                "discarded": self.discarded,
+                "export_latency_ms": {
+                    "count": latency.count,
+                    "mean": latency.sum / latency.count if latency.count else None,
+                    "p50": latency.quantile(0.5),
+                    "p99": latency.quantile(0.99),
+                    "max": latency.max if latency.count else None,
+                },
+            }
+
+
+class TransportStats:
+    """Request counters for the shared transport."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.bytes_sent = 0
+        self.http_errors = 0
+        self.connection_errors = 0
+        self.spooled = 0
+        self.rejected = 0
+        self.last_rejection: Optional[str] = None
+
+    def record_request(self, body_size: int, status_code: int) -> None:
+        with self._lock:
+            self.requests += 1
+            self.bytes_sent += body_size
+            if status_code >= 400:
+                self.http_errors += 1
+
+    def record_connection_error(self) -> None:
+        with self._lock:
+            self.connection_errors += 1
+
+    def record_spooled(self) -> None:
+        with self._lock:
+            self.spooled += 1
+
+    def record_rejected(self, records: int, message: str) -> None:
+        with self._lock:
+            self.rejected += records
+            if message:
+                self.last_rejection = message
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "bytes_sent": self.bytes_sent,
+                "http_errors": self.http_errors,
+                "connection_errors": self.connection_errors,
+                "spooled": self.spooled,
+                "rejected": self.rejected,
+                "last_rejection": self.last_rejection,
+            }
+
+
+# Cumulative processor counters reported as ``apm.sdk.*`` counter deltas.
+_SIGNAL_COUNTERS = (
+    ("enqueued", "apm.sdk.records.enqueued"),
+    ("exported", "apm.sdk.records.exported"),
+    ("dropped", "apm.sdk.records.dropped"),
+    ("requeued", "apm.sdk.records.requeued"),
+    ("failed_exports", "apm.sdk.exports.failed"),
+    ("retries", "apm.sdk.exports.retries"),
+    ("discarded", "apm.sdk.records.discarded"),
+    ("cardinality_rejected", "apm.sdk.metrics.cardinality_rejected"),
+    ("non_finite_dropped", "apm.sdk.metrics.non_finite_dropped"),
+)
+
+_TRANSPORT_COUNTERS = (
+    ("requests", "apm.sdk.http.requests"),
+    ("bytes_sent", "apm.sdk.http.bytes_sent"),
+    ("http_errors", "apm.sdk.http.errors"),
+    ("connection_errors", "apm.sdk.http.connection_errors"),
+    ("spooled", "apm.sdk.spool.writes"),
+    ("rejected", "apm.sdk.records.rejected"),
+    ("datagrams", "apm.sdk.agent.datagrams"),
+    ("dropped", "apm.sdk.agent.dropped"),
+)
+
+
+class DeltaCounters:
+    """
+    Reports cumulative counts as metric counters of their change per interval.
+
+    Each ``key`` remembers the value it was last reported at; ``baseline``
+    sets that value without emitting, so counting starts from now.
+    """
+
+    def __init__(self) -> None:
+        self._last: dict[Any, float] = {}
+
+    def baseline(self, key: Any, value: float) -> None:
+        self._last[key] = value
+
+    def emit(self, metrics: Any, name: str, key: Any, value: float, **attributes: Any) -> None:
+        last = self._last.get(key, 0)
+        if value < last:
+            # Counters restart from zero in a forked child.
+            last = 0
+        self._last[key] = value
+        if value > last:
+            metrics.counter(name, value - last, **attributes)
+
+
+class SelfTelemetry:
+    """
+    Metrics callback reporting the SDK's own pipeline as ``apm.sdk.*`` metrics.
+
+    Counters are emitted as deltas since the previous interval, queue depth
+    and high-water mark as gauges, and export latencies as the
+    ``apm.sdk.export.duration_ms`` histogram, all tagged with ``signal``.
+    """
+
+    def __init__(self, signals: dict[str, Any], transport: Any):
+        self._signals = signals
+        self._transport = transport
+        self._deltas = DeltaCounters()
+
+    def __call__(self, metrics: Any) -> None:
+        for signal, source in self._signals.items():
+            stats = source.stats()
+            for key, name in _SIGNAL_COUNTERS:
+                if key in stats:
+                    self._deltas.emit(metrics, name, (signal, key), stats[key], signal=signal)
+            metrics.gauge("apm.sdk.queue.size", stats["queue_size"], signal=signal)
+            metrics.gauge("apm.sdk.queue.high_water", stats["queue_high_water"], signal=signal)
+            for duration_ms in source._processor.export_stats.drain_latencies():
+                metrics.histogram("apm.sdk.export.duration_ms", duration_ms, signal=signal)
+
+        stats = self._transport.stats()
+        for key, name in _TRANSPORT_COUNTERS:
+            if key in stats:
+                self._deltas.emit(metrics, name, ("transport", key), stats[key])
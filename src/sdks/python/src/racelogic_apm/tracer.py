@@ -0,0 +1,303 @@
+"""APM Tracer implementation."""
+
+import functools
+import os
+import random
+import time
+import traceback
+from contextvars import ContextVar
+from typing import Any, Callable, Optional
+
+from .config import ApmConfig
+from .encoding import convert_attributes
+from .exporter import BaseProcessor, BatchProcessor
+from .sampling import ALWAYS_ON, ParentBasedSampler
+from .transport import Transport
+
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+SPAN_KIND_PRODUCER = 4
+SPAN_KIND_CONSUMER = 5
+
+STATUS_UNSET = 0
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+# Set on a failed span kept from an unsampled trace in place of its parent
+# link, since the parent span is not exported.
+UNSAMPLED_PARENT_ATTRIBUTE = "apm.unsampled_parent_span_id"
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar(
+    "racelogic_apm_current_span", default=None
+)
+
+# Private so application calls to random.seed() cannot repeat trace ids.
+_random = random.Random()
+if hasattr(os, "register_at_fork"):
+    # A forked child would otherwise generate the same ids as its siblings.
+    os.register_at_fork(after_in_child=_random.seed)
+
+
+def current_span() -> Optional["Span"]:
+    """Get the span active in the current thread or asyncio task."""
+    return _current_span.get()
+
+
+class Span:
+    """
+    A timed operation within a trace.
+
+    Spans are plain slotted objects holding raw ids, timestamps and
+    attributes; conversion to OTLP happens on the export thread. Use as a
+    context manager to make the span current for the enclosed block.
+
+    Unsampled spans still propagate context but are not exported unless
+    they fail and the sampler keeps errors; such a span is exported without
+    its parent link, and the parent id is kept in
+    ``apm.unsampled_parent_span_id``.
+    """
+
+    __slots__ = (
+        "_tracer", "_token", "name", "kind", "trace_id", "span_id", "parent_span_id",
+        "sampled", "start_time", "end_time", "attributes", "events",
+        "status_code", "status_message",
+    )
+
+    def __init__(
+        self,
+        tracer: "ApmTracer",
+        name: str,
+        kind: int,
+        trace_id: int,
+        parent_span_id: Optional[int],
+        sampled: bool,
+        attributes: Optional[dict[str, Any]],
+    ):
+        self._tracer = tracer
+        self._token = None
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = _random.getrandbits(64) or 1
+        self.parent_span_id = parent_span_id
+        self.sampled = sampled
+        self.start_time = time.time_ns()
+        self.end_time = 0
+        self.attributes = attributes if attributes is not None else {}
+        self.events: Optional[list] = None
+        self.status_code = STATUS_UNSET
+        self.status_message: Optional[str] = None
+
+    @property
+    def is_recording(self) -> bool:
+        return not self.end_time
+
+    @property
+    def trace_id_hex(self) -> str:
+        return f"{self.trace_id:032x}"
+
+    @property
+    def span_id_hex(self) -> str:
+        return f"{self.span_id:016x}"
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        """Set a single span attribute."""
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes: Any) -> None:
+        """Set several span attributes."""
+        self.attributes.update(attributes)
+
+    def add_event(self, name: str, **attributes: Any) -> None:
+        """Record a timestamped event on the span."""
+        if self.events is None:
+            self.events = []
+        self.events.append((time.time_ns(), name, attributes))
+
+    def set_status(self, code: int, message: Optional[str] = None) -> None:
+        """Set the span status (``STATUS_OK`` or ``STATUS_ERROR``)."""
+        self.status_code = code
+        self.status_message = message
+
+    def record_exception(self, exception: BaseException) -> None:
+        """Record an exception event and mark the span as failed."""
+        self.add_event(
+            "exception",
+            **{
+                "exception.type": type(exception).__name__,
+                "exception.message": str(exception),
+                "exception.stacktrace": "".join(
+                    traceback.format_exception(
+                        type(exception), exception, exception.__traceback__
+                    )
+                ),
+            },
+        )
+        self.set_status(STATUS_ERROR, str(exception))
+
+    def end(self) -> None:
+        """Finish the span and queue it for export. Later calls are ignored."""
+        if self.end_time:
+            return
+        self.end_time = time.time_ns()
+        self._tracer._on_end(self)
+
+    def __enter__(self) -> "Span":
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc is not None:
+            self.record_exception(exc)
+        _current_span.reset(self._token)
+        self._token = None
+        self.end()
+
+
+class ApmTracer:
+    """Tracer for sending spans to APM Collector."""
+
+    def __init__(self, config: ApmConfig, transport: Optional[Transport] = None):
+        self._config = config
+        self._owns_transport = transport is None
+        self._transport = transport or Transport(config)
+        # Child spans always follow their parent so traces are never split.
+        sampler = config.trace_sampler or ALWAYS_ON
+        if not isinstance(sampler, ParentBasedSampler):
+            sampler = ParentBasedSampler(sampler)
+        self._sampler = sampler
+        self._processor = self._create_processor()
+
+    def start_span(
+        self,
+        name: str,
+        kind: int = SPAN_KIND_INTERNAL,
+        attributes: Optional[dict[str, Any]] = None,
+        parent: Optional[Span] = None,
+    ) -> Span:
+        """
+        Start a span, parented to ``parent`` or else the current span.
+
+        The span becomes current only inside a ``with`` block; otherwise
+        call ``end()`` explicitly.
+        """
+        if parent is None:
+            parent = _current_span.get()
+        if parent is None:
+            trace_id = _random.getrandbits(128) or 1
+            sampled = self._sampler.should_sample(name, trace_id)
+            return Span(self, name, kind, trace_id, None, sampled, attributes)
+        sampled = self._sampler.should_sample(name, parent.trace_id, parent.sampled)
+        return Span(self, name, kind, parent.trace_id, parent.span_id, sampled, attributes)
+
+    @staticmethod
+    def current_span() -> Optional[Span]:
+        """Get the span active in the current thread or asyncio task."""
+        return _current_span.get()
+
+    @staticmethod
+    def wrap(func: Callable) -> Callable:
+        """
+        Bind ``func`` to the current span so it can run on another thread.
+
+        asyncio tasks inherit the current span automatically; threads and
+        executors do not, so wrap callables handed to them.
+        """
+        span = _current_span.get()
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            token = _current_span.set(span)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _current_span.reset(token)
+
+        return wrapper
+
+    def _on_end(self, span: Span) -> None:
+        if not span.sampled:
+            # Failures are offered to the sampler again, e.g. KeepErrorsSampler.
+            if span.status_code != STATUS_ERROR or not self._sampler.should_sample(
+                span.name, span.trace_id, None, True
+            ):
+                return
+            if span.parent_span_id is not None:
+                # Children follow their parent's decision, so the parent is
+                # unsampled too; a parentSpanId would point at nothing.
+                span.attributes[UNSAMPLED_PARENT_ATTRIBUTE] = f"{span.parent_span_id:016x}"
+                span.parent_span_id = None
+        self._processor.enqueue(span)
+
+    def _span_to_otlp(self, span: Span) -> dict:
+        record = {
+            "traceId": f"{span.trace_id:032x}",
+            "spanId": f"{span.span_id:016x}",
+            "name": span.name,
+            "kind": span.kind,
+            "startTimeUnixNano": span.start_time,
+            "endTimeUnixNano": span.end_time,
+        }
+        if span.parent_span_id is not None:
+            record["parentSpanId"] = f"{span.parent_span_id:016x}"
+        if span.attributes:
+            record["attributes"] = convert_attributes(span.attributes)
+        if span.events:
+            record["events"] = [
+                {
+                    "timeUnixNano": time_ns,
+                    "name": name,
+                    "attributes": convert_attributes(attributes),
+                }
+                for time_ns, name, attributes in span.events
+            ]
+        if span.status_code != STATUS_UNSET:
+            record["status"] = {"code": span.status_code}
+            if span.status_message:
+                record["status"]["message"] = span.status_message
+        return record
+
+    def _create_processor(self) -> BaseProcessor:
+        return BatchProcessor(self._config, self._export, "traces")
+
+    def _build_spans(self, spans: list[Span]) -> list[dict]:
+        return [self._span_to_otlp(span) for span in spans]
+
+    def _export(self, spans: list[Span]) -> None:
+        self._transport.send("/v1/traces", self._build_spans(spans))
+
+    @property
+    def dropped_count(self) -> int:
+        """Number of spans dropped because the export queue was full."""
+        return self._processor.dropped_count
+
+    def stats(self) -> dict[str, Any]:
+        """Queue depth, high-water mark and export counters for this signal."""
+        return self._processor.stats()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Export all finished spans.
+
+        Returns False if ``timeout`` seconds elapsed before the backlog drained.
+        """
+        return self._processor.flush(timeout)
+
+    def reinit_after_fork(self) -> None:
+        """
+        Restart the export pipeline in a forked child.
+
+        Spans finished in the parent are left to the parent to export.
+        """
+        self._processor = self._create_processor()
+        if self._owns_transport:
+            self._transport.reinit_after_fork()
+
+    def shutdown(self, timeout: Optional[float] = None) -> bool:
+        """Shutdown the tracer, draining finished spans within ``timeout`` seconds."""
+        drained = self._processor.shutdown(timeout)
+        if self._owns_transport:
+            self._transport.close()
+        return drained
@@ -0,0 +1,529 @@
+"""Shared HTTP transport for all APM signal exporters."""
+
+import asyncio
+import gzip
+import json
+import logging
+import os
+import threading
+import uuid
+from typing import Any, Generator, Optional
+
+import httpx
+
+from .config import ApmConfig
+from .encoding import ENVELOPE_KEYS, Envelope
+from .protobuf import decode_partial_success
+from .retry import (
+    RETRYABLE_STATUS_CODES, Backoff, CircuitBreaker, CircuitOpenError, ExportError,
+    parse_retry_after,
+)
+from .spool import DiskSpool
+from .stats import TransportStats
+
+
+COMPRESSIONS = ("gzip", "zstd")
+ENCODINGS = ("json", "protobuf")
+
+# Floor for the request size limit learned from 413 responses.
+MIN_BATCH_BYTES = 1024
+
+# Step yielded by the shared send logic for an HTTP POST.
+_POST = "post"
+
+# A collector or proxy without a zstd decoder answers 415, or 400 with one
+# of these phrases in the body; any other 400 is an ordinary rejection.
+_UNSUPPORTED_ENCODING_HINTS = (b"decompress", b"content-encoding", b"zstd")
+
+_log = logging.getLogger(__name__)
+
+
+class Transport:
+    """
+    One pooled HTTP client shared by the logs, metrics and trace pipelines.
+
+    Connection limits, keep-alive and HTTP/2 are configured once, headers and
+    the resource/scope envelope of each signal are built once, and request
+    bodies are encoded as OTLP/JSON or OTLP/protobuf and optionally
+    compressed with gzip or zstd.
+
+    Requests are kept within ``max_batch_bytes`` by splitting batches, and
+    records the collector rejects (413 for a single record, or counted in
+    ``partialSuccess``) are not retried.
+
+    Failures raise ``ExportError``: connection errors and 429/502/503/504
+    are retryable, other error statuses are permanent. A ``CircuitBreaker``
+    shared by all signals opens after repeated retryable failures; while it
+    is open, requests fail fast with ``CircuitOpenError`` instead of
+    reaching the collector.
+
+    When ``spool_dir`` is set, requests that fail retryably (or meet an
+    open circuit) are written to a ``DiskSpool`` instead of raising, and are
+    replayed in order after the next successful export, with the content
+    type and encoding they were written with.
+
+    If the collector cannot decode a zstd-compressed request (415, or 400
+    reporting a decompression failure), the transport logs a warning,
+    switches to gzip for good and resends it.
+    """
+
+    def __init__(self, config: ApmConfig):
+        self._config = config
+
+        if config.encoding not in ENCODINGS:
+            raise ValueError(
+                f"Unknown encoding {config.encoding!r}; expected one of {', '.join(ENCODINGS)}"
+            )
+        self._protobuf = config.encoding == "protobuf"
+
+        # Content-Type and Content-Encoding are sent per request: spooled
+        # requests keep the ones they were encoded with.
+        self._content_type = "application/x-protobuf" if self._protobuf else "application/json"
+        headers = {}
+        if config.api_key:
+            headers["X-API-Key"] = config.api_key
+        if config.application_id:
+            headers["X-Application-Id"] = config.application_id
+
+        # (Content-Encoding, compress) swapped as one, so a body is always
+        # labelled with the codec that compressed it.
+        self._codec = (config.compression, _compressor(config.compression))
+        self._max_batch_bytes = config.max_batch_bytes
+
+        self._client_options = {
+            "base_url": config.endpoint,
+            "headers": headers,
+            "timeout": config.export_timeout_ms / 1000,
+            "http2": config.http2,
+            "limits": httpx.Limits(
+                max_connections=config.max_connections,
+                max_keepalive_connections=config.max_keepalive_connections,
+                keepalive_expiry=config.keepalive_expiry_s,
+            ),
+        }
+        self._client = self._create_client(**self._client_options)
+
+        self.resource = build_resource(config)
+        self._envelopes = self._build_envelopes()
+        self._spool = _open_spool(config)
+        self._replay_lock = threading.Lock()
+        self._stats = TransportStats()
+        self._breaker = self._create_breaker()
+
+    def _create_client(self, **kwargs: Any) -> httpx.Client:
+        return httpx.Client(**kwargs)
+
+    def _create_breaker(self) -> CircuitBreaker:
+        return CircuitBreaker(
+            self._config.circuit_breaker_threshold,
+            Backoff(self._config.retry_delay_ms / 1000, self._config.max_retry_delay_ms / 1000),
+        )
+
+    def _build_envelopes(self) -> dict[str, Envelope]:
+        return {path: Envelope(path, self.resource, self._protobuf) for path in ENVELOPE_KEYS}
+
+    def encode(self, path: str, items: list[dict]) -> bytes:
+        """Wrap OTLP/JSON-shaped records for ``path`` in a request, then serialise and compress."""
+        body = self._envelopes[path].encode(items)
+        compress = self._codec[1]
+        return body if compress is None else compress(body)
+
+    def stats(self) -> dict[str, Any]:
+        """Request, byte and error counters and the circuit state for this transport."""
+        stats = self._stats.snapshot()
+        stats["circuit"] = self._breaker.state
+        return stats
+
+    def _post(
+        self, path: str, body: bytes, content_type: str, content_encoding: Optional[str]
+    ) -> httpx.Response:
+        try:
+            response = self._client.post(
+                path, content=body, headers=_content_headers(content_type, content_encoding)
+            )
+        except httpx.TransportError:
+            self._stats.record_connection_error()
+            raise
+        self._stats.record_request(len(body), response.status_code)
+        return response
+
+    def envelope(self, path: str, resource: dict) -> Envelope:
+        """Build an envelope for sending ``path`` records under another ``resource``."""
+        return Envelope(path, resource, self._protobuf)
+
+    def _split(
+        self, envelope: Envelope, items: list[dict], codec: Optional[tuple] = None
+    ) -> list[tuple[list[dict], bytes, int, Optional[str]]]:
+        """
+        Encode ``items`` as ``(items, body, encoded size, content encoding)``
+        requests, halving the batch until each part is within
+        ``max_batch_bytes`` before compression.
+        """
+        compression, compress = codec = codec or self._codec
+        body = envelope.encode(items)
+        size = len(body)
+        if size > self._max_batch_bytes and len(items) > 1:
+            middle = len(items) // 2
+            return (
+                self._split(envelope, items[:middle], codec)
+                + self._split(envelope, items[middle:], codec)
+            )
+        if compress is not None:
+            body = compress(body)
+        return [(items, body, size, compression)]
+
+    def _too_large(self, items: list[dict], size: int) -> bool:
+        # The collector's body limit is below ``max_batch_bytes``: remember a
+        # smaller limit for later batches and report whether this one can split.
+        self._max_batch_bytes = max(MIN_BATCH_BYTES, min(self._max_batch_bytes, size // 2))
+        if len(items) > 1:
+            return True
+        # A single record that can never be accepted is dropped.
+        self._stats.record_rejected(1, "request entity too large")
+        return False
+
+    def _check_partial_success(self, response: httpx.Response) -> None:
+        # Partially accepted requests must not be retried; count what was rejected.
+        if response.is_success:
+            rejected, message = _partial_success(response)
+            if rejected:
+                self._stats.record_rejected(rejected, message)
+
+    def send(
+        self, path: str, items: list[dict], envelope: Optional[Envelope] = None
+    ) -> Optional[httpx.Response]:
+        """
+        POST OTLP/JSON-shaped records to ``path`` (e.g. ``/v1/logs``), under
+        this transport's resource unless another ``envelope`` is given.
+
+        Batches larger than ``max_batch_bytes``, or refused by the collector
+        with 413, are split and sent as several requests; the last response
+        is returned. Returns None if the collector was unavailable and the
+        request was spooled. Raises ``ExportError`` otherwise.
+        """
+        return self._run(self._send_steps(path, items, envelope))
+
+    def _run(self, steps: Generator) -> Any:
+        """Drive ``steps`` to completion, performing each I/O step it yields."""
+        result: Any = None
+        error: Optional[BaseException] = None
+        while True:
+            try:
+                step = steps.send(result) if error is None else steps.throw(error)
+            except StopIteration as done:
+                return done.value
+            try:
+                result, error = self._perform(*step), None
+            except BaseException as e:
+                result, error = None, e
+
+    def _perform(self, operation: Any, *args: Any) -> Any:
+        if operation == _POST:
+            return self._post(*args)
+        return operation(*args)
+
+    # The send logic below is shared with AsyncTransport: it never does I/O
+    # itself but yields ``(operation, *args)`` steps, where operation is
+    # _POST or a blocking callable (encoding, spool access), and receives
+    # each step's result (or exception) back.
+
+    def _send_steps(
+        self, path: str, items: list[dict], envelope: Optional[Envelope]
+    ) -> Generator:
+        envelope = envelope or self._envelopes[path]
+        parts = yield (self._split, envelope, items)
+        response = None
+        for part, body, size, encoding in parts:
+            response = yield from self._send_part(path, envelope, part, body, size, encoding)
+        return response
+
+    def _send_part(
+        self,
+        path: str,
+        envelope: Envelope,
+        items: list[dict],
+        body: bytes,
+        size: int,
+        encoding: Optional[str],
+    ) -> Generator:
+        if not self._breaker.allow():
+            return (yield from self._unavailable(
+                path, body, encoding, CircuitOpenError(self._breaker.retry_after)
+            ))
+        try:
+            response = yield (_POST, path, body, self._content_type, encoding)
+        except httpx.TransportError as e:
+            self._breaker.record_failure()
+            return (yield from self._unavailable(
+                path, body, encoding, ExportError(repr(e), retryable=True)
+            ))
+        except BaseException:
+            # Any outcome must settle a half-open probe, or the circuit never closes.
+            self._breaker.record_failure()
+            raise
+        error = _classify(response)
+        if error is not None and error.retryable:
+            self._breaker.record_failure(error.retry_after)
+            return (yield from self._unavailable(path, body, encoding, error))
+        # Any other answer means the collector is up.
+        self._breaker.record_success()
+        if error is not None and encoding == "zstd" and _rejects_encoding(response):
+            self._fall_back_to_gzip(error.status_code)
+            return (yield from self._send_steps(path, items, envelope))
+        if response.status_code == 413 and self._too_large(items, size):
+            middle = len(items) // 2
+            yield from self._send_steps(path, items[:middle], envelope)
+            return (yield from self._send_steps(path, items[middle:], envelope))
+        if error is not None:
+            raise error
+        self._check_partial_success(response)
+        if self._spool is not None:
+            yield from self._replay_spool()
+        return response
+
+    def _unavailable(
+        self, path: str, body: bytes, encoding: Optional[str], error: ExportError
+    ) -> Generator:
+        # Without a spool the caller retries; with one the request waits on disk.
+        if self._spool is None:
+            raise error
+        yield (self._spool.append, path, body, self._content_type, encoding)
+        self._stats.record_spooled()
+        return None
+
+    def _replay_spool(self) -> Generator:
+        # One replay at a time keeps spooled requests in order.
+        if not self._replay_lock.acquire(blocking=False):
+            return
+        try:
+            yield (self._spool.evict_expired,)
+            while True:
+                entry = yield (self._spool.peek,)
+                if entry is None:
+                    return
+                path, body, content_type, encoding = entry
+                if encoding == "zstd" and self._codec[0] != "zstd":
+                    # Spooled before falling back to gzip.
+                    body = yield (_zstd_to_gzip, body)
+                    encoding = "gzip"
+                try:
+                    response = yield (_POST, path, body, content_type, encoding)
+                except httpx.TransportError:
+                    self._breaker.record_failure()
+                    return
+                if not self._replayed(response):
+                    return
+                yield (self._spool.pop,)
+        finally:
+            self._replay_lock.release()
+
+    def _fall_back_to_gzip(self, status: int) -> None:
+        if self._codec[0] == "gzip":
+            return
+        _log.warning(
+            "Collector at %s rejected a zstd-compressed request with HTTP %d; "
+            "falling back to gzip. Enable zstd request decompression on the collector "
+            "or set compression='gzip'.",
+            self._config.endpoint,
+            status,
+        )
+        self._codec = ("gzip", _compressor("gzip"))
+
+    def _replayed(self, response: httpx.Response) -> bool:
+        # Keep a spooled request only while the collector is unavailable;
+        # a permanent rejection would never succeed, so it is dropped too.
+        error = _classify(response)
+        if error is not None and error.retryable:
+            self._breaker.record_failure(error.retry_after)
+            return False
+        return True
+
+    def close(self) -> None:
+        self._client.close()
+        if self._spool is not None:
+            self._spool.close()
+
+    def reinit_after_fork(self) -> None:
+        """
+        Give a forked child its own connection pool and resource block.
+
+        Pooled sockets are shared with the parent after ``fork()``, so the
+        inherited client is abandoned rather than closed.
+        """
+        self._client = self._create_client(**self._client_options)
+        self.resource = build_resource(self._config)
+        self._envelopes = self._build_envelopes()
+        if self._spool is not None:
+            # Closing only drops this process's handles; the parent keeps its
+            # slot and the child claims a free one.
+            self._spool.close()
+            self._spool = _open_spool(self._config)
+        self._replay_lock = threading.Lock()
+        self._stats = TransportStats()
+        self._breaker = self._create_breaker()
+
+
+class AsyncTransport(Transport):
+    """Transport variant built on ``httpx.AsyncClient`` for asyncio pipelines."""
+
+    def _create_client(self, **kwargs: Any) -> httpx.AsyncClient:
+        return httpx.AsyncClient(**kwargs)
+
+    async def _post(
+        self, path: str, body: bytes, content_type: str, content_encoding: Optional[str]
+    ) -> httpx.Response:
+        try:
+            response = await self._client.post(
+                path, content=body, headers=_content_headers(content_type, content_encoding)
+            )
+        except httpx.TransportError:
+            self._stats.record_connection_error()
+            raise
+        self._stats.record_request(len(body), response.status_code)
+        return response
+
+    async def send(
+        self, path: str, items: list[dict], envelope: Optional[Envelope] = None
+    ) -> Optional[httpx.Response]:
+        """
+        POST OTLP/JSON-shaped records to ``path`` (e.g. ``/v1/logs``).
+
+        Batches are split and failures raised as in ``Transport.send``.
+        Returns None if the collector was unavailable and the request was spooled.
+        """
+        return await self._run(self._send_steps(path, items, envelope))
+
+    async def _run(self, steps: Generator) -> Any:
+        result: Any = None
+        error: Optional[BaseException] = None
+        while True:
+            try:
+                step = steps.send(result) if error is None else steps.throw(error)
+            except StopIteration as done:
+                return done.value
+            try:
+                result, error = await self._perform(*step), None
+            except BaseException as e:
+                result, error = None, e
+
+    async def _perform(self, operation: Any, *args: Any) -> Any:
+        if operation == _POST:
+            return await self._post(*args)
+        # Encoding, compression and disk I/O run off the event loop.
+        return await asyncio.to_thread(operation, *args)
+
+    async def close(self) -> None:
+        await self._client.aclose()
+        if self._spool is not None:
+            self._spool.close()
+
+
+def build_resource(config: ApmConfig) -> dict:
+    """
+    Build the OTLP resource block describing this service instance.
+
+    ``service.instance.id`` and ``process.pid`` are per process, so each
+    pre-fork worker reports as its own instance.
+    """
+    attributes = {
+        "service.name": config.application_name,
+        "service.version": config.service_version or "1.0.0",
+        "service.instance.id": uuid.uuid4().hex,
+        "deployment.environment": config.environment,
+        "process.pid": os.getpid(),
+    }
+    attributes.update(config.resource_attributes)
+    return {
+        "attributes": [
+            {"key": key, "value": {"stringValue": str(value)}}
+            for key, value in attributes.items()
+            if value is not None
+        ]
+    }
+
+
+def _classify(response: httpx.Response) -> Optional[ExportError]:
+    """Turn an error status into an ``ExportError``; None for success and 413."""
+    status = response.status_code
+    if status < 400 or status == 413:
+        return None
+    if status in RETRYABLE_STATUS_CODES:
+        return ExportError(
+            f"collector returned HTTP {status}",
+            retryable=True,
+            retry_after=parse_retry_after(response.headers.get("retry-after")),
+            status_code=status,
+        )
+    return ExportError(f"collector returned HTTP {status}", retryable=False, status_code=status)
+
+
+def _content_headers(content_type: str, content_encoding: Optional[str]) -> dict[str, str]:
+    headers = {"Content-Type": content_type}
+    if content_encoding:
+        headers["Content-Encoding"] = content_encoding
+    return headers
+
+
+def _rejects_encoding(response: httpx.Response) -> bool:
+    """Whether an error response says the request's compression is not supported."""
+    if response.status_code == 415:
+        return True
+    if response.status_code != 400:
+        return False
+    body = response.content.lower()
+    return any(hint in body for hint in _UNSUPPORTED_ENCODING_HINTS)
+
+
+def _partial_success(response: httpx.Response) -> tuple[int, str]:
+    """Read ``(rejected count, error message)`` from an export response body."""
+    body = response.content
+    try:
+        if response.headers.get("content-type", "").startswith("application/x-protobuf"):
+            return decode_partial_success(body)
+        # An empty partialSuccess, the common case, needs no parsing.
+        if b"rejected" not in body:
+            return 0, ""
+        partial = json.loads(body).get("partialSuccess") or {}
+    except (ValueError, IndexError, AttributeError):
+        return 0, ""
+    rejected = next(
+        (value for key, value in partial.items() if key.startswith("rejected")), 0
+    )
+    return int(rejected), partial.get("errorMessage", "")
+
+
+def _open_spool(config: ApmConfig) -> Optional[DiskSpool]:
+    if config.spool_dir is None:
+        return None
+    return DiskSpool(
+        config.spool_dir,
+        max_bytes=config.spool_max_bytes,
+        max_age_s=config.spool_max_age_s,
+        segment_bytes=config.spool_segment_bytes,
+    )
+
+
+def _compressor(compression):
+    if compression is None:
+        return None
+    if compression == "gzip":
+        # Level 6 trades a little ratio for much lower CPU than level 9.
+        return lambda body: gzip.compress(body, compresslevel=6)
+    if compression == "zstd":
+        try:
+            import zstandard
+        except ImportError as e:
+            raise ImportError(
+                "compression='zstd' requires the 'zstandard' package; "
+                "install racelogic-apm[zstd]"
+            ) from e
+        return zstandard.ZstdCompressor(level=3).compress
+    raise ValueError(
+        f"Unknown compression {compression!r}; expected one of {', '.join(COMPRESSIONS)} or None"
+    )
+
+
+def _zstd_to_gzip(body: bytes) -> bytes:
+    import zstandard
+
+    return _compressor("gzip")(zstandard.ZstdDecompressor().decompress(body))
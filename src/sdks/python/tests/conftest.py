@@ -0,0 +1,53 @@
+import httpx
+import pytest
+
+from racelogic_apm.transport import AsyncTransport, Transport
+
+
+class MockTransport(Transport):
+    """Transport whose requests are answered by ``handler(request)``."""
+
+    def __init__(self, config, handler):
+        self._handler = handler
+        super().__init__(config)
+
+    def _create_client(self, **kwargs) -> httpx.Client:
+        return httpx.Client(transport=httpx.MockTransport(self._handler), **kwargs)
+
+
+class AsyncMockTransport(AsyncTransport):
+    """AsyncTransport whose requests are answered by ``handler(request)``."""
+
+    def __init__(self, config, handler):
+        self._handler = handler
+        super().__init__(config)
+
+    def _create_client(self, **kwargs) -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=httpx.MockTransport(self._handler), **kwargs)
+
+
+@pytest.fixture
+def mock_transport():
+    """Build ``MockTransport(config, handler)`` instances closed after the test."""
+    transports = []
+
+    def make(config, handler) -> MockTransport:
+        transport = MockTransport(config, handler)
+        transports.append(transport)
+        return transport
+
+    yield make
+    for transport in transports:
+        transport.close()
+
+
+@pytest.fixture
+def async_mock_transport():
+    """Build ``AsyncMockTransport(config, handler)``; close it inside the test's loop."""
+    return AsyncMockTransport
+
+
+@pytest.fixture(params=[MockTransport, AsyncMockTransport], ids=["sync", "async"])
+def mock_transport_class(request):
+    """Run the test once against each transport."""
+    return request.param
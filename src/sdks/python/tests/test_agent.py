@@ -0,0 +1,247 @@
+import json
+import os
+import threading
+import time
+
+import httpx
+import pytest
+
+from racelogic_apm import agent as agent_module
+from racelogic_apm.agent import MAX_SENDER_GROUPS, AgentTransport, LocalAgent
+from racelogic_apm.client import ApmClient
+from racelogic_apm.config import ApmConfig
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork"), reason="needs Unix datagram sockets")
+
+
+class _Collector:
+    """Records each request's path, application id and decoded body."""
+
+    def __init__(self):
+        self.requests = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(
+            (request.url.path, request.headers.get("X-Application-Id"), json.loads(request.content))
+        )
+        return httpx.Response(200)
+
+    def logs(self) -> list[tuple]:
+        """(application id, service.name, body, attributes) per exported log record."""
+        logs = []
+        for path, application_id, body in self.requests:
+            if path != "/v1/logs":
+                continue
+            for resource_logs in body["resourceLogs"]:
+                resource = _attributes(resource_logs["resource"])
+                for record in resource_logs["scopeLogs"][0]["logRecords"]:
+                    logs.append(
+                        (
+                            application_id,
+                            resource["service.name"],
+                            record["body"]["stringValue"],
+                            _attributes(record),
+                        )
+                    )
+        return logs
+
+
+def _attributes(item: dict) -> dict:
+    return {a["key"]: next(iter(a["value"].values())) for a in item["attributes"]}
+
+
+def _wait_for(condition, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def collector(monkeypatch, mock_transport):
+    collector = _Collector()
+    monkeypatch.setattr(agent_module, "Transport", lambda config: mock_transport(config, collector))
+    return collector
+
+
+@pytest.fixture
+def make_agent(tmp_path, collector):
+    agents = []
+
+    def make(**overrides):
+        options = dict(
+            endpoint="http://collector.test",
+            application_name="agent",
+            application_id="agent-app",
+            compression=None,
+            flush_interval_ms=60000,
+        )
+        options.update(overrides)
+        agent = LocalAgent(ApmConfig(**options), f"unix://{tmp_path}/agent.sock")
+        agents.append(agent)
+        return agent
+
+    yield make
+    for agent in agents:
+        agent.shutdown(1)
+
+
+@pytest.fixture
+def serving_agent(make_agent):
+    agent = make_agent()
+    thread = threading.Thread(target=agent.serve_forever, daemon=True)
+    thread.start()
+    yield agent, thread
+    agent.stop()
+    thread.join(5)
+
+
+def _handle_received(serving, datagrams: int) -> LocalAgent:
+    """Wait for ``datagrams`` to arrive, then stop serving once they are handled."""
+    agent, thread = serving
+    _wait_for(lambda: agent.received >= datagrams)
+    agent.stop()
+    thread.join(5)
+    return agent
+
+
+def _sender_config(agent: LocalAgent, **overrides) -> ApmConfig:
+    options = dict(
+        endpoint="http://unused.test",
+        application_name="checkout",
+        agent_address=agent._listen,
+        # Only explicit flushes send datagrams.
+        agent_flush_interval_ms=60000,
+    )
+    options.update(overrides)
+    return ApmConfig(**options)
+
+
+def _datagram(service: str, application_id=None, entries=()) -> bytes:
+    resource = [{"key": "service.name", "value": {"stringValue": service}}]
+    return json.dumps([1234, application_id, resource, list(entries)]).encode()
+
+
+def test_records_round_trip_under_the_senders_application_id(serving_agent, collector):
+    client = ApmClient(
+        endpoint="http://unused.test",
+        application_name="checkout",
+        application_id="checkout-app",
+        agent_address=serving_agent[0]._listen,
+        agent_flush_interval_ms=60000,
+    )
+    try:
+        client.logger.info("order placed", order_id=7)
+        client.metrics.counter("orders", 2)
+        with client.tracer.start_span("place_order"):
+            pass
+        assert client.flush(5)
+    finally:
+        client.shutdown(1)
+    assert _handle_received(serving_agent, 1).shutdown(5)
+
+    assert collector.logs() == [
+        ("checkout-app", "checkout", "order placed", {"order_id": 7, "process.pid": os.getpid()})
+    ]
+    exported = {path: (application_id, body) for path, application_id, body in collector.requests}
+    application_id, metrics = exported["/v1/metrics"]
+    assert application_id == "checkout-app"
+    (metric,) = metrics["resourceMetrics"][0]["scopeMetrics"][0]["metrics"]
+    assert metric["name"] == "orders"
+    assert metric["sum"]["dataPoints"][0]["asDouble"] == 2
+    assert exported["/v1/traces"][0] == "checkout-app"
+
+
+def test_senders_without_an_application_id_use_the_agents(make_agent, collector):
+    agent = make_agent()
+    agent.handle(_datagram("a", entries=[["logs", {"body": {"stringValue": "x"}}]]))
+    agent.handle(_datagram("a", "other-app", [["logs", {"body": {"stringValue": "y"}}]]))
+    assert agent.shutdown(5)
+
+    assert sorted((app, body) for app, _, body, _ in collector.logs()) == [
+        ("agent-app", "x"),
+        ("other-app", "y"),
+    ]
+
+
+def test_records_are_converted_on_the_sender_thread(serving_agent):
+    transport = AgentTransport(_sender_config(serving_agent[0]))
+    try:
+        converted = []
+        transport.defer(lambda record: converted.append(threading.current_thread()), "record")
+        transport.send_metric("counter", "orders", 1, {})
+
+        assert converted == [] and transport.stats()["queue_size"] == 2
+        worker = threading.Thread(target=transport.flush)
+        worker.start()
+        worker.join()
+        assert converted == [worker]
+        assert transport.stats()["datagrams"] == 1
+    finally:
+        transport.close()
+
+
+def test_bad_datagrams_are_counted_and_skipped(make_agent, collector):
+    agent = make_agent()
+    agent.handle(b"not json")
+    agent.handle(b"[1, 2]")
+    agent.handle(_datagram("a", application_id=5))
+    agent.handle(
+        _datagram(
+            "a",
+            entries=[
+                ["unknown", {}],
+                ["metric", ["counter", "orders"]],
+                "not an entry",
+                ["logs", {"body": {"stringValue": "kept"}}],
+            ],
+        )
+    )
+    assert agent.shutdown(5)
+
+    assert agent.received == 4
+    assert agent.malformed == 6
+    assert [body for _, _, body, _ in collector.logs()] == ["kept"]
+
+
+def test_sender_groups_are_capped_and_share_export_threads(make_agent, collector):
+    agent = make_agent(max_concurrent_exports=2)
+    for i in range(MAX_SENDER_GROUPS + 3):
+        agent.handle(_datagram(f"service-{i}", entries=[["logs", {"body": {"stringValue": str(i)}}]]))
+
+    assert len(agent._groups) == MAX_SENDER_GROUPS
+    export_threads = [t for t in threading.enumerate() if t.name.startswith("apm-agent-export")]
+    assert len(export_threads) == 2
+    assert agent.shutdown(5)
+
+    services = {service for _, service, _, _ in collector.logs()}
+    # The last three are exported under the agent's own resource.
+    assert services == {f"service-{i}" for i in range(MAX_SENDER_GROUPS)} | {"agent"}
+    assert len(collector.logs()) == MAX_SENDER_GROUPS + 3
+
+
+@pytest.mark.filterwarnings("ignore::DeprecationWarning")
+def test_forked_child_reopens_the_socket(serving_agent, collector):
+    transport = AgentTransport(_sender_config(serving_agent[0]))
+    parent_socket = transport._socket
+    try:
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                if transport._socket is not parent_socket and transport._pid == os.getpid():
+                    transport.send("/v1/logs", [{"body": {"stringValue": "from the child"}}])
+                    transport.flush()
+                    code = 0
+            finally:
+                os._exit(code)
+        _, status = os.waitpid(pid, 0)
+        assert os.waitstatus_to_exitcode(status) == 0
+    finally:
+        transport.close()
+    assert _handle_received(serving_agent, 1).shutdown(5)
+
+    assert transport._socket is parent_socket
+    ((_, _, body, attributes),) = collector.logs()
+    assert body == "from the child"
+    assert attributes["process.pid"] == pid
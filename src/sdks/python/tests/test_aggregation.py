@@ -0,0 +1,216 @@
+import math
+
+import pytest
+
+from racelogic_apm.aggregation import (
+    AGGREGATION_TEMPORALITY_DELTA, OVERFLOW_ATTRIBUTES, MetricAggregator, series_key,
+)
+from racelogic_apm.config import ApmConfig
+from racelogic_apm.encoding import convert_attributes
+from racelogic_apm.metrics import ApmMetrics
+
+
+def _config(**overrides) -> ApmConfig:
+    options = dict(endpoint="http://collector.test", application_name="aggregation-tests")
+    options.update(overrides)
+    return ApmConfig(**options)
+
+
+def _aggregator(**overrides) -> MetricAggregator:
+    return MetricAggregator(_config(**overrides), lambda attributes: dict(attributes))
+
+
+def _points(aggregator: MetricAggregator) -> dict:
+    return {
+        (point.name, tuple(sorted(point.data_point["attributes"].items()))): point
+        for point in aggregator.collect()
+    }
+
+
+# MetricAggregator
+
+
+def test_counters_sum_per_series():
+    aggregator = _aggregator()
+    for _ in range(3):
+        aggregator.record("counter", "requests", 1, {"route": "/a"})
+    aggregator.record("counter", "requests", 5, {"route": "/b"})
+
+    points = _points(aggregator)
+    assert points[("requests", (("route", "/a"),))].data_point["asDouble"] == 3
+    assert points[("requests", (("route", "/b"),))].data_point["asDouble"] == 5
+    assert {point.kind for point in points.values()} == {"sum"}
+
+
+def test_attribute_order_does_not_split_a_series():
+    aggregator = _aggregator()
+    aggregator.record("counter", "requests", 1, {"route": "/a", "method": "GET"})
+    aggregator.record("counter", "requests", 1, {"method": "GET", "route": "/a"})
+
+    assert [point.data_point["asDouble"] for point in aggregator.collect()] == [2]
+
+
+def test_gauge_keeps_the_last_value():
+    aggregator = _aggregator()
+    for value in (3.0, 7.0, 5.0):
+        aggregator.record("gauge", "queue_depth", value, {})
+
+    (point,) = aggregator.collect()
+    assert point.kind == "gauge"
+    assert point.data_point["asDouble"] == 5.0
+
+
+def test_explicit_histogram_buckets_are_upper_inclusive():
+    aggregator = _aggregator(histogram_aggregation="explicit", histogram_boundaries=[10, 5])
+    for value in (1, 5, 6, 10, 11):
+        aggregator.record("histogram", "latency_ms", value, {})
+
+    (point,) = aggregator.collect()
+    assert point.kind == "histogram"
+    data = point.data_point
+    assert data["explicitBounds"] == [5.0, 10.0]
+    assert data["bucketCounts"] == [2, 2, 1]
+    assert (data["count"], data["sum"], data["min"], data["max"]) == (5, 33, 1, 11)
+
+
+def test_exponential_histogram_is_the_default():
+    aggregator = _aggregator()
+    aggregator.record("histogram", "latency_ms", 12.5, {})
+
+    (point,) = aggregator.collect()
+    assert point.kind == "exponentialHistogram"
+    assert point.data_point["count"] == 1
+
+
+def test_unknown_histogram_aggregation_is_rejected():
+    with pytest.raises(ValueError):
+        _aggregator(histogram_aggregation="summary")
+
+
+def test_collect_resets_series_for_delta_temporality():
+    aggregator = _aggregator()
+    aggregator.record("counter", "requests", 2, {})
+    (first,) = aggregator.collect()
+    assert aggregator.collect() == []
+
+    aggregator.record("counter", "requests", 3, {})
+    (second,) = aggregator.collect()
+
+    # Each point covers only its own interval, and intervals are contiguous.
+    assert second.data_point["asDouble"] == 3
+    assert second.data_point["startTimeUnixNano"] >= first.data_point["timeUnixNano"]
+    assert first.data_point["startTimeUnixNano"] <= first.data_point["timeUnixNano"]
+
+
+def test_bound_series_key_matches_record():
+    aggregator = _aggregator()
+    aggregator.record("counter", "requests", 1, {"route": "/a"})
+    aggregator.record_series(series_key("counter", "requests", {"route": "/a"}), {"route": "/a"}, 1)
+
+    assert [point.data_point["asDouble"] for point in aggregator.collect()] == [2]
+
+
+def test_unhashable_attribute_values_still_aggregate():
+    aggregator = _aggregator()
+    aggregator.record("counter", "requests", 1, {"tags": ["a", "b"]})
+    aggregator.record("counter", "requests", 1, {"tags": ["a", "b"]})
+
+    assert [point.data_point["asDouble"] for point in aggregator.collect()] == [2]
+
+
+@pytest.mark.parametrize("value", [math.nan, math.inf, -math.inf])
+def test_non_finite_values_are_dropped(value):
+    aggregator = _aggregator()
+    aggregator.record("histogram", "latency_ms", value, {})
+    aggregator.record("histogram", "latency_ms", 1.0, {})
+
+    (point,) = aggregator.collect()
+    assert point.data_point["count"] == 1
+    assert aggregator.non_finite_dropped == 1
+
+
+def test_series_over_the_cardinality_limit_fold_into_overflow():
+    aggregator = _aggregator(metric_cardinality_limit=2)
+    for user in ("a", "b", "c", "d", "c"):
+        aggregator.record("counter", "logins", 1, {"user": user})
+
+    points = _points(aggregator)
+    overflow = points[("logins", tuple(OVERFLOW_ATTRIBUTES.items()))]
+    assert overflow.data_point["asDouble"] == 3
+    assert len(points) == 3
+    # Distinct attribute sets are counted once.
+    assert aggregator.cardinality_rejected == 2
+
+
+# ApmMetrics
+
+
+class _Transport:
+    def __init__(self):
+        self.requests = []
+
+    def send(self, path, items):
+        self.requests.append((path, items))
+
+    def close(self):
+        pass
+
+
+def test_metrics_export_delta_points_grouped_by_metric():
+    transport = _Transport()
+    metrics = ApmMetrics(_config(flush_interval_ms=60000), transport)
+    metrics.counter("requests", 1, route="/a")
+    metrics.counter("requests", 2, route="/b")
+    metrics.gauge("queue_depth", 4)
+    metrics.histogram("latency_ms", 12.5)
+
+    assert metrics.flush(5)
+    (path, exported), = transport.requests
+    assert path == "/v1/metrics"
+    by_name = {metric["name"]: metric for metric in exported}
+
+    requests = by_name["requests"]["sum"]
+    assert requests["aggregationTemporality"] == AGGREGATION_TEMPORALITY_DELTA
+    assert requests["isMonotonic"] is True
+    assert sorted(p["asDouble"] for p in requests["dataPoints"]) == [1, 2]
+    assert convert_attributes({"route": "/a"}) in [p["attributes"] for p in requests["dataPoints"]]
+    assert "aggregationTemporality" not in by_name["queue_depth"]["gauge"]
+    histogram = by_name["latency_ms"]["exponentialHistogram"]
+    assert histogram["aggregationTemporality"] == AGGREGATION_TEMPORALITY_DELTA
+
+    # The next interval starts from zero.
+    metrics.counter("requests", 1, route="/a")
+    assert metrics.flush(5)
+    (_, exported) = transport.requests[-1]
+    assert [p["asDouble"] for p in exported[0]["sum"]["dataPoints"]] == [1]
+    metrics.shutdown(1)
+
+
+def test_callbacks_run_before_each_interval_is_collected():
+    transport = _Transport()
+    metrics = ApmMetrics(_config(flush_interval_ms=60000), transport)
+    metrics.register_callback(lambda m: m.gauge("observed", 1))
+    metrics.register_callback(lambda m: 1 / 0)
+
+    assert metrics.flush(5)
+    (_, exported), = transport.requests
+    assert [metric["name"] for metric in exported] == ["observed"]
+    metrics.shutdown(1)
+
+
+def test_an_interval_larger_than_the_record_queue_is_exported_in_full():
+    transport = _Transport()
+    metrics = ApmMetrics(
+        _config(flush_interval_ms=60000, max_queue_size=16, batch_size=8), transport
+    )
+    for i in range(100):
+        metrics.counter("requests", 1, customer=str(i))
+
+    assert metrics.flush(5)
+    points = [
+        point for _, exported in transport.requests for point in exported[0]["sum"]["dataPoints"]
+    ]
+    assert len(points) == 100
+    assert len(transport.requests) == 13
+    assert metrics.dropped_count == 0
+    metrics.shutdown(1)
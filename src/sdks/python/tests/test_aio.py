@@ -0,0 +1,79 @@
+import asyncio
+import threading
+
+import pytest
+
+from racelogic_apm.aio import AsyncBatchProcessor
+from racelogic_apm.config import ApmConfig
+
+
+def _processor(exported: list) -> AsyncBatchProcessor:
+    async def export(records):
+        exported.extend(records)
+
+    config = ApmConfig(
+        endpoint="http://collector.test",
+        application_name="aio-tests",
+        batch_size=1,
+        flush_interval_ms=60000,
+    )
+    return AsyncBatchProcessor(config, export, "test")
+
+
+def _from_another_thread(fn, *args) -> list:
+    errors = []
+
+    def call():
+        try:
+            fn(*args)
+        except BaseException as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=call)
+    thread.start()
+    thread.join()
+    return errors
+
+
+@pytest.mark.asyncio
+async def test_records_from_other_threads_wake_the_export_task():
+    exported = []
+    processor = _processor(exported)
+    processor.start()
+
+    assert _from_another_thread(processor.enqueue, "a") == []
+    assert await processor.flush(5)
+    assert exported == ["a"]
+    assert await processor.shutdown(1)
+
+
+def test_enqueue_after_the_loop_closed_does_not_raise():
+    exported = []
+    processor = _processor(exported)
+    loop = asyncio.new_event_loop()
+
+    async def start():
+        processor.start()
+
+    loop.run_until_complete(start())
+    loop.run_until_complete(processor.shutdown(1))
+    loop.close()
+
+    assert _from_another_thread(processor.enqueue, "late") == []
+
+
+def test_enqueue_while_the_loop_is_closed_does_not_raise():
+    exported = []
+    processor = _processor(exported)
+    loop = asyncio.new_event_loop()
+
+    async def start():
+        processor.start()
+
+    loop.run_until_complete(start())
+    # The application tore the loop down without shutting the client down.
+    processor._worker.cancel()
+    loop.run_until_complete(asyncio.gather(processor._worker, return_exceptions=True))
+    loop.close()
+
+    assert _from_another_thread(processor.enqueue, "late") == []
@@ -0,0 +1,100 @@
+import enum
+import json
+
+import pytest
+
+from racelogic_apm import encoding
+from racelogic_apm.encoding import ENVELOPE_KEYS, SCOPE, Envelope, convert_attributes, dumps
+
+
+class _Color(enum.Enum):
+    RED = "red"
+
+
+class _Code(str, enum.Enum):
+    OK = "ok"
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    encoding._attribute_cache.clear()
+    yield
+    encoding._attribute_cache.clear()
+
+
+def test_converts_each_value_type():
+    assert convert_attributes(
+        {"s": "x", "b": True, "i": 3, "f": 0.5, "code": _Code.OK, "color": _Color.RED, "none": None}
+    ) == [
+        {"key": "s", "value": {"stringValue": "x"}},
+        {"key": "b", "value": {"boolValue": True}},
+        {"key": "i", "value": {"intValue": 3}},
+        {"key": "f", "value": {"doubleValue": 0.5}},
+        {"key": "code", "value": {"stringValue": "ok"}},
+        {"key": "color", "value": {"stringValue": "_Color.RED"}},
+    ]
+    assert convert_attributes({}) == []
+
+
+def test_recurring_attribute_sets_are_converted_once():
+    first = convert_attributes({"route": "/a", "status": 200})
+    second = convert_attributes({"route": "/a", "status": 200})
+
+    assert second is first
+    assert convert_attributes({"route": "/b", "status": 200}) is not first
+
+
+def test_equal_values_of_different_types_are_cached_apart():
+    # True == 1 == 1.0, but each converts to its own OTLP type.
+    assert convert_attributes({"v": True}) == [{"key": "v", "value": {"boolValue": True}}]
+    assert convert_attributes({"v": 1}) == [{"key": "v", "value": {"intValue": 1}}]
+    assert convert_attributes({"v": 1.0}) == [{"key": "v", "value": {"doubleValue": 1.0}}]
+
+
+def test_unhashable_values_are_converted_without_caching():
+    converted = convert_attributes({"tags": ["a", "b"]})
+
+    assert converted == [{"key": "tags", "value": {"stringValue": "['a', 'b']"}}]
+    assert encoding._attribute_cache == {}
+
+
+def test_cache_is_reset_when_full(monkeypatch):
+    monkeypatch.setattr(encoding, "MAX_CACHED_ATTRIBUTE_SETS", 3)
+    for i in range(3):
+        convert_attributes({"i": i})
+    assert len(encoding._attribute_cache) == 3
+
+    convert_attributes({"i": 3})
+    assert len(encoding._attribute_cache) == 1
+
+
+def test_dumps_is_compact_json():
+    body = dumps({"a": [1, "é"], "b": None})
+    assert json.loads(body) == {"a": [1, "é"], "b": None}
+    assert b" " not in body
+    # Beyond 64 bits, orjson (if installed) defers to the stdlib encoder.
+    assert json.loads(dumps({"big": 2**70})) == {"big": 2**70}
+
+
+@pytest.mark.parametrize("path", sorted(ENVELOPE_KEYS))
+def test_envelope_matches_a_fully_serialised_request(path):
+    resource = {"attributes": convert_attributes({"service.name": "checkout"})}
+    resource_key, scope_key, items_key = ENVELOPE_KEYS[path]
+    items = [{"name": "a", "n": 1}, {"name": "b", "nested": {"x": [1, 2]}}]
+    envelope = Envelope(path, resource, protobuf=False)
+
+    for batch in (items, items[:1], []):
+        expected = {
+            resource_key: [{"resource": resource, scope_key: [{"scope": SCOPE, items_key: batch}]}]
+        }
+        assert json.loads(envelope.encode(batch)) == expected
+        assert envelope.encode(batch) == dumps(expected)
+
+
+def test_protobuf_envelope_uses_the_protobuf_encoder():
+    resource = {"attributes": []}
+    envelope = Envelope("/v1/logs", resource, protobuf=True)
+
+    body = envelope.encode([{"body": {"stringValue": "hi"}, "attributes": []}])
+    assert b"hi" in body
+    assert not body.startswith(b"{")
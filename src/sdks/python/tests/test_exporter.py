@@ -0,0 +1,202 @@
+import threading
+import time
+
+import pytest
+
+from racelogic_apm.config import ApmConfig
+from racelogic_apm.exporter import (
+    OVERFLOW_BLOCK, OVERFLOW_DROP_NEWEST, OVERFLOW_DROP_OLDEST, BatchProcessor, BoundedQueue,
+)
+
+
+def _config(**overrides) -> ApmConfig:
+    options = dict(
+        endpoint="http://collector.test",
+        application_name="exporter-tests",
+        batch_size=10,
+        flush_interval_ms=60000,
+        max_concurrent_exports=2,
+    )
+    options.update(overrides)
+    return ApmConfig(**options)
+
+
+class _Export:
+    """Export callable recording batches, optionally held until released."""
+
+    def __init__(self, block: bool = False):
+        self.batches = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+        if not block:
+            self.release.set()
+        self._lock = threading.Lock()
+
+    def __call__(self, records):
+        self.started.set()
+        self.release.wait()
+        with self._lock:
+            self.batches.append(list(records))
+
+    @property
+    def records(self) -> list:
+        return [record for batch in self.batches for record in batch]
+
+
+def _drain(queue: BoundedQueue) -> list:
+    return [queue.get_nowait() for _ in range(queue.qsize())]
+
+
+# BoundedQueue overflow policies
+
+
+def test_drop_oldest_evicts_the_head():
+    queue = BoundedQueue(3, OVERFLOW_DROP_OLDEST, 0.01)
+    for i in range(5):
+        assert queue.put(i)
+
+    assert _drain(queue) == [2, 3, 4]
+    assert (queue.enqueued, queue.dropped, queue.high_water) == (5, 2, 3)
+
+
+def test_drop_newest_rejects_the_incoming_record():
+    queue = BoundedQueue(3, OVERFLOW_DROP_NEWEST, 0.01)
+    results = [queue.put(i) for i in range(5)]
+
+    assert results == [True, True, True, False, False]
+    assert _drain(queue) == [0, 1, 2]
+    assert (queue.enqueued, queue.dropped) == (3, 2)
+
+
+def test_block_waits_for_space():
+    queue = BoundedQueue(1, OVERFLOW_BLOCK, 5.0)
+    queue.put("first")
+    threading.Timer(0.05, queue.get_nowait).start()
+
+    assert queue.put("second")
+    assert _drain(queue) == ["second"]
+    assert queue.dropped == 0
+
+
+def test_block_drops_after_the_timeout():
+    queue = BoundedQueue(1, OVERFLOW_BLOCK, 0.05)
+    queue.put("first")
+
+    start = time.monotonic()
+    assert not queue.put("second")
+    assert time.monotonic() - start >= 0.04
+    # The consumer never blocks on its own queue.
+    assert not queue.put("third", block=False)
+    assert _drain(queue) == ["first"]
+    assert queue.dropped == 2
+
+
+def test_put_front_keeps_order_and_drops_the_oldest_overflow():
+    queue = BoundedQueue(4, OVERFLOW_DROP_NEWEST, 0.01)
+    queue.put("c")
+    queue.put_front(["w", "x", "a", "b"])
+
+    assert _drain(queue) == ["x", "a", "b", "c"]
+    assert queue.dropped == 1
+
+
+@pytest.mark.parametrize("maxsize, policy", [(0, OVERFLOW_DROP_OLDEST), (1, "drop_random")])
+def test_invalid_queue_settings_are_rejected(maxsize, policy):
+    with pytest.raises(ValueError):
+        BoundedQueue(maxsize, policy, 0.01)
+
+
+# BatchProcessor
+
+
+def test_enqueue_does_not_export_on_the_calling_thread():
+    export = _Export(block=True)
+    processor = BatchProcessor(_config(batch_size=1), export, "test")
+
+    processor.enqueue("a")
+    # A full batch wakes the worker, which exports off this thread.
+    assert export.started.wait(5)
+    export.release.set()
+    assert processor.flush(5)
+    assert export.records == ["a"]
+    processor.shutdown(1)
+
+
+def test_flush_drains_the_whole_queue():
+    export = _Export()
+    processor = BatchProcessor(_config(max_queue_size=1000), export, "test")
+    for i in range(95):
+        processor.enqueue(i)
+
+    assert processor.flush(5)
+    assert sorted(export.records) == list(range(95))
+    assert all(len(batch) <= 10 for batch in export.batches)
+    stats = processor.stats()
+    assert (stats["queue_size"], stats["exported"], stats["dropped"]) == (0, 95, 0)
+    processor.shutdown(1)
+
+
+def test_flush_waits_for_batches_already_in_flight():
+    export = _Export(block=True)
+    processor = BatchProcessor(_config(batch_size=1), export, "test")
+    processor.enqueue("in-flight")
+    assert export.started.wait(5)
+
+    # Nothing is queued, but the worker's export has not finished.
+    assert not processor.flush(0.05)
+    export.release.set()
+    assert processor.flush(5)
+    assert export.records == ["in-flight"]
+    processor.shutdown(1)
+
+
+def test_flush_exports_collected_records():
+    export = _Export()
+    pending = [["m1", "m2"]]
+    processor = BatchProcessor(
+        _config(), export, "test", collect=lambda: pending.pop() if pending else [], adaptive=False
+    )
+
+    assert processor.flush(5)
+    assert export.records == ["m1", "m2"]
+    processor.shutdown(1)
+
+
+def test_shutdown_drains_pending_records():
+    export = _Export()
+    processor = BatchProcessor(_config(), export, "test")
+    for i in range(25):
+        processor.enqueue(i)
+
+    assert processor.shutdown(5)
+    assert sorted(export.records) == list(range(25))
+    # A second shutdown is a no-op.
+    assert processor.shutdown(5)
+
+
+def test_shutdown_returns_at_the_deadline_when_exports_hang():
+    export = _Export(block=True)
+    processor = BatchProcessor(_config(max_concurrent_exports=1), export, "test")
+    processor.enqueue("stuck")
+    processor.enqueue("queued")
+
+    start = time.monotonic()
+    assert not processor.shutdown(0.2)
+    assert time.monotonic() - start < 2
+    export.release.set()
+
+
+def test_queue_overflow_is_counted_as_dropped():
+    export = _Export()
+    processor = BatchProcessor(
+        _config(max_queue_size=5, queue_overflow_policy=OVERFLOW_DROP_NEWEST, batch_size=100),
+        export,
+        "test",
+    )
+    for i in range(8):
+        processor.enqueue(i)
+
+    assert processor.dropped_count == 3
+    assert processor.flush(5)
+    assert export.records == [0, 1, 2, 3, 4]
+    processor.shutdown(1)
@@ -0,0 +1,93 @@
+import json
+import os
+
+import pytest
+
+from racelogic_apm import tracer
+from racelogic_apm.client import ApmClient
+
+pytestmark = [
+    pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork"),
+    # Forking with the SDK's worker threads running is what is under test.
+    pytest.mark.filterwarnings("ignore::DeprecationWarning"),
+]
+
+
+def _in_child(fn) -> object:
+    """Run ``fn`` in a forked child and return its JSON-serialisable result."""
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read)
+        try:
+            result = {"value": fn()}
+        except BaseException as e:
+            result = {"error": repr(e)}
+        os.write(write, json.dumps(result).encode())
+        os._exit(0)
+    os.close(write)
+    with os.fdopen(read, "rb") as f:
+        data = f.read()
+    os.waitpid(pid, 0)
+    result = json.loads(data)
+    assert "error" not in result, result["error"]
+    return result["value"]
+
+
+def test_children_draw_different_trace_ids():
+    first = _in_child(lambda: tracer._random.getrandbits(128))
+    second = _in_child(lambda: tracer._random.getrandbits(128))
+    in_parent = tracer._random.getrandbits(128)
+
+    assert len({first, second, in_parent}) == 3
+
+
+@pytest.fixture
+def client():
+    client = ApmClient(
+        endpoint="http://127.0.0.1:9",
+        application_name="fork-tests",
+        flush_interval_ms=60000,
+    )
+    yield client
+    client.shutdown(0.1)
+
+
+def test_child_restarts_workers_and_transport(client):
+    before = {
+        "processors": [
+            id(signal._processor) for signal in (client.logger, client.metrics, client.tracer)
+        ],
+        "client": id(client._transport._client),
+        "resource": client._transport.resource,
+    }
+
+    def inspect():
+        processors = [client.logger._processor, client.metrics._processor, client.tracer._processor]
+        return {
+            "processors": [id(processor) for processor in processors],
+            "alive": [processor._worker.is_alive() for processor in processors],
+            "client": id(client._transport._client),
+            "resource": client._transport.resource,
+            "pid": os.getpid(),
+        }
+
+    after = _in_child(inspect)
+
+    assert after["alive"] == [True, True, True]
+    assert not set(after["processors"]) & set(before["processors"])
+    assert after["client"] != before["client"]
+    # The child reports as its own instance.
+    attributes = {a["key"]: a["value"]["stringValue"] for a in after["resource"]["attributes"]}
+    parent = {a["key"]: a["value"]["stringValue"] for a in before["resource"]["attributes"]}
+    assert attributes["process.pid"] == str(after["pid"])
+    assert attributes["service.instance.id"] != parent["service.instance.id"]
+    # The parent keeps its pipeline.
+    assert client.logger._processor._worker.is_alive()
+
+
+def test_records_queued_before_the_fork_stay_with_the_parent(client):
+    client.logger.info("queued in the parent")
+
+    assert _in_child(lambda: client.logger._processor.stats()["queue_size"]) == 0
+    assert client.logger._processor.stats()["queue_size"] == 1
@@ -0,0 +1,31 @@
+import logging
+
+import pytest
+
+from racelogic_apm.handler import ApmHandler
+
+
+class _Logger:
+    def __init__(self):
+        self.records = []
+
+    def _log(self, level, message, exception, attributes, args=None, time_ns=None):
+        self.records.append((level, message, attributes))
+
+
+def _emit(name: str) -> list:
+    logger = _Logger()
+    ApmHandler(logger).emit(logging.LogRecord(name, logging.INFO, __file__, 1, "hello", (), None))
+    return logger.records
+
+
+@pytest.mark.parametrize(
+    "name", ["httpx", "httpcore", "httpcore.connection", "h2", "h2.connection", "hpack.hpack"]
+)
+def test_sdk_http_stack_is_ignored(name):
+    assert _emit(name) == []
+
+
+@pytest.mark.parametrize("name", ["h2o", "hpack_utils", "httpx_retry", "httpcore2.pool", "app.httpx"])
+def test_similarly_named_loggers_are_forwarded(name):
+    assert _emit(name) == [("info", "hello", {"logger.name": name})]
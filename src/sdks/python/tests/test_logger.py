@@ -0,0 +1,83 @@
+import logging
+import time
+
+import pytest
+
+from racelogic_apm.config import ApmConfig
+from racelogic_apm.handler import ApmHandler
+from racelogic_apm.logger import ApmLogger
+
+
+class _Transport:
+    def __init__(self):
+        self.records = []
+
+    def send(self, path, items):
+        assert path == "/v1/logs"
+        self.records.extend(items)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def make_logger():
+    loggers = []
+
+    def make(**overrides):
+        options = dict(
+            endpoint="http://collector.test", application_name="logger-tests", flush_interval_ms=60000
+        )
+        options.update(overrides)
+        transport = _Transport()
+        logger = ApmLogger(ApmConfig(**options), transport)
+        loggers.append(logger)
+        return logger, transport
+
+    yield make
+    for logger in loggers:
+        logger.shutdown(1)
+
+
+def _bodies(logger, transport) -> list:
+    assert logger.flush(5)
+    return [record["body"]["stringValue"] for record in transport.records]
+
+
+def _attributes(record) -> dict:
+    return {a["key"]: next(iter(a["value"].values())) for a in record["attributes"]}
+
+
+def test_repeats_collapse_into_one_summary(make_logger):
+    logger, transport = make_logger(log_dedup_window_ms=50)
+    for _ in range(5):
+        logger.error("db down", host="a")
+    # Another severity is another key.
+    logger.info("db down")
+    time.sleep(0.1)
+
+    assert _bodies(logger, transport) == ["db down", "db down", "db down"]
+    assert _attributes(transport.records[-1])["log.repeat_count"] == 4
+
+
+@pytest.mark.parametrize("message", [{"a": 1}, ["x", "y"], 42, None])
+def test_non_string_messages_with_dedup(make_logger, message):
+    logger, transport = make_logger(log_dedup_window_ms=60000)
+    handler = ApmHandler(logger)
+    stdlib = logging.getLogger("tests.dedup")
+    stdlib.addHandler(handler)
+    stdlib.propagate = False
+    try:
+        stdlib.warning(message)
+        stdlib.warning(message)
+    finally:
+        stdlib.removeHandler(handler)
+
+    assert _bodies(logger, transport) == [str(message)]
+
+
+def test_non_string_messages_without_dedup(make_logger):
+    logger, transport = make_logger()
+    logger._log("info", {"a": 1}, None, {})
+
+    assert _bodies(logger, transport) == ["{'a': 1}"]
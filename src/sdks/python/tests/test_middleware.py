@@ -0,0 +1,51 @@
+from types import SimpleNamespace
+
+import pytest
+
+from racelogic_apm.config import ApmConfig
+from racelogic_apm.middleware import RequestRecorder
+from racelogic_apm.sampling import ALWAYS_ON
+
+
+class _Instrument:
+    def record(self, value):
+        pass
+
+
+class _Metrics:
+    def bind(self, kind, name, **attributes):
+        return _Instrument()
+
+
+class _Logger:
+    def __init__(self):
+        self.records = []
+
+    def info(self, message, **attributes):
+        self.records.append(("info", message))
+
+    def error(self, message, **attributes):
+        self.records.append(("error", message))
+
+
+def _recorder(**overrides) -> RequestRecorder:
+    config = ApmConfig(endpoint="http://collector.test", application_name="middleware-tests", **overrides)
+    return RequestRecorder(SimpleNamespace(metrics=_Metrics(), logger=_Logger(), _config=config))
+
+
+def test_default_logs_only_failed_and_slow_requests():
+    recorder = _recorder(request_log_slow_ms=100)
+    recorder.record("GET", "/orders", "/orders", 200, 5_000_000)
+    recorder.record("GET", "/orders", "/orders", 404, 5_000_000)
+    recorder.record("GET", "/orders", "/orders/1", 503, 5_000_000)
+    recorder.record("GET", "/orders", "/orders/2", 200, 150_000_000)
+
+    assert recorder._logger.records == [("error", "GET /orders/1"), ("info", "GET /orders/2")]
+
+
+@pytest.mark.parametrize("status", [200, 500])
+def test_a_configured_sampler_replaces_the_default(status):
+    recorder = _recorder(request_log_sampler=ALWAYS_ON)
+    recorder.record("GET", None, "/health", status, 1_000)
+
+    assert [message for _, message in recorder._logger.records] == ["GET /health"]
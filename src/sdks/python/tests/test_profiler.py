@@ -0,0 +1,152 @@
+import asyncio
+
+import pytest
+
+from racelogic_apm import profiler as profiler_module
+from racelogic_apm.aio import AsyncApmClient
+from racelogic_apm.client import ApmClient
+from racelogic_apm.config import ApmConfig
+from racelogic_apm.logger import ApmLogger
+from racelogic_apm.profiler import MAX_PROFILE_CHARS, PROFILE_MESSAGE, SamplingProfiler
+
+
+def _config(**overrides) -> ApmConfig:
+    options = dict(
+        endpoint="http://collector.test",
+        application_name="profiler-tests",
+        profiler_enabled=True,
+        # Sampling stays out of the way; tests set the stacks themselves.
+        profiler_sample_hz=0.01,
+        profiler_export_interval_ms=3_600_000,
+    )
+    options.update(overrides)
+    return ApmConfig(**options)
+
+
+@pytest.fixture
+def make_profiler():
+    profilers = []
+
+    def make(emit, **overrides) -> SamplingProfiler:
+        profiler = SamplingProfiler(_config(**overrides), emit)
+        profilers.append(profiler)
+        return profiler
+
+    yield make
+    for profiler in profilers:
+        profiler.shutdown(1)
+
+
+def _export(profiler: SamplingProfiler, stacks: dict[str, int]) -> None:
+    profiler._stacks = dict(stacks)
+    profiler._interval_samples = sum(stacks.values())
+    profiler.export()
+
+
+def _folded(records: list[dict]) -> dict[str, int]:
+    lines = "\n".join(attributes["profile.folded"] for _, attributes in records).split("\n")
+    return {line.rsplit(" ", 1)[0]: int(line.rsplit(" ", 1)[1]) for line in lines}
+
+
+def test_small_profiles_are_one_record(make_profiler):
+    records = []
+    profiler = make_profiler(lambda message, **attributes: records.append((message, attributes)))
+    _export(profiler, {"main;handle": 3, "main;idle": 1})
+
+    ((message, attributes),) = records
+    assert message == PROFILE_MESSAGE
+    assert attributes["profile.folded"] == "main;handle 3\nmain;idle 1"
+    assert (attributes["profile.part"], attributes["profile.parts"]) == (0, 1)
+    assert profiler.exported_profiles == 1
+
+
+def test_large_profiles_are_split_under_the_attribute_limit(make_profiler):
+    records = []
+    profiler = make_profiler(lambda message, **attributes: records.append((message, attributes)))
+    # Non-BMP characters take two UTF-16 units each in the collector's table.
+    stacks = {f"main;frame_{i}_" + "\U0001f600" * 1000: i + 1 for i in range(40)}
+    _export(profiler, stacks)
+
+    assert len(records) > 1
+    for index, (_, attributes) in enumerate(records):
+        folded = attributes["profile.folded"]
+        assert len(folded) <= MAX_PROFILE_CHARS
+        assert len(folded.encode("utf-16-le")) < 64 * 1024
+        assert (attributes["profile.part"], attributes["profile.parts"]) == (index, len(records))
+    assert _folded(records) == stacks
+    assert profiler.exported_profiles == 1
+
+
+def test_stacks_beyond_the_record_limit_count_as_other(make_profiler, monkeypatch):
+    monkeypatch.setattr(profiler_module, "MAX_PROFILE_RECORDS", 2)
+    records = []
+    profiler = make_profiler(lambda message, **attributes: records.append((message, attributes)))
+    stacks = {f"main;frame_{i}_" + "x" * 6000: 100 - i for i in range(10)}
+    _export(profiler, stacks)
+
+    assert len(records) == 2
+    folded = _folded(records)
+    kept = {stack: count for stack, count in folded.items() if stack != "[other]"}
+    # The heaviest stacks are kept; the rest are summed.
+    assert set(kept) == set(sorted(stacks, key=stacks.get, reverse=True)[: len(kept)])
+    assert folded["[other]"] == sum(stacks.values()) - sum(kept.values())
+
+
+class _Transport:
+    def __init__(self):
+        self.records = []
+
+    def send(self, path, items):
+        self.records.extend(items)
+
+    def close(self):
+        pass
+
+
+def test_profiles_are_not_collapsed_by_log_deduplication(make_profiler):
+    # Every profile would fall in the first one's dedup window.
+    config = _config(log_dedup_window_ms=7_200_000, flush_interval_ms=60000)
+    transport = _Transport()
+    logger = ApmLogger(config, transport)
+    profiler = make_profiler(logger._log_distinct, log_dedup_window_ms=7_200_000)
+    try:
+        _export(profiler, {"main;first": 1})
+        _export(profiler, {"main;second": 2})
+        assert logger.flush(5)
+    finally:
+        logger.shutdown(1)
+
+    folded = [
+        a["value"]["stringValue"]
+        for record in transport.records
+        for a in record["attributes"]
+        if a["key"] == "profile.folded"
+    ]
+    assert folded == ["main;first 1", "main;second 2"]
+
+
+_CLIENT_OPTIONS = dict(
+    endpoint="http://127.0.0.1:9",
+    application_name="profiler-tests",
+    profiler_enabled=True,
+    profiler_sample_hz=0.01,
+)
+
+
+def test_client_emits_profiles_past_the_deduplicator():
+    client = ApmClient(**_CLIENT_OPTIONS)
+    try:
+        assert client._profiler._emit == client.logger._log_distinct
+    finally:
+        client.shutdown(0.1)
+
+
+def test_async_client_emits_profiles_past_the_deduplicator():
+    async def main():
+        client = AsyncApmClient(**_CLIENT_OPTIONS)
+        try:
+            assert client._profiler._emit == client.logger._log_distinct
+        finally:
+            await client.shutdown(0.1)
+
+    asyncio.run(main())
@@ -0,0 +1,267 @@
+"""Round-trip the hand-written OTLP protobuf encoder through opentelemetry-proto."""
+
+import pytest
+
+from racelogic_apm.encoding import SCOPE, convert_attributes
+from racelogic_apm.protobuf import decode_partial_success, encode_request, request_encoder
+
+logs_service = pytest.importorskip("opentelemetry.proto.collector.logs.v1.logs_service_pb2")
+metrics_service = pytest.importorskip(
+    "opentelemetry.proto.collector.metrics.v1.metrics_service_pb2"
+)
+trace_service = pytest.importorskip("opentelemetry.proto.collector.trace.v1.trace_service_pb2")
+
+
+RESOURCE = {
+    "attributes": convert_attributes({"service.name": "checkout", "process.pid": 4242})
+}
+
+TRACE_ID = "0af7651916cd43dd8448eb211c80319c"
+SPAN_ID = "b7ad6b7169203331"
+
+
+def _attributes(key_values) -> dict:
+    values = {}
+    for key_value in key_values:
+        value = key_value.value
+        values[key_value.key] = getattr(value, value.WhichOneof("value"))
+    return values
+
+
+def _decode(message_class, body: bytes):
+    message = message_class()
+    message.ParseFromString(body)
+    return message
+
+
+def test_logs_round_trip():
+    record = {
+        "timeUnixNano": 1_700_000_000_123_456_789,
+        "observedTimeUnixNano": 1_700_000_000_123_456_790,
+        "severityNumber": 17,
+        "severityText": "ERROR",
+        "body": {"stringValue": "Zahlung fehlgeschlagen: 支払い ✗ 🚀"},
+        "attributes": convert_attributes(
+            {"user": "Jürgen", "retries": -3, "ratio": -0.25, "ok": False, "big": -(2**63)}
+        ),
+        "traceId": TRACE_ID,
+        "spanId": SPAN_ID,
+    }
+    body = request_encoder("/v1/logs", RESOURCE, SCOPE)([record])
+
+    request = _decode(logs_service.ExportLogsServiceRequest, body)
+    resource_logs = request.resource_logs[0]
+    assert _attributes(resource_logs.resource.attributes) == {
+        "service.name": "checkout",
+        "process.pid": 4242,
+    }
+    assert resource_logs.scope_logs[0].scope.name == SCOPE["name"]
+    log = resource_logs.scope_logs[0].log_records[0]
+    assert log.time_unix_nano == record["timeUnixNano"]
+    assert log.observed_time_unix_nano == record["observedTimeUnixNano"]
+    assert log.severity_number == 17
+    assert log.severity_text == "ERROR"
+    assert log.body.string_value == "Zahlung fehlgeschlagen: 支払い ✗ 🚀"
+    assert _attributes(log.attributes) == {
+        "user": "Jürgen",
+        "retries": -3,
+        "ratio": -0.25,
+        "ok": False,
+        "big": -(2**63),
+    }
+    assert log.trace_id.hex() == TRACE_ID
+    assert log.span_id.hex() == SPAN_ID
+
+
+def test_lone_surrogates_are_replaced_instead_of_failing():
+    record = {"body": {"stringValue": "bad \udc80 name"}, "attributes": []}
+    body = request_encoder("/v1/logs", RESOURCE, SCOPE)([record])
+
+    request = _decode(logs_service.ExportLogsServiceRequest, body)
+    assert request.resource_logs[0].scope_logs[0].log_records[0].body.string_value == "bad ? name"
+
+
+@pytest.mark.parametrize("value", [2**64, 2**70, -(2**63) - 1])
+def test_integers_outside_64_bits_are_rejected(value):
+    record = {"body": {"stringValue": "x"}, "attributes": convert_attributes({"n": value})}
+
+    with pytest.raises(ValueError):
+        request_encoder("/v1/logs", RESOURCE, SCOPE)([record])
+
+
+def test_empty_repeated_fields_and_batches():
+    encode = request_encoder("/v1/logs", {"attributes": []}, SCOPE)
+
+    request = _decode(logs_service.ExportLogsServiceRequest, encode([]))
+    resource_logs = request.resource_logs[0]
+    assert list(resource_logs.resource.attributes) == []
+    assert list(resource_logs.scope_logs[0].log_records) == []
+
+    request = _decode(
+        logs_service.ExportLogsServiceRequest,
+        encode([{"body": {"stringValue": ""}, "attributes": []}]),
+    )
+    log = request.resource_logs[0].scope_logs[0].log_records[0]
+    assert log.body.string_value == ""
+    assert list(log.attributes) == []
+
+
+def test_nested_attribute_values():
+    record = {
+        "body": {"stringValue": "x"},
+        "attributes": [
+            {
+                "key": "tags",
+                "value": {"arrayValue": {"values": [{"stringValue": "a"}, {"stringValue": "é"}]}},
+            },
+            {
+                "key": "ctx",
+                "value": {"kvlistValue": {"values": [{"key": "depth", "value": {"intValue": -1}}]}},
+            },
+            {"key": "empty", "value": {"arrayValue": {"values": []}}},
+        ],
+    }
+    body = request_encoder("/v1/logs", RESOURCE, SCOPE)([record])
+
+    request = _decode(logs_service.ExportLogsServiceRequest, body)
+    log = request.resource_logs[0].scope_logs[0].log_records[0]
+    values = {kv.key: kv.value for kv in log.attributes}
+    assert [v.string_value for v in values["tags"].array_value.values] == ["a", "é"]
+    (depth,) = values["ctx"].kvlist_value.values
+    assert (depth.key, depth.value.int_value) == ("depth", -1)
+    assert values["empty"].WhichOneof("value") == "array_value"
+    assert list(values["empty"].array_value.values) == []
+
+
+def test_metrics_round_trip():
+    metrics = [
+        {
+            "name": "orders",
+            "sum": {
+                "dataPoints": [
+                    {
+                        "startTimeUnixNano": 1,
+                        "timeUnixNano": 2,
+                        "asDouble": -4.5,
+                        "attributes": convert_attributes({"región": "sur"}),
+                    }
+                ],
+                "aggregationTemporality": 1,
+                "isMonotonic": True,
+            },
+        },
+        {"name": "queue_depth", "gauge": {"dataPoints": [{"timeUnixNano": 3, "asInt": -7}]}},
+        {
+            "name": "latency_ms",
+            "histogram": {
+                "dataPoints": [
+                    {
+                        "count": 3,
+                        "sum": 12.5,
+                        "min": 0.5,
+                        "max": 10.0,
+                        "bucketCounts": [1, 1, 1],
+                        "explicitBounds": [1.0, 5.0],
+                        "attributes": [],
+                    },
+                    {"count": 0, "sum": 0.0, "bucketCounts": [], "explicitBounds": []},
+                ],
+                "aggregationTemporality": 1,
+            },
+        },
+        {
+            "name": "payload_bytes",
+            "exponentialHistogram": {
+                "dataPoints": [
+                    {
+                        "count": 4,
+                        "sum": -1.5,
+                        "scale": -2,
+                        "zeroCount": 1,
+                        "positive": {"offset": -3, "bucketCounts": [1, 0, 1]},
+                        "negative": {"offset": 0, "bucketCounts": []},
+                        "min": -3.0,
+                        "max": 2.0,
+                    }
+                ],
+                "aggregationTemporality": 1,
+            },
+        },
+    ]
+    body = request_encoder("/v1/metrics", RESOURCE, SCOPE)(metrics)
+
+    request = _decode(metrics_service.ExportMetricsServiceRequest, body)
+    decoded = {m.name: m for m in request.resource_metrics[0].scope_metrics[0].metrics}
+
+    (point,) = decoded["orders"].sum.data_points
+    assert decoded["orders"].sum.is_monotonic
+    assert decoded["orders"].sum.aggregation_temporality == 1
+    assert (point.start_time_unix_nano, point.time_unix_nano, point.as_double) == (1, 2, -4.5)
+    assert _attributes(point.attributes) == {"región": "sur"}
+
+    assert decoded["queue_depth"].gauge.data_points[0].as_int == -7
+
+    full, empty = decoded["latency_ms"].histogram.data_points
+    assert (full.count, full.sum, full.min, full.max) == (3, 12.5, 0.5, 10.0)
+    assert list(full.bucket_counts) == [1, 1, 1]
+    assert list(full.explicit_bounds) == [1.0, 5.0]
+    assert (empty.count, list(empty.bucket_counts), list(empty.explicit_bounds)) == (0, [], [])
+
+    (exponential,) = decoded["payload_bytes"].exponential_histogram.data_points
+    assert (exponential.scale, exponential.zero_count, exponential.sum) == (-2, 1, -1.5)
+    assert exponential.positive.offset == -3
+    assert list(exponential.positive.bucket_counts) == [1, 0, 1]
+    assert list(exponential.negative.bucket_counts) == []
+
+
+def test_traces_round_trip():
+    span = {
+        "traceId": TRACE_ID,
+        "spanId": SPAN_ID,
+        "parentSpanId": "00f067aa0ba902b7",
+        "name": "GET /Straße/{id}",
+        "kind": 2,
+        "startTimeUnixNano": 10,
+        "endTimeUnixNano": 20,
+        "attributes": convert_attributes({"http.status_code": 503, "offset": -1}),
+        "events": [
+            {"timeUnixNano": 15, "name": "exception", "attributes": convert_attributes({"n": -2})}
+        ],
+        "status": {"code": 2, "message": "upstream ✗"},
+    }
+    root = {"traceId": TRACE_ID, "spanId": "1111111111111111", "name": "root", "events": []}
+    body = request_encoder("/v1/traces", RESOURCE, SCOPE)([span, root])
+
+    request = _decode(trace_service.ExportTraceServiceRequest, body)
+    decoded, decoded_root = request.resource_spans[0].scope_spans[0].spans
+    assert decoded.trace_id.hex() == TRACE_ID
+    assert decoded.parent_span_id.hex() == "00f067aa0ba902b7"
+    assert decoded.name == "GET /Straße/{id}"
+    assert (decoded.kind, decoded.start_time_unix_nano, decoded.end_time_unix_nano) == (2, 10, 20)
+    assert _attributes(decoded.attributes) == {"http.status_code": 503, "offset": -1}
+    (event,) = decoded.events
+    assert (event.time_unix_nano, event.name) == (15, "exception")
+    assert _attributes(event.attributes) == {"n": -2}
+    assert (decoded.status.code, decoded.status.message) == (2, "upstream ✗")
+    assert decoded_root.parent_span_id == b""
+    assert list(decoded_root.events) == []
+
+
+def test_encode_request_matches_request_encoder():
+    record = {"body": {"stringValue": "hello"}, "attributes": []}
+    payload = {
+        "resourceLogs": [
+            {"resource": RESOURCE, "scopeLogs": [{"scope": SCOPE, "logRecords": [record]}]}
+        ]
+    }
+    assert encode_request("/v1/logs", payload) == request_encoder("/v1/logs", RESOURCE, SCOPE)(
+        [record]
+    )
+
+
+def test_decode_partial_success():
+    response = logs_service.ExportLogsServiceResponse()
+    response.partial_success.rejected_log_records = 3
+    response.partial_success.error_message = "zu groß"
+    assert decode_partial_success(response.SerializeToString()) == (3, "zu groß")
+    assert decode_partial_success(b"") == (0, "")
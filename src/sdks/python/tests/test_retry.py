@@ -0,0 +1,297 @@
+import threading
+import time
+
+import httpx
+import pytest
+
+from racelogic_apm.config import ApmConfig
+from racelogic_apm.exporter import BatchProcessor
+from racelogic_apm.retry import (
+    Backoff, CircuitBreaker, CircuitOpenError, ExportError, is_retryable, parse_retry_after,
+)
+
+
+def _config(**overrides) -> ApmConfig:
+    options = dict(
+        endpoint="http://collector.test",
+        application_name="retry-tests",
+        flush_interval_ms=60000,
+        retry_delay_ms=1,
+        max_retry_delay_ms=5,
+        max_retries=2,
+        circuit_breaker_threshold=2,
+    )
+    options.update(overrides)
+    return ApmConfig(**options)
+
+
+class _Responder:
+    """Mock collector answering with queued outcomes, then 200."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.requests = 0
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        outcome = self.outcomes.pop(0) if self.outcomes else 200
+        if isinstance(outcome, Exception):
+            raise outcome
+        return httpx.Response(outcome, headers={"Retry-After": "0"} if outcome == 429 else None)
+
+
+def _log(message: str = "hello") -> dict:
+    return {"body": {"stringValue": message}, "attributes": []}
+
+
+def _wait_for_probe(breaker: CircuitBreaker) -> None:
+    time.sleep(breaker.retry_after + 0.01)
+
+
+# Classification
+
+
+@pytest.mark.parametrize(
+    "error, expected",
+    [
+        (ExportError("503", retryable=True), True),
+        (ExportError("400", retryable=False), False),
+        (CircuitOpenError(1.0), True),
+        (httpx.ConnectError("refused"), True),
+        (httpx.ReadTimeout("slow"), True),
+        (httpx.DecodingError("bad gzip"), False),
+        (ValueError("cannot encode"), False),
+        (UnicodeEncodeError("utf-8", "\udc80", 0, 1, "surrogates not allowed"), False),
+    ],
+)
+def test_is_retryable(error, expected):
+    assert is_retryable(error) is expected
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after("-1") == 0.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
+
+
+# Backoff
+
+
+def test_backoff_is_jittered_exponential_and_capped():
+    backoff = Backoff(base=1.0, maximum=8.0)
+    for attempt, ceiling in [(0, 1.0), (1, 2.0), (2, 4.0), (3, 8.0), (10, 8.0)]:
+        for _ in range(50):
+            assert ceiling / 2 <= backoff.delay(attempt) <= ceiling
+
+
+def test_backoff_honours_retry_after_within_maximum():
+    backoff = Backoff(base=0.1, maximum=5.0)
+    assert backoff.delay(0, retry_after=3.0) == 3.0
+    assert backoff.delay(0, retry_after=60.0) == 5.0
+
+
+# CircuitBreaker
+
+
+def test_circuit_opens_after_threshold_and_closes_after_probe():
+    breaker = CircuitBreaker(threshold=3, backoff=Backoff(0.02, 0.02))
+    for _ in range(2):
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.CLOSED
+        assert breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert 0 < breaker.retry_after <= 0.02
+
+    _wait_for_probe(breaker)
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # Only one probe at a time.
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+    assert breaker.retry_after == 0
+
+
+def test_failed_probe_reopens_the_circuit():
+    breaker = CircuitBreaker(threshold=1, backoff=Backoff(0.02, 0.02))
+    breaker.record_failure()
+    _wait_for_probe(breaker)
+    assert breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker(threshold=2, backoff=Backoff(0.02, 0.02))
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+# Transport
+
+
+def test_transport_classifies_statuses(mock_transport):
+    transport = mock_transport(_config(circuit_breaker_threshold=10), _Responder(503, 400, 429))
+    with pytest.raises(ExportError) as unavailable:
+        transport.send("/v1/logs", [_log()])
+    assert unavailable.value.retryable and unavailable.value.status_code == 503
+    with pytest.raises(ExportError) as rejected:
+        transport.send("/v1/logs", [_log()])
+    assert not rejected.value.retryable and rejected.value.status_code == 400
+    with pytest.raises(ExportError) as throttled:
+        transport.send("/v1/logs", [_log()])
+    assert throttled.value.retryable and throttled.value.retry_after == 0.0
+    assert transport.send("/v1/logs", [_log()]).status_code == 200
+
+
+def test_transport_fails_fast_while_circuit_is_open(mock_transport):
+    responder = _Responder(503, httpx.ConnectError("refused"))
+    transport = mock_transport(_config(), responder)
+    for _ in range(2):
+        with pytest.raises(ExportError):
+            transport.send("/v1/logs", [_log()])
+    assert transport.stats()["circuit"] == CircuitBreaker.OPEN
+
+    with pytest.raises(CircuitOpenError):
+        transport.send("/v1/logs", [_log()])
+    assert responder.requests == 2
+
+    _wait_for_probe(transport._breaker)
+    assert transport.send("/v1/logs", [_log()]).status_code == 200
+    assert transport.stats()["circuit"] == CircuitBreaker.CLOSED
+
+
+def test_non_transport_error_settles_the_probe(mock_transport):
+    responder = _Responder(503, 503, httpx.DecodingError("bad response"))
+    transport = mock_transport(_config(), responder)
+    for _ in range(2):
+        with pytest.raises(ExportError):
+            transport.send("/v1/logs", [_log()])
+    _wait_for_probe(transport._breaker)
+
+    with pytest.raises(httpx.DecodingError):
+        transport.send("/v1/logs", [_log()])
+    # Not stuck half-open: the next probe is allowed once the delay passes.
+    assert transport.stats()["circuit"] == CircuitBreaker.OPEN
+    _wait_for_probe(transport._breaker)
+    assert transport.send("/v1/logs", [_log()]).status_code == 200
+    assert transport.stats()["circuit"] == CircuitBreaker.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_async_non_transport_error_settles_the_probe(async_mock_transport):
+    responder = _Responder(503, 503, httpx.DecodingError("bad response"))
+    transport = async_mock_transport(_config(), responder)
+    for _ in range(2):
+        with pytest.raises(ExportError):
+            await transport.send("/v1/logs", [_log()])
+    _wait_for_probe(transport._breaker)
+
+    with pytest.raises(httpx.DecodingError):
+        await transport.send("/v1/logs", [_log()])
+    assert transport.stats()["circuit"] == CircuitBreaker.OPEN
+    _wait_for_probe(transport._breaker)
+    assert (await transport.send("/v1/logs", [_log()])).status_code == 200
+    assert transport.stats()["circuit"] == CircuitBreaker.CLOSED
+    await transport.close()
+
+
+# Exporter retry path
+
+
+class _Export:
+    """Export callable failing with queued errors, then succeeding."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, records):
+        with self._lock:
+            self.calls.append(list(records))
+            error = self.errors.pop(0) if self.errors else None
+        if error is not None:
+            raise error
+
+
+def _processor(export: _Export, **overrides) -> BatchProcessor:
+    return BatchProcessor(_config(**overrides), export, "retry-test")
+
+
+def test_transient_failures_are_retried():
+    export = _Export(ExportError("503", retryable=True), httpx.ConnectError("refused"))
+    processor = _processor(export)
+    processor.enqueue("a")
+
+    assert processor.flush(5)
+    assert len(export.calls) == 3
+    stats = processor.stats()
+    assert (stats["retries"], stats["exported"], stats["requeued"], stats["discarded"]) == (2, 1, 0, 0)
+    processor.shutdown(1)
+
+
+def test_retries_stop_at_max_retries_and_requeue():
+    export = _Export(*[ExportError("503", retryable=True)] * 3)
+    processor = _processor(export)
+    processor.enqueue("a")
+    processor.enqueue("b")
+
+    assert not processor.flush(5)
+    # One attempt plus max_retries retries.
+    assert len(export.calls) == 3
+    stats = processor.stats()
+    assert (stats["retries"], stats["failed_exports"], stats["requeued"]) == (2, 1, 2)
+    assert stats["queue_size"] == 2
+
+    # The re-queued batch is exported once the collector recovers.
+    processor._resume_at = 0
+    assert processor.flush(5)
+    assert export.calls[-1] == ["a", "b"]
+    processor.shutdown(1)
+
+
+def test_open_circuit_is_not_retried_inline():
+    export = _Export(CircuitOpenError(0.0))
+    processor = _processor(export)
+    processor.enqueue("a")
+
+    assert not processor.flush(5)
+    assert len(export.calls) == 1
+    assert processor.stats()["requeued"] == 1
+    processor.shutdown(1)
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        ExportError("400", retryable=False),
+        UnicodeEncodeError("utf-8", "\udc80", 0, 1, "surrogates not allowed"),
+        TypeError("Type is not JSON serializable"),
+        httpx.DecodingError("bad response"),
+    ],
+)
+def test_permanent_failures_are_discarded(error):
+    export = _Export(error)
+    processor = _processor(export, batch_size=1)
+    processor.enqueue("poison")
+    processor.enqueue("good")
+
+    assert processor.flush(5)
+    # No retry of the poison batch, and it does not block the one behind it.
+    assert export.calls == [["poison"], ["good"]]
+    stats = processor.stats()
+    assert (stats["discarded"], stats["failed_exports"], stats["exported"]) == (1, 1, 1)
+    assert (stats["retries"], stats["requeued"], stats["queue_size"]) == (0, 0, 0)
+    processor.shutdown(1)
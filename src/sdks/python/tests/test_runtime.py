@@ -0,0 +1,189 @@
+import asyncio
+import gc
+import os
+import threading
+import time
+
+import pytest
+
+from racelogic_apm import runtime as runtime_module
+from racelogic_apm.config import ApmConfig
+from racelogic_apm.metrics import ApmMetrics
+from racelogic_apm.runtime import RuntimeMetrics
+from racelogic_apm.stats import DeltaCounters
+
+
+class _Metrics:
+    """Records what a metrics callback reports, as ApmMetrics would receive it."""
+
+    def __init__(self):
+        self.recorded = []
+
+    def counter(self, name, value, **attributes):
+        self.recorded.append(("counter", name, value, attributes))
+
+    def gauge(self, name, value, **attributes):
+        self.recorded.append(("gauge", name, value, attributes))
+
+    def histogram(self, name, value, **attributes):
+        self.recorded.append(("histogram", name, value, attributes))
+
+    def values(self, kind, name, **attributes) -> list:
+        return [
+            value
+            for k, n, value, a in self.recorded
+            if (k, n) == (kind, name) and attributes.items() <= a.items()
+        ]
+
+
+@pytest.fixture
+def runtime():
+    runtime = RuntimeMetrics()
+    yield runtime
+    runtime.shutdown()
+
+
+@pytest.fixture
+def no_automatic_gc():
+    # Only the collections a test runs itself are counted.
+    enabled = gc.isenabled()
+    gc.disable()
+    yield
+    if enabled:
+        gc.enable()
+
+
+def _collect(runtime: RuntimeMetrics) -> _Metrics:
+    metrics = _Metrics()
+    runtime(metrics)
+    return metrics
+
+
+def test_gc_collections_and_pauses_are_reported_once(runtime, no_automatic_gc):
+    assert _collect(runtime).values("counter", "process.runtime.gc.collections") == []
+
+    gc.collect()
+    gc.collect()
+    metrics = _collect(runtime)
+    assert metrics.values("counter", "process.runtime.gc.collections", generation=2) == [2]
+    pauses = metrics.values("histogram", "process.runtime.gc.pause_ms", generation=2)
+    assert len(pauses) == 2 and all(pause >= 0 for pause in pauses)
+
+    again = _collect(runtime)
+    assert again.values("counter", "process.runtime.gc.collections") == []
+    assert again.values("histogram", "process.runtime.gc.pause_ms") == []
+
+
+def test_gc_pauses_are_bounded_between_collections(runtime, no_automatic_gc):
+    for _ in range(runtime_module.MAX_PENDING_SAMPLES + 10):
+        runtime._on_gc("start", {"generation": 0})
+        runtime._on_gc("stop", {"generation": 0})
+
+    pauses = _collect(runtime).values("histogram", "process.runtime.gc.pause_ms")
+    assert len(pauses) == runtime_module.MAX_PENDING_SAMPLES
+
+
+def test_cpu_time_is_reported_as_deltas(runtime):
+    deadline = time.process_time() + 0.05
+    while time.process_time() < deadline:
+        pass
+
+    metrics = _collect(runtime)
+    user, = metrics.values("counter", "process.cpu.time_s", state="user")
+    assert user > 0
+    utilization, = metrics.values("gauge", "process.cpu.utilization")
+    assert 0 < utilization <= os.cpu_count() + 0.5
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/statm"), reason="needs /proc")
+def test_process_gauges(runtime):
+    worker = threading.Thread(target=time.sleep, args=(0.2,))
+    worker.start()
+    try:
+        metrics = _collect(runtime)
+    finally:
+        worker.join()
+
+    rss, = metrics.values("gauge", "process.memory.rss_bytes")
+    assert rss > 1024 * 1024
+    fds, = metrics.values("gauge", "process.open_fds")
+    assert fds >= 3
+    threads, = metrics.values("gauge", "process.threads")
+    assert threads >= 2
+
+
+def test_counters_restart_after_fork():
+    metrics = _Metrics()
+    deltas = DeltaCounters()
+    deltas.baseline("gc", 10)
+    deltas.emit(metrics, "collections", "gc", 12)
+    # A forked child counts from zero again.
+    deltas.emit(metrics, "collections", "gc", 3)
+    deltas.emit(metrics, "collections", "gc", 3)
+
+    assert metrics.values("counter", "collections") == [2, 3]
+
+
+def test_event_loop_lag_is_recorded(monkeypatch):
+    monkeypatch.setattr(runtime_module, "LOOP_LAG_PROBE_INTERVAL", 0.01)
+    runtime = RuntimeMetrics(watch_running_loop=True)
+
+    async def main():
+        # The first collection on the loop starts watching it.
+        _collect(runtime)
+        await asyncio.sleep(0.02)
+        time.sleep(0.1)  # Blocks the loop.
+        await asyncio.sleep(0.05)
+        return _collect(runtime)
+
+    try:
+        metrics = asyncio.run(main())
+    finally:
+        runtime.shutdown()
+
+    lags = metrics.values("histogram", "process.runtime.event_loop.lag_ms")
+    assert max(lags) >= 50
+    assert runtime._loop_tasks == {}
+
+
+def test_shutdown_removes_the_gc_hook():
+    runtime = RuntimeMetrics()
+    assert runtime._on_gc in gc.callbacks
+
+    runtime.shutdown()
+    runtime.shutdown()
+    assert runtime._on_gc not in gc.callbacks
+
+
+class _Transport:
+    def __init__(self):
+        self.metrics = []
+
+    def send(self, path, items):
+        self.metrics.extend(items)
+
+    def close(self):
+        pass
+
+
+def test_runtime_metrics_export_through_apm_metrics(runtime, no_automatic_gc):
+    transport = _Transport()
+    metrics = ApmMetrics(
+        ApmConfig(
+            endpoint="http://collector.test",
+            application_name="runtime-tests",
+            flush_interval_ms=60000,
+        ),
+        transport,
+    )
+    metrics.register_callback(runtime)
+    gc.collect()
+    try:
+        assert metrics.flush(5)
+    finally:
+        metrics.shutdown(1)
+
+    exported = {metric["name"]: metric for metric in transport.metrics}
+    assert "sum" in exported["process.runtime.gc.collections"]
+    assert "exponentialHistogram" in exported["process.runtime.gc.pause_ms"]
+    assert "gauge" in exported["process.threads"]
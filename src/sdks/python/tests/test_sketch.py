@@ -0,0 +1,115 @@
+import math
+import random
+
+import pytest
+
+from racelogic_apm.sketch import MAX_SCALE, ExponentialHistogram
+
+
+def _sketch(values, max_size=160) -> ExponentialHistogram:
+    sketch = ExponentialHistogram(max_size)
+    for value in values:
+        sketch.update(value)
+    return sketch
+
+
+def _exact_quantile(values, q):
+    ordered = sorted(values)
+    return ordered[int(q * (len(ordered) - 1))]
+
+
+def _assert_within_bound(sketch, values):
+    bound = sketch.relative_error
+    for q in (0.0, 0.01, 0.25, 0.5, 0.75, 0.9, 0.99, 0.999, 1.0):
+        exact = _exact_quantile(values, q)
+        estimate = sketch.quantile(q)
+        assert abs(estimate - exact) <= bound * abs(exact) + 1e-12, (q, exact, estimate)
+
+
+@pytest.mark.parametrize(
+    "distribution",
+    [
+        lambda rng: rng.lognormvariate(3, 2),
+        lambda rng: rng.uniform(0.001, 1000),
+        lambda rng: rng.expovariate(0.01),
+    ],
+    ids=["lognormal", "uniform", "exponential"],
+)
+def test_quantiles_stay_within_the_relative_error_bound(distribution):
+    rng = random.Random(7)
+    values = [distribution(rng) for _ in range(20000)]
+    sketch = _sketch(values)
+
+    assert sketch.scale < MAX_SCALE
+    assert len(sketch.positive.counts) <= 160
+    _assert_within_bound(sketch, values)
+
+
+def test_negative_and_zero_values():
+    rng = random.Random(11)
+    values = [rng.uniform(-500, 500) for _ in range(5000)] + [0.0] * 100
+    sketch = _sketch(values)
+
+    assert sketch.zero_count == 100
+    _assert_within_bound(sketch, values)
+    data = sketch.to_data_point()
+    assert data["count"] == len(values)
+    assert sum(data["positive"]["bucketCounts"]) + sum(data["negative"]["bucketCounts"]) + 100 == len(values)
+
+
+@pytest.mark.parametrize("value", [0.25, 1.0, 2.0, 4.0, 1024.0])
+def test_exact_powers_of_two_close_their_bucket(value):
+    sketch = _sketch([value])
+    (index,) = sketch.positive.counts
+    # Buckets are (base ** i, base ** (i + 1)]; a power of two is an upper bound.
+    assert index == round(math.log2(value)) * 2 ** sketch.scale - 1
+
+
+def test_memory_is_bounded_whatever_the_range():
+    sketch = _sketch([10.0 ** exponent for exponent in range(-300, 300)], max_size=20)
+
+    assert len(sketch.positive.counts) <= 20
+    assert sketch.positive.high - sketch.positive.low + 1 <= 20
+
+
+def test_merge_matches_a_single_sketch():
+    rng = random.Random(3)
+    narrow = [rng.uniform(1, 2) for _ in range(5000)]
+    wide = [rng.lognormvariate(0, 4) for _ in range(5000)] + [-1.5, 0.0]
+    merged = _sketch(narrow)
+    other = _sketch(wide)
+    # The narrow sketch keeps a finer scale until the merge.
+    assert merged.scale > other.scale
+
+    merged.merge(other)
+    combined = _sketch(narrow + wide)
+
+    assert merged.scale == combined.scale
+    assert merged.positive.counts == combined.positive.counts
+    assert merged.negative.counts == combined.negative.counts
+    assert (merged.count, merged.zero_count) == (combined.count, combined.zero_count)
+    assert (merged.min, merged.max) == (combined.min, combined.max)
+    assert math.isclose(merged.sum, combined.sum)
+    _assert_within_bound(merged, narrow + wide)
+
+
+def test_merge_into_a_coarser_sketch_and_with_an_empty_one():
+    rng = random.Random(5)
+    wide = [rng.lognormvariate(0, 4) for _ in range(2000)]
+    narrow = [rng.uniform(1, 2) for _ in range(2000)]
+    sketch = _sketch(wide)
+    scale = sketch.scale
+
+    sketch.merge(ExponentialHistogram())
+    assert sketch.scale == scale and sketch.count == 2000
+    sketch.merge(_sketch(narrow))
+    assert sketch.scale <= scale
+    assert sketch.count == 4000
+    _assert_within_bound(sketch, wide + narrow)
+
+
+def test_empty_sketch():
+    sketch = ExponentialHistogram()
+
+    assert sketch.quantile(0.5) is None
+    assert sketch.to_data_point()["positive"] == {"offset": 0, "bucketCounts": []}
@@ -0,0 +1,207 @@
+import os
+import time
+
+import pytest
+
+from racelogic_apm.spool import DiskSpool, SpoolEntry
+
+JSON = ("application/json", None)
+
+
+def _open(directory, max_bytes=1 << 20, max_age_s=3600.0, segment_bytes=1 << 16) -> DiskSpool:
+    return DiskSpool(str(directory), max_bytes=max_bytes, max_age_s=max_age_s, segment_bytes=segment_bytes)
+
+
+def _drain(spool: DiskSpool) -> list:
+    entries = []
+    while True:
+        entry = spool.peek()
+        if entry is None:
+            return entries
+        entries.append((entry.path, entry.body))
+        spool.pop()
+
+
+def _segment_files(slot) -> list:
+    return sorted(name for name in os.listdir(slot) if name.endswith(".seg"))
+
+
+@pytest.fixture
+def spool(tmp_path):
+    spool = _open(tmp_path)
+    yield spool
+    spool.close()
+
+
+def test_replays_in_order(spool):
+    for i in range(5):
+        spool.append("/v1/logs" if i % 2 else "/v1/metrics", b"body-%d" % i, *JSON)
+
+    assert spool.peek() == SpoolEntry("/v1/metrics", b"body-0", "application/json", None)
+    # peek() without pop() does not consume.
+    assert spool.peek().body == b"body-0"
+    assert _drain(spool) == [
+        ("/v1/metrics", b"body-0"),
+        ("/v1/logs", b"body-1"),
+        ("/v1/metrics", b"body-2"),
+        ("/v1/logs", b"body-3"),
+        ("/v1/metrics", b"body-4"),
+    ]
+    assert spool.peek() is None
+
+
+def test_entries_keep_their_content_headers_across_restarts(tmp_path):
+    spool = _open(tmp_path)
+    spool.append("/v1/logs", b"json", "application/json", "gzip")
+    spool.append("/v1/traces", b"protobuf", "application/x-protobuf", None)
+    spool.close()
+
+    spool = _open(tmp_path)
+    assert spool.peek() == SpoolEntry("/v1/logs", b"json", "application/json", "gzip")
+    spool.pop()
+    assert spool.peek() == SpoolEntry("/v1/traces", b"protobuf", "application/x-protobuf", None)
+    spool.close()
+
+
+def test_rotates_segments_and_removes_consumed_ones(tmp_path):
+    spool = _open(tmp_path, segment_bytes=100)
+    for i in range(10):
+        spool.append("/v1/logs", b"x" * 60 + b"%d" % i, *JSON)
+
+    # A segment takes appends until it reaches segment_bytes: two entries each.
+    assert len(_segment_files(tmp_path / "0")) == 5
+    assert [body[-1:] for _, body in _drain(spool)] == [b"%d" % i for i in range(10)]
+    # Only the segment being written is kept.
+    assert len(_segment_files(tmp_path / "0")) == 1
+    spool.close()
+
+
+def test_max_bytes_evicts_oldest_segments(tmp_path):
+    spool = _open(tmp_path, max_bytes=500, segment_bytes=100)
+    for i in range(20):
+        spool.append("/v1/logs", b"x" * 60 + b"%02d" % i, *JSON)
+
+    assert spool.size_bytes <= 500
+    assert spool.evicted_bytes > 0
+    bodies = [body[-2:] for _, body in _drain(spool)]
+    # The newest entries survive, still in order.
+    assert bodies == [b"%02d" % i for i in range(20 - len(bodies), 20)]
+    spool.close()
+
+
+def test_max_age_evicts_expired_segments(tmp_path):
+    spool = _open(tmp_path, max_age_s=60, segment_bytes=10)
+    spool.append("/v1/logs", b"old", *JSON)
+    spool.append("/v1/logs", b"new", *JSON)
+    old_segment = os.path.join(tmp_path, "0", _segment_files(tmp_path / "0")[0])
+    stale = time.time() - 120
+    os.utime(old_segment, (stale, stale))
+
+    spool.evict_expired()
+
+    assert _drain(spool) == [("/v1/logs", b"new")]
+    assert spool.evicted_bytes > 0
+    spool.close()
+
+
+def test_resumes_after_restart(tmp_path):
+    spool = _open(tmp_path, segment_bytes=50)
+    for i in range(6):
+        spool.append("/v1/traces", b"span-%d" % i, *JSON)
+    spool.peek()
+    spool.pop()
+    spool.peek()
+    spool.pop()
+    spool.close()
+
+    spool = _open(tmp_path, segment_bytes=50)
+    assert [body for _, body in _drain(spool)] == [b"span-%d" % i for i in range(2, 6)]
+    spool.append("/v1/traces", b"after-restart", *JSON)
+    assert _drain(spool) == [("/v1/traces", b"after-restart")]
+    spool.close()
+
+
+def test_torn_tail_is_skipped(tmp_path):
+    spool = _open(tmp_path)
+    spool.append("/v1/logs", b"complete", *JSON)
+    spool.append("/v1/logs", b"torn-entry", *JSON)
+    spool.close()
+    segment = os.path.join(tmp_path, "0", _segment_files(tmp_path / "0")[-1])
+    with open(segment, "r+b") as f:
+        f.truncate(os.path.getsize(segment) - 3)
+
+    spool = _open(tmp_path)
+    spool.append("/v1/logs", b"after-crash", *JSON)
+    assert _drain(spool) == [("/v1/logs", b"complete"), ("/v1/logs", b"after-crash")]
+    spool.close()
+
+
+def test_corrupt_entry_is_skipped(tmp_path):
+    spool = _open(tmp_path)
+    spool.append("/v1/logs", b"good", *JSON)
+    spool.append("/v1/logs", b"flipped", *JSON)
+    spool.close()
+    segment = os.path.join(tmp_path, "0", _segment_files(tmp_path / "0")[-1])
+    with open(segment, "r+b") as f:
+        f.seek(-1, os.SEEK_END)
+        f.write(b"?")
+
+    spool = _open(tmp_path)
+    assert _drain(spool) == [("/v1/logs", b"good")]
+    spool.close()
+
+
+@pytest.mark.skipif(os.name == "nt", reason="slot locks need fcntl")
+def test_concurrent_spools_claim_separate_slots(tmp_path):
+    first = _open(tmp_path)
+    second = _open(tmp_path)
+    first.append("/v1/logs", b"first", *JSON)
+    second.append("/v1/logs", b"second", *JSON)
+
+    assert _drain(first) == [("/v1/logs", b"first")]
+    assert _drain(second) == [("/v1/logs", b"second")]
+    first.close()
+    second.close()
+
+
+@pytest.mark.skipif(os.name == "nt", reason="slot locks need fcntl")
+def test_orphan_slots_are_adopted(tmp_path):
+    # Three workers spool, then the service restarts with a single process.
+    workers = [_open(tmp_path, segment_bytes=50) for _ in range(3)]
+    for index, worker in enumerate(workers):
+        for i in range(3):
+            worker.append("/v1/logs", b"w%d-%d" % (index, i), *JSON)
+    # Worker 1 had already replayed its first entry.
+    workers[1].peek()
+    workers[1].pop()
+    for worker in workers:
+        worker.close()
+
+    spool = _open(tmp_path, segment_bytes=50)
+
+    assert [body for _, body in _drain(spool)] == [
+        b"w0-0", b"w0-1", b"w0-2",
+        b"w1-1", b"w1-2",
+        b"w2-0", b"w2-1", b"w2-2",
+    ]
+    assert _segment_files(tmp_path / "1") == []
+    assert _segment_files(tmp_path / "2") == []
+    spool.close()
+
+    # Nothing is replayed twice after another restart.
+    spool = _open(tmp_path)
+    assert spool.peek() is None
+    spool.close()
+
+
+@pytest.mark.skipif(os.name == "nt", reason="slot locks need fcntl")
+def test_live_slots_are_not_adopted(tmp_path):
+    live = _open(tmp_path)
+    live.append("/v1/logs", b"live", *JSON)
+
+    other = _open(tmp_path)
+    assert other.peek() is None
+    other.close()
+
+    assert _drain(live) == [("/v1/logs", b"live")]
+    live.close()
@@ -0,0 +1,252 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from racelogic_apm.config import ApmConfig
+from racelogic_apm.sampling import (
+    ALWAYS_OFF, ALWAYS_ON, KeepErrorsSampler, ParentBasedSampler, ProbabilitySampler,
+    RateLimitingSampler, RouteSampler,
+)
+from racelogic_apm.tracer import (
+    STATUS_ERROR, UNSAMPLED_PARENT_ATTRIBUTE, ApmTracer, current_span,
+)
+
+
+class _Transport:
+    def __init__(self):
+        self.spans = []
+
+    def send(self, path, items):
+        assert path == "/v1/traces"
+        self.spans.extend(items)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def make_tracer():
+    tracers = []
+
+    def make(**overrides):
+        options = dict(
+            endpoint="http://collector.test", application_name="tracer-tests", flush_interval_ms=60000
+        )
+        options.update(overrides)
+        transport = _Transport()
+        tracer = ApmTracer(ApmConfig(**options), transport)
+        tracers.append(tracer)
+        return tracer, transport
+
+    yield make
+    for tracer in tracers:
+        tracer.shutdown(1)
+
+
+def _exported(tracer, transport) -> dict:
+    assert tracer.flush(5)
+    return {span["name"]: span for span in transport.spans}
+
+
+# Context propagation
+
+
+def test_nested_spans_share_the_trace_and_link_to_their_parent(make_tracer):
+    tracer, transport = make_tracer()
+    with tracer.start_span("root") as root:
+        assert current_span() is root
+        with tracer.start_span("child") as child:
+            assert current_span() is child
+        assert current_span() is root
+    assert current_span() is None
+
+    spans = _exported(tracer, transport)
+    assert spans["child"]["traceId"] == spans["root"]["traceId"] == root.trace_id_hex
+    assert spans["child"]["parentSpanId"] == spans["root"]["spanId"] == root.span_id_hex
+    assert "parentSpanId" not in spans["root"]
+    assert len({span["traceId"] for span in transport.spans}) == 1
+
+
+def test_explicit_parent_overrides_the_current_span(make_tracer):
+    tracer, transport = make_tracer()
+    other = tracer.start_span("other")
+    with tracer.start_span("current"):
+        with tracer.start_span("child", parent=other):
+            pass
+    other.end()
+
+    spans = _exported(tracer, transport)
+    assert spans["child"]["traceId"] == spans["other"]["traceId"]
+    assert spans["child"]["parentSpanId"] == spans["other"]["spanId"]
+
+
+def test_exceptions_mark_the_span_failed(make_tracer):
+    tracer, transport = make_tracer()
+    with pytest.raises(ValueError):
+        with tracer.start_span("failing"):
+            raise ValueError("boom")
+
+    span = _exported(tracer, transport)["failing"]
+    assert span["status"] == {"code": STATUS_ERROR, "message": "boom"}
+    assert span["events"][0]["name"] == "exception"
+
+
+def test_threads_need_wrap_to_inherit_the_span(make_tracer):
+    tracer, _ = make_tracer()
+    with tracer.start_span("request") as request:
+        with ThreadPoolExecutor(1) as pool:
+            unwrapped = pool.submit(current_span).result()
+            wrapped = pool.submit(tracer.wrap(current_span)).result()
+            # The worker thread is left as it was.
+            after = pool.submit(current_span).result()
+
+    assert unwrapped is None
+    assert wrapped is request
+    assert after is None
+
+
+def test_asyncio_tasks_inherit_and_isolate_the_span(make_tracer):
+    tracer, _ = make_tracer()
+
+    async def handle(name):
+        with tracer.start_span(name) as span:
+            await asyncio.sleep(0)
+            assert current_span() is span
+            child = await asyncio.create_task(child_of(name))
+            return span, child
+
+    async def child_of(name):
+        with tracer.start_span(f"{name}.child") as span:
+            return span
+
+    async def main():
+        return await asyncio.gather(handle("a"), handle("b"))
+
+    (a, a_child), (b, b_child) = asyncio.run(main())
+
+    assert a_child.parent_span_id == a.span_id and a_child.trace_id == a.trace_id
+    assert b_child.parent_span_id == b.span_id and b_child.trace_id == b.trace_id
+    assert a.trace_id != b.trace_id
+
+
+def test_end_is_idempotent(make_tracer):
+    tracer, transport = make_tracer()
+    span = tracer.start_span("once")
+    span.end()
+    span.end()
+
+    _exported(tracer, transport)
+    assert [s["name"] for s in transport.spans] == ["once"]
+
+
+# Samplers
+
+
+def test_probability_sampler_decides_from_the_trace_id():
+    sampler = ProbabilitySampler(0.25)
+    low = (1 << 62) - 1
+    high = 1 << 62
+
+    assert sampler.should_sample("a", low)
+    assert not sampler.should_sample("a", high)
+    # Only the low 64 bits count, so every service agrees on a trace.
+    assert sampler.should_sample("b", (123 << 64) | low)
+    assert ProbabilitySampler(1.0).should_sample("a", (1 << 64) - 1)
+    assert not ProbabilitySampler(0.0).should_sample("a", 0)
+
+
+def test_probability_sampler_keeps_about_its_rate():
+    sampler = ProbabilitySampler(0.1)
+    kept = sum(sampler.should_sample("a") for _ in range(20000))
+
+    assert 1600 < kept < 2400
+
+
+@pytest.mark.parametrize("rate", [-0.1, 1.5])
+def test_probability_sampler_rejects_invalid_rates(rate):
+    with pytest.raises(ValueError):
+        ProbabilitySampler(rate)
+
+
+def test_rate_limiting_sampler_allows_a_burst_then_refills():
+    sampler = RateLimitingSampler(per_second=1000, burst=5)
+
+    assert [sampler.should_sample("a") for _ in range(6)] == [True] * 5 + [False]
+    time.sleep(0.01)
+    assert sampler.should_sample("a")
+
+
+def test_route_sampler_falls_back_to_default():
+    sampler = RouteSampler({"/health": ALWAYS_OFF}, default=ALWAYS_ON)
+
+    assert not sampler.should_sample("/health")
+    assert sampler.should_sample("/orders")
+
+
+def test_keep_errors_sampler():
+    sampler = KeepErrorsSampler(ALWAYS_OFF)
+
+    assert not sampler.should_sample("a")
+    assert sampler.should_sample("a", error=True)
+
+
+def test_parent_based_sampler_follows_the_parent():
+    sampler = ParentBasedSampler(ALWAYS_OFF)
+
+    assert sampler.should_sample("child", 1, parent_sampled=True)
+    assert not ParentBasedSampler(ALWAYS_ON).should_sample("child", 1, parent_sampled=False)
+    assert not sampler.should_sample("root", 1)
+
+
+def test_unsampled_traces_propagate_but_are_not_exported(make_tracer):
+    tracer, transport = make_tracer(trace_sampler=ALWAYS_OFF)
+    with tracer.start_span("root") as root:
+        with tracer.start_span("child") as child:
+            pass
+
+    assert not root.sampled and not child.sampled
+    assert child.trace_id == root.trace_id
+    assert _exported(tracer, transport) == {}
+
+
+def test_children_follow_a_sampled_root(make_tracer):
+    # The root is kept; a child's own route would not be.
+    tracer, transport = make_tracer(
+        trace_sampler=RouteSampler({"root": ALWAYS_ON}, default=ALWAYS_OFF)
+    )
+    with tracer.start_span("root"):
+        with tracer.start_span("child"):
+            pass
+
+    assert set(_exported(tracer, transport)) == {"root", "child"}
+
+
+def test_kept_errors_in_unsampled_traces_drop_the_parent_link(make_tracer):
+    tracer, transport = make_tracer(trace_sampler=KeepErrorsSampler(ALWAYS_OFF))
+    with tracer.start_span("request") as request:
+        with pytest.raises(ValueError):
+            with tracer.start_span("query"):
+                raise ValueError("timeout")
+
+    spans = _exported(tracer, transport)
+    # The parent was not sampled and is not exported.
+    assert set(spans) == {"query"}
+    query = spans["query"]
+    assert query["traceId"] == request.trace_id_hex
+    assert "parentSpanId" not in query
+    attributes = {a["key"]: a["value"]["stringValue"] for a in query["attributes"]}
+    assert attributes[UNSAMPLED_PARENT_ATTRIBUTE] == request.span_id_hex
+
+
+def test_kept_errors_in_sampled_traces_keep_the_parent_link(make_tracer):
+    tracer, transport = make_tracer(trace_sampler=KeepErrorsSampler(ALWAYS_ON))
+    with tracer.start_span("request") as request:
+        with pytest.raises(ValueError):
+            with tracer.start_span("query"):
+                raise ValueError("timeout")
+
+    query = _exported(tracer, transport)["query"]
+    assert query["parentSpanId"] == request.span_id_hex
+    assert "attributes" not in query
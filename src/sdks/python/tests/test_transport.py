@@ -0,0 +1,264 @@
+import asyncio
+import gzip
+import json
+import threading
+
+import httpx
+import pytest
+
+from racelogic_apm.config import ApmConfig
+from racelogic_apm.retry import ExportError
+from racelogic_apm.transport import AsyncTransport
+
+
+class _Collector:
+    """Mock collector answering with queued statuses, then 200, and decoding bodies."""
+
+    def __init__(self, *statuses, max_records=None):
+        self.statuses = list(statuses)
+        self.max_records = max_records
+        self.received = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        status = self.statuses.pop(0) if self.statuses else 200
+        if status == 200:
+            body = json.loads(gzip.decompress(request.content))
+            records = body["resourceLogs"][0]["scopeLogs"][0]["logRecords"]
+            if self.max_records is not None and len(records) > self.max_records:
+                return httpx.Response(413)
+            self.received.append([r["body"]["stringValue"] for r in records])
+        return httpx.Response(status)
+
+
+class _Blocking:
+    """Calls either transport as if it were synchronous."""
+
+    def __init__(self, transport):
+        self.transport = transport
+        self._loop = asyncio.new_event_loop() if isinstance(transport, AsyncTransport) else None
+        self._closed = False
+
+    def _call(self, result):
+        return self._loop.run_until_complete(result) if self._loop else result
+
+    def send(self, path, items):
+        return self._call(self.transport.send(path, items))
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._call(self.transport.close())
+        if self._loop:
+            self._loop.close()
+
+
+@pytest.fixture
+def make_transport(mock_transport_class):
+    transports = []
+
+    def make(collector, **overrides):
+        options = dict(
+            endpoint="http://collector.test",
+            application_name="transport-tests",
+            compression="gzip",
+            circuit_breaker_threshold=100,
+        )
+        options.update(overrides)
+        transport = _Blocking(mock_transport_class(ApmConfig(**options), collector))
+        transports.append(transport)
+        return transport
+
+    yield make
+    for transport in transports:
+        transport.close()
+
+
+def _logs(*messages):
+    return [{"body": {"stringValue": m}, "attributes": []} for m in messages]
+
+
+def test_413_splits_the_batch(make_transport):
+    collector = _Collector(max_records=2)
+    transport = make_transport(collector)
+
+    assert transport.send("/v1/logs", _logs("a", "b", "c", "d", "e")).status_code == 200
+    assert collector.received == [["a", "b"], ["c"], ["d", "e"]]
+
+
+def test_single_record_413_is_dropped(make_transport):
+    collector = _Collector(max_records=0)
+    transport = make_transport(collector)
+
+    transport.send("/v1/logs", _logs("huge"))
+    stats = transport.transport.stats()
+    assert stats["rejected"] == 1
+    assert stats["last_rejection"] == "request entity too large"
+
+
+def test_permanent_rejection_raises(make_transport, tmp_path):
+    transport = make_transport(_Collector(400), spool_dir=str(tmp_path))
+
+    with pytest.raises(ExportError) as rejected:
+        transport.send("/v1/logs", _logs("bad"))
+    assert rejected.value.status_code == 400
+    assert transport.transport.stats()["spooled"] == 0
+
+
+def test_unavailable_collector_spools_and_replays_in_order(make_transport, tmp_path):
+    collector = _Collector(503, 503)
+    transport = make_transport(collector, spool_dir=str(tmp_path))
+
+    assert transport.send("/v1/logs", _logs("first")) is None
+    assert transport.send("/v1/logs", _logs("second")) is None
+    assert transport.transport.stats()["spooled"] == 2
+
+    transport.send("/v1/logs", _logs("third"))
+    assert collector.received == [["third"], ["first"], ["second"]]
+    # Nothing is left to replay.
+    transport.send("/v1/logs", _logs("fourth"))
+    assert collector.received[-1] == ["fourth"]
+
+
+@pytest.mark.asyncio
+async def test_async_encoding_runs_off_the_event_loop(async_mock_transport):
+    collector = _Collector()
+    transport = async_mock_transport(
+        ApmConfig(endpoint="http://collector.test", application_name="t", compression="gzip"),
+        collector,
+    )
+    loop_thread = threading.get_ident()
+    encoded_on = []
+    split = transport._split
+
+    def record_thread(envelope, items):
+        encoded_on.append(threading.get_ident())
+        return split(envelope, items)
+
+    transport._split = record_thread
+    await transport.send("/v1/logs", _logs("a"))
+
+    assert collector.received == [["a"]]
+    assert encoded_on and loop_thread not in encoded_on
+    await transport.close()
+
+
+class _GzipOnlyCollector:
+    """Mock collector without a zstd decoder, answering 415 to other encodings."""
+
+    def __init__(self, *statuses, unsupported=(415, b"")):
+        self.statuses = list(statuses)
+        self.unsupported = unsupported
+        self.received = []
+        self.encodings = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.encodings.append(request.headers.get("content-encoding"))
+        if self.statuses:
+            return httpx.Response(self.statuses.pop(0))
+        if request.headers.get("content-encoding") != "gzip":
+            status, body = self.unsupported
+            return httpx.Response(status, content=body)
+        try:
+            body = json.loads(gzip.decompress(request.content))
+        except (OSError, ValueError):
+            return httpx.Response(400)
+        records = body["resourceLogs"][0]["scopeLogs"][0]["logRecords"]
+        self.received.append([r["body"]["stringValue"] for r in records])
+        return httpx.Response(200)
+
+
+def test_zstd_rejected_by_collector_falls_back_to_gzip(make_transport, caplog):
+    pytest.importorskip("zstandard")
+    collector = _GzipOnlyCollector()
+    transport = make_transport(collector, compression="zstd")
+
+    assert transport.send("/v1/logs", _logs("a")).status_code == 200
+    assert transport.send("/v1/logs", _logs("b")).status_code == 200
+
+    assert collector.received == [["a"], ["b"]]
+    warnings = [r for r in caplog.records if "falling back to gzip" in r.getMessage()]
+    assert len(warnings) == 1
+
+
+def test_zstd_falls_back_on_a_400_reporting_a_decompression_failure(make_transport):
+    pytest.importorskip("zstandard")
+    collector = _GzipOnlyCollector(unsupported=(400, b"Request body decompression failed"))
+    transport = make_transport(collector, compression="zstd")
+
+    assert transport.send("/v1/logs", _logs("a")).status_code == 200
+    assert collector.received == [["a"]]
+    assert collector.encodings == ["zstd", "gzip"]
+
+
+def test_validation_400_keeps_zstd(make_transport):
+    pytest.importorskip("zstandard")
+    collector = _GzipOnlyCollector(400, 200)
+    transport = make_transport(collector, compression="zstd")
+
+    with pytest.raises(ExportError):
+        transport.send("/v1/logs", _logs("invalid"))
+    transport.send("/v1/logs", _logs("valid"))
+    assert collector.encodings == ["zstd", "zstd"]
+
+
+def test_spooled_zstd_requests_are_replayed_as_gzip(make_transport, tmp_path):
+    pytest.importorskip("zstandard")
+    collector = _GzipOnlyCollector(503)
+    transport = make_transport(collector, compression="zstd", spool_dir=str(tmp_path))
+
+    assert transport.send("/v1/logs", _logs("spooled")) is None
+    transport.send("/v1/logs", _logs("live"))
+
+    assert collector.received == [["live"], ["spooled"]]
+
+
+def test_gzip_400_is_not_retried(make_transport):
+    transport = make_transport(_GzipOnlyCollector(400))
+
+    with pytest.raises(ExportError):
+        transport.send("/v1/logs", _logs("bad"))
+
+
+class _HeaderCheckingCollector:
+    """Mock collector that decodes each body as its headers describe."""
+
+    def __init__(self, *statuses):
+        self.statuses = list(statuses)
+        self.received = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        if self.statuses:
+            return httpx.Response(self.statuses.pop(0))
+        body = request.content
+        if request.headers.get("content-encoding") == "gzip":
+            body = gzip.decompress(body)
+        content_type = request.headers["content-type"]
+        if content_type == "application/json":
+            records = json.loads(body)["resourceLogs"][0]["scopeLogs"][0]["logRecords"]
+            self.received.append((content_type, [r["body"]["stringValue"] for r in records]))
+        else:
+            # A JSON body would start with "{".
+            assert body[:1] == b"\x0a"
+            self.received.append((content_type, None))
+        return httpx.Response(200)
+
+
+def test_spooled_requests_replay_with_the_headers_they_were_written_with(
+    make_transport, tmp_path
+):
+    collector = _HeaderCheckingCollector(503)
+    before = make_transport(collector, spool_dir=str(tmp_path))
+    assert before.send("/v1/logs", _logs("spooled")) is None
+    before.close()
+
+    # Redeployed with another encoding and no compression.
+    after = make_transport(
+        collector, spool_dir=str(tmp_path), encoding="protobuf", compression=None
+    )
+    after.send("/v1/logs", _logs("live"))
+
+    assert collector.received == [
+        ("application/x-protobuf", None),
+        ("application/json", ["spooled"]),
+    ]